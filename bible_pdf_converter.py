@@ -13,21 +13,73 @@ This script generates the HTML and PDF for a given Bible
 import os
 import re
 import argparse
+from concurrent.futures import ProcessPoolExecutor
 from bs4 import BeautifulSoup
 from pdf_converter import PdfConverter, run_converter
 from general_tools.bible_books import BOOK_NUMBERS
-from general_tools.file_utils import read_file
-from general_tools.usfm_utils import unalign_usfm
+from general_tools.html_tools import get_open_tags, parse_html_chunk, join_html_chunks
+from general_tools.render_cache import render_usfm, get_render_key, load_cached_render, save_cached_render
+from general_tools.usfm_utils import get_unaligned_usfm
 from tx_usfm_tools.singleFilelessHtmlRenderer import SingleFilelessHtmlRenderer
 
 DEFAULT_ULT_ID = 'ult'
+BODY_START = '<body>'
+BODY_END = '</body>\n</html>\n'
+
+
+def set_chapter_headers(soup, book_title, id_prefix, chapter_width, no_toc):
+    for chapter_header in soup.find_all('h2'):
+        chapter_title = chapter_header.text
+        chapter = re.search(r'\d+', chapter_title).group()
+        header_title = f'{book_title} {chapter}'
+        classes = ['section-header']
+        if no_toc:
+            classes += ['no-toc']
+        chapter_header['class'] = chapter_header.get('class', []) + classes
+        chapter_header['id'] = f'{id_prefix}-{chapter.zfill(chapter_width)}'
+        chapter_header['header_title'] = header_title
+
+
+def render_bible_chunk(job):
+    """
+    Renders a chunk of a book from SingleFilelessHtmlRenderer.getChapterChunks() and sets its headers the way
+    get_book_article_html() does for the whole book, for join_html_chunks(). The chunk is None if it wouldn't be
+    parsed the same way on its own, in which case the HTML of the book has to be parsed in one go.
+    :return: dict of the html, chunk, warnings and unknowns
+    """
+    state, tokens, first, last, book_title, header_title, id_prefix, chapter_width, no_toc = job
+    html, warnings, unknowns = SingleFilelessHtmlRenderer({}).renderChunk(tokens, state, last)
+    result = {'html': html, 'chunk': None, 'warnings': warnings, 'unknowns': unknowns}
+    body_html = html
+    if first:
+        body_start = html.find(BODY_START)
+        if body_start < 0 or get_open_tags(html[:body_start + len(BODY_START)]) != ['html', 'body']:
+            return result
+        body_html = html[body_start + len(BODY_START):]
+    if last:
+        if not body_html.endswith(BODY_END):
+            return result
+        body_html = body_html[:-len(BODY_END)]
+
+    def set_headers(soup):
+        if first:
+            book_header = soup.find('h1')
+            if not book_header or book_header.text != book_title:
+                return False
+            book_header['class'] = book_header.get('class', []) + ['section-header']
+            book_header['header_title'] = header_title
+        set_chapter_headers(soup, book_title, id_prefix, chapter_width, no_toc)
+
+    result['chunk'] = parse_html_chunk(body_html, set_headers)
+    return result
 
 
 class BiblePdfConverter(PdfConverter):
-    def __init__(self, bible_id, chapter=None, *args, **kwargs):
+    def __init__(self, bible_id, chapter=None, workers=None, *args, **kwargs):
         self.project_id = kwargs['project_id']
         self.bible_id = bible_id
         self.chapter = chapter
+        self.workers = workers if workers else os.cpu_count() or 1
         self.chapters = self.parse_chapters(chapter)
         super().__init__(*args, **kwargs)
 
@@ -111,36 +163,63 @@ class BiblePdfConverter(PdfConverter):
         bible_html = f'''
 <section id="{self.lang_code}-{self.name}" class="bible {self.name}-bible bible-{self.project_id} {self.name}-bible-{self.project_id}">
 '''
-        for project_idx, project in enumerate(projects):
+        no_toc = len(projects) > 1
+        chapter_width = len(self.pad(1))
+        books = []
+        jobs = []
+        for project in projects:
             project_id = project['identifier']
             project_num = BOOK_NUMBERS[project_id]
             project_file = os.path.join(self.main_resource.repo_dir, f'{project_num}-{project_id.upper()}.usfm')
-            usfm = read_file(project_file)
-            usfm = unalign_usfm(usfm)
+            usfm = get_unaligned_usfm(project_file, self.unaligned_cache_dir, self.main_resource.repo_name,
+                                      self.main_resource.commit, project_id)
             if self.chapters:
                 usfm_split = re.split(r'\\c ', usfm)
                 usfm = usfm_split[0]
                 for chapter in self.chapters:
                     usfm += '\\c ' + usfm_split[chapter]
             self.logger.info(f'Converting {project_id.upper()} from USFM to HTML...')
-            html, warnings = SingleFilelessHtmlRenderer({project_id.upper(): usfm}).render()
-            soup = BeautifulSoup(html, 'html.parser')
-            book_header = soup.find('h1')
-            book_title = book_header.text
-            book_header['class'] = book_header.get('class', []) + ['section-header']
-            book_header['header_title'] = self.title
-            chapter_headers = soup.find_all('h2')
-            for chapter_header in chapter_headers:
-                chapter_title = chapter_header.text
-                chapter = re.search(r'\d+', chapter_title).group()
-                header_title = f'{book_title} {chapter}'
-                classes = ['section-header']
-                if len(projects) > 1:
-                    classes += ['no-toc']
-                chapter_header['class'] = chapter_header.get('class', []) + classes
-                chapter_header['id'] = f'{self.lang_code}-{self.name}-{project_id}-{self.pad(chapter)}'
-                chapter_header['header_title'] = header_title
-            article_html = ''.join(['%s' % x for x in soup.body.contents]).strip()
+            renderer = SingleFilelessHtmlRenderer({project_id.upper(): usfm})
+            id_prefix = f'{self.lang_code}-{self.name}-{project_id}'
+            # A book already in the cache is used as is, and a book rendered in chunks is saved to the cache whole
+            render_key = get_render_key(project_id.upper(), usfm)
+            cached = load_cached_render(self.render_cache_dir, render_key) if self.render_cache_dir else None
+            chunks = []
+            if self.workers > 1 and not cached:
+                chunks, book_name = renderer.getChapterChunks()
+            if len(chunks) > 1:
+                book_title = BeautifulSoup(f'<h1>{book_name}</h1>', 'html.parser').h1.text
+                for chunk_idx, (state, tokens) in enumerate(chunks):
+                    jobs.append([state, tokens, chunk_idx == 0, chunk_idx == len(chunks) - 1, book_title,
+                                 self.title, id_prefix, chapter_width, no_toc])
+                books.append([project_id, renderer, len(chunks), render_key])
+            else:
+                html, warnings = cached or render_usfm(project_id.upper(), usfm, self.render_cache_dir)
+                books.append([project_id, html, 0, render_key])
+        if jobs:
+            self.logger.info(f'Rendering {len(jobs)} chapters with {self.workers} processes...')
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                results = list(executor.map(render_bible_chunk, jobs,
+                                            chunksize=max(1, len(jobs) // (self.workers * 4))))
+        for project_id, book, chunk_count, render_key in books:
+            id_prefix = f'{self.lang_code}-{self.name}-{project_id}'
+            if chunk_count:
+                book_results, results = results[:chunk_count], results[chunk_count:]
+                book.unknowns = [unknown for result in book_results for unknown in result['unknowns']]
+                book.logUnknowns()
+                if self.render_cache_dir:
+                    # The chunks' HTML joins up into what render() returns for the whole book
+                    save_cached_render(self.render_cache_dir, render_key,
+                                       ''.join([result['html'] for result in book_results]),
+                                       set().union(*[result['warnings'] for result in book_results]))
+                if all(result['chunk'] for result in book_results):
+                    article_html = join_html_chunks([result['chunk'] for result in book_results]).strip()
+                else:
+                    self.logger.info(f'Parsing the HTML of {project_id.upper()} in one go...')
+                    article_html = self.get_book_article_html(''.join([result['html'] for result in book_results]),
+                                                              id_prefix, chapter_width, no_toc)
+            else:
+                article_html = self.get_book_article_html(book, id_prefix, chapter_width, no_toc)
             bible_html += f'''
     <article id="{self.lang_code}-{self.name}-{project_id}" class="bible-book bible-book-{project_id} {self.name}-bible-book">
         <div class="bible-book-wrapper">
@@ -153,6 +232,15 @@ class BiblePdfConverter(PdfConverter):
 '''
         return bible_html
 
+    def get_book_article_html(self, html, id_prefix, chapter_width, no_toc):
+        soup = BeautifulSoup(html, 'html.parser')
+        book_header = soup.find('h1')
+        book_title = book_header.text
+        book_header['class'] = book_header.get('class', []) + ['section-header']
+        book_header['header_title'] = self.title
+        set_chapter_headers(soup, book_title, id_prefix, chapter_width, no_toc)
+        return ''.join(['%s' % x for x in soup.body.contents]).strip()
+
     def fix_links(self, html):
         html = re.sub(r' +(<span id="ref-fn-)', r'\1', html, flags=re.MULTILINE)
         html = re.sub(r'(</b></sup></span>) +', r'\1', html, flags=re.MULTILINE)
@@ -166,6 +254,8 @@ def main(bible_class, resource_names=None):
     parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
     parser.add_argument('-b', '--bible-id', dest='bible_id', default=DEFAULT_ULT_ID, required=False, help=f'Bible resource ID. Default: {DEFAULT_ULT_ID}')
     parser.add_argument('-c', '--chapter', dest='chapter', default=None, required=False, help=f'Chapter(s) to generate, can be a range, e.g. -c 1-3,5')
+    parser.add_argument('--workers', dest='workers', type=int, default=None, required=False,
+                        help='Number of processes to render the chapters of the books in. Default: number of CPUs')
     parser.add_argument(f'--bible-ref', dest='bible_id_ref', default=None, required=False,
                         help=f'Branch or tag for the `bible_id`. If not set, uses latest tag unless --master flag is used')
     run_converter(resource_names, bible_class, project_ids_map={'': BOOK_NUMBERS.keys(), 'all': [None]},
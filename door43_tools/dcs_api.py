@@ -1,8 +1,8 @@
-import requests
 import giteapy
 import yaml
 from giteapy.rest import ApiException
 from urllib.parse import urlencode
+from general_tools.url_utils import get_shared_session, DOWNLOAD_TIMEOUT
 
 DEFAULT_BRANCH = 'master'
 PRODUCTION_DCS_DOMAIN = "https://qa.door43.org"
@@ -54,7 +54,7 @@ class DcsApi(object):
             ref = DEFAULT_BRANCH
         url = f"{self.catalog_url}/entry/{owner}/{repo_name}/{ref}"
         print(url)
-        response = requests.get(url)
+        response = get_shared_session().get(url, timeout=DOWNLOAD_TIMEOUT)
         if response.status_code == 200:
             return response.json()
         else:
@@ -68,7 +68,7 @@ class DcsApi(object):
             query['sha'] = ref
         url = f"{self.api_base_url}/repos/{owner}/{repo_name}/commits?{urlencode(query)}"
         print(url)
-        response = requests.get(url)
+        response = get_shared_session().get(url, timeout=DOWNLOAD_TIMEOUT)
         if response.status_code == 200:
             commits = response.json()
         else:
@@ -102,5 +102,5 @@ class DcsApi(object):
         query = {k: v for k, v in query.items() if v is not None}
         url = f"{self.catalog_url}/?{urlencode(query, doseq=True)}"
         print(url)
-        response = requests.get(url)
+        response = get_shared_session().get(url, timeout=DOWNLOAD_TIMEOUT)
         return response.json()
@@ -1,11 +1,27 @@
+import os
 import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
 from urllib.parse import urlencode
 from general_tools import url_utils
+from general_tools.file_utils import write_file_atomically
+
+LANGNAMES_URL = 'http://td.unfoldingword.org/exports/langnames.json'
+LANGNAMES_FILE = 'langnames.json'
+LANGNAMES_TTL = 7 * 24 * 60 * 60  # Seconds before the snapshot is refreshed in the background
 
 
 class TdLanguage:
 
     language_list = {}
+    # Where the langnames snapshot is kept, shared by all processes using the same directory
+    cache_dir = os.environ.get('LANGNAMES_DIR', os.path.join(tempfile.gettempdir(), 'langnames'))
+    offline = False
+    _lock = threading.RLock()
+    _refresh_thread = None
 
     def __init__(self, json_obj=None):
         """
@@ -29,16 +45,93 @@ class TdLanguage:
     @staticmethod
     def get_languages():
         """
-        Gets the list of Languages. Retrieves the list from tD if needed.
-        :return: list<TdLanguage>
+        Gets the list of Languages. Loads it from the local snapshot of tD's langnames, which is downloaded if there
+        isn't one yet and refreshed in the background once it is older than LANGNAMES_TTL
+        :return: dict<lc, TdLanguage>
         """
         if not TdLanguage.language_list:
-            lang_file = 'http://td.unfoldingword.org/exports/langnames.json'
-            langs = json.loads(url_utils.get_url(lang_file))
-            for lang in langs:
-                TdLanguage.language_list[lang['lc']] = TdLanguage(lang)
+            with TdLanguage._lock:
+                if not TdLanguage.language_list:
+                    snapshot = TdLanguage.load_snapshot()
+                    if not snapshot and not TdLanguage.offline:
+                        snapshot = TdLanguage.fetch_snapshot()
+                    elif snapshot and not TdLanguage.offline and \
+                            time.time() - snapshot.get('fetched', 0) > LANGNAMES_TTL:
+                        TdLanguage.refresh_in_background()
+                    if snapshot:
+                        TdLanguage.set_languages(snapshot['languages'])
+                    else:
+                        logging.getLogger().warning('No langnames snapshot to get languages from while offline')
         return TdLanguage.language_list
 
+    @staticmethod
+    def set_languages(langs):
+        """
+        Builds the index of languages by code from the langnames list
+        """
+        language_list = {lang['lc']: TdLanguage(lang) for lang in langs}
+        with TdLanguage._lock:
+            TdLanguage.language_list = language_list
+
+    @staticmethod
+    def get_snapshot_file():
+        return os.path.join(TdLanguage.cache_dir, LANGNAMES_FILE)
+
+    @staticmethod
+    def load_snapshot():
+        """
+        :return: {'version', 'fetched', 'languages'} of the local snapshot, or None if there isn't a valid one
+        """
+        try:
+            with open(TdLanguage.get_snapshot_file(), encoding='utf-8') as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(snapshot, dict) or not isinstance(snapshot.get('languages'), list):
+            return None
+        return snapshot
+
+    @staticmethod
+    def fetch_snapshot():
+        """
+        Downloads langnames from tD and saves it as the local snapshot, versioned by the hash of its contents
+        :return: the snapshot, or None if it couldn't be downloaded
+        """
+        contents = url_utils.get_url(LANGNAMES_URL, catch_exception=True)
+        try:
+            langs = json.loads(contents) if contents else None
+        except ValueError:
+            langs = None
+        if not isinstance(langs, list):
+            logging.getLogger().warning(f'Unable to get languages from {LANGNAMES_URL}')
+            return None
+        snapshot = {'version': hashlib.sha1(contents.encode('utf-8')).hexdigest(), 'fetched': time.time(),
+                    'languages': langs}
+        try:
+            write_file_atomically(TdLanguage.get_snapshot_file(),
+                                  json.dumps(snapshot, ensure_ascii=False, separators=(',', ':')))
+        except OSError as e:
+            logging.getLogger().warning(f'Unable to save the langnames snapshot: {e}')
+        return snapshot
+
+    @staticmethod
+    def refresh_in_background():
+        """
+        Downloads a new snapshot in a daemon thread, which the indexes are rebuilt from if its version changed
+        """
+        if TdLanguage._refresh_thread and TdLanguage._refresh_thread.is_alive():
+            return TdLanguage._refresh_thread
+        old_snapshot = TdLanguage.load_snapshot() or {}
+
+        def refresh():
+            snapshot = TdLanguage.fetch_snapshot()
+            if snapshot and snapshot['version'] != old_snapshot.get('version'):
+                TdLanguage.set_languages(snapshot['languages'])
+
+        TdLanguage._refresh_thread = threading.Thread(target=refresh, name='langnames-refresh', daemon=True)
+        TdLanguage._refresh_thread.start()
+        return TdLanguage._refresh_thread
+
     @staticmethod
     def get_language(lang):
         languages = TdLanguage.get_languages()
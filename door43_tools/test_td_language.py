@@ -0,0 +1,39 @@
+import os
+import json
+import shutil
+import tempfile
+from unittest import TestCase
+from .td_language import TdLanguage, LANGNAMES_FILE
+
+LANGNAMES = [
+    {'lc': 'aa', 'ln': 'Afaraf', 'ang': 'Afar', 'alt': ['Afaraf', 'Danakil'], 'ld': 'ltr', 'gw': False},
+    {'lc': 'ar', 'ln': 'العربية', 'ang': 'Arabic', 'alt': ['Arabic, Standard'], 'ld': 'rtl', 'gw': True},
+    {'lc': 'aao', 'ln': 'Algerian Saharan Arabic', 'ang': 'Arabic', 'alt': [], 'ld': 'rtl', 'gw': False},
+]
+
+
+class TestTdLanguage(TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp(prefix='langnames_')
+        self.saved = [TdLanguage.cache_dir, TdLanguage.offline, TdLanguage.language_list]
+        TdLanguage.cache_dir = self.cache_dir
+        TdLanguage.offline = True
+        TdLanguage.language_list = {}
+
+    def tearDown(self):
+        TdLanguage.cache_dir, TdLanguage.offline, TdLanguage.language_list = self.saved
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def test_get_language_from_snapshot(self):
+        with open(os.path.join(self.cache_dir, LANGNAMES_FILE), 'w', encoding='utf-8') as f:
+            # An old snapshot is still used offline, without trying to refresh it
+            json.dump({'version': 'abc', 'fetched': 0, 'languages': LANGNAMES}, f)
+        self.assertEqual('Afar', TdLanguage.get_language('aa').ang)
+        self.assertEqual('rtl', TdLanguage.get_language('ar').ld)
+        self.assertIsNone(TdLanguage.get_language('xx'))
+        self.assertEqual(['Afaraf', 'Danakil'], TdLanguage.get_language('aa').alt)
+        self.assertIsNone(TdLanguage._refresh_thread)
+
+    def test_get_language_offline_without_snapshot(self):
+        self.assertIsNone(TdLanguage.get_language('aa'))
@@ -0,0 +1,444 @@
+#!/usr/bin/env python3
+#
+#  Copyright (c) 2020 unfoldingWord
+#  http://creativecommons.org/licenses/MIT/
+#  See LICENSE file for details.
+#
+#  Contributors:
+#  Richard Mahn <rich.mahn@unfoldingword.org>
+
+"""
+Builds the same bible package (chapter JSON files of verse objects) and TW group data that
+resources/processBibles.js makes with tc-source-content-updater, but one book at a time and in-process
+"""
+import os
+import re
+import json
+import time
+import uuid
+import hashlib
+import tempfile
+from glob import glob
+from collections import OrderedDict
+from general_tools.file_utils import write_file, write_file_atomically, remove_tree, make_dir, load_json_object, \
+    get_child_directories
+
+MARKER_REGEX = re.compile(r'\\(\+?[a-z][a-z0-9]*(?:-[se])?)(\*?)')
+ATTRIBUTE_REGEX = re.compile(r'([\w-]+)\s*=\s*"([^"]*)"')
+NUMBER_REGEX = re.compile(r'\s*(\S+)\s?')
+TW_LINK_REGEX = re.compile(r'/tw/dict/bible/([^/]+)/([^/]+)$')
+
+PARAGRAPH_MARKERS = ['p', 'm', 'pi', 'pi1', 'pi2', 'pi3', 'mi', 'nb', 'b', 'pc', 'pm', 'pmo', 'pmc', 'pmr', 'pr',
+                     'cls', 'li', 'li1', 'li2', 'li3', 'lh', 'lf']
+QUOTE_MARKERS = ['q', 'q1', 'q2', 'q3', 'q4', 'qr', 'qc', 'qa', 'qm', 'qm1', 'qm2', 'qm3', 'qd']
+SECTION_MARKERS = ['s', 's1', 's2', 's3', 's4', 's5', 'ms', 'ms1', 'ms2', 'mr', 'sr', 'r', 'd', 'sp', 'cl', 'cp']
+NOTE_MARKERS = {'f': 'footnote', 'fe': 'footnote', 'ef': 'footnote', 'x': 'crossReference', 'ex': 'crossReference'}
+INT_ATTRIBUTES = ['occurrence', 'occurrences']
+
+BUILDS_DIR = '.builds'
+BUILD_INFO_FILE = '.build.json'
+TW_DIR = '.tw'
+OLD_BUILD_AGE = 24 * 60 * 60  # Seconds an unpublished build is kept for jobs still reading it
+
+
+def get_attributes(attributes_str):
+    """
+    Parses USFM 3 word/milestone attributes, dropping the "x-" prefix of user attributes the way usfm-js does
+    :param attributes_str: The text after the "|", e.g. 'x-occurrence="1" x-occurrences="1"'
+    :return: OrderedDict of attributes
+    """
+    attributes = OrderedDict()
+    attributes_str = attributes_str.strip()
+    if attributes_str and '=' not in attributes_str:
+        # default attribute of \w is lemma
+        attributes['lemma'] = attributes_str
+        return attributes
+    for key, value in ATTRIBUTE_REGEX.findall(attributes_str):
+        if key.startswith('x-'):
+            key = key[2:]
+        if key in INT_ATTRIBUTES and value.isdigit():
+            value = int(value)
+        attributes[key] = value
+    return attributes
+
+
+def get_marker_type(tag):
+    if tag in PARAGRAPH_MARKERS:
+        return 'paragraph'
+    if tag in QUOTE_MARKERS:
+        return 'quote'
+    if tag in SECTION_MARKERS:
+        return 'section'
+    return 'character'
+
+
+def add_text(objects, text):
+    if not text:
+        return
+    if objects and objects[-1]['type'] == 'text':
+        objects[-1]['text'] += text
+    else:
+        objects.append(OrderedDict([('type', 'text'), ('text', text)]))
+
+
+def parse_usfm(usfm):
+    """
+    Parses an aligned USFM book into verse objects the way usfm-js does for tc-source-content-updater
+    (integer occurrences, "x-" prefixes dropped, \\zaln and \\k milestones with children)
+    :param usfm: The USFM of one book
+    :return: OrderedDict of chapter => verse => {'verseObjects': [...]}, chapter and verse being strings
+    """
+    chapters = OrderedDict()
+    verse_objects = None
+    stack = []
+    paragraph = None
+    pos = 0
+    length = len(usfm)
+
+    def container():
+        return stack[-1]['children'] if stack else verse_objects
+
+    def read_number(start):
+        match = NUMBER_REGEX.match(usfm, start)
+        return match.group(1), match.end()
+
+    while pos < length:
+        match = MARKER_REGEX.search(usfm, pos)
+        end = match.start() if match else length
+        if verse_objects is not None:
+            text = usfm[pos:end]
+            if paragraph is not None:
+                # Text right after a paragraph, quote or section marker belongs to that marker
+                if text.strip():
+                    paragraph['text'] = text
+                elif text:
+                    add_text(container(), text)
+                paragraph = None
+            elif stack and stack[-1]['type'] == 'word':
+                stack[-1]['text'] += text
+            else:
+                add_text(container(), text)
+        if not match:
+            break
+        tag = match.group(1).lstrip('+')
+        is_end = bool(match.group(2))
+        pos = match.end()
+        paragraph = None
+
+        if tag == 'c':
+            chapter, pos = read_number(pos)
+            chapters[chapter] = OrderedDict()
+            verse_objects = []
+            chapters[chapter]['front'] = {'verseObjects': verse_objects}
+            stack = []
+        elif verse_objects is None:
+            # Headers (\id, \h, \toc1, \mt, ...) are not part of any verse
+            continue
+        elif tag == 'v':
+            verse, pos = read_number(pos)
+            verse_objects = []
+            chapters[chapter][verse] = {'verseObjects': verse_objects}
+            stack = []
+        elif tag in NOTE_MARKERS and not is_end:
+            note_end = usfm.find(f'\\{tag}*', pos)
+            if note_end < 0:
+                note_end = length
+            content_start = pos + 1 if pos < length and usfm[pos].isspace() else pos
+            container().append(OrderedDict([('tag', tag), ('type', NOTE_MARKERS[tag]),
+                                            ('content', usfm[content_start:note_end]), ('endTag', f'{tag}*')]))
+            pos = min(note_end + len(tag) + 2, length)
+        elif tag.endswith('-s'):
+            attributes_end = usfm.find('\\*', pos)
+            if attributes_end < 0:
+                attributes_end = length
+            attributes = get_attributes(usfm[pos:attributes_end].strip().lstrip('|'))
+            milestone = OrderedDict([('tag', tag[:-2]), ('type', 'milestone')])
+            milestone.update(attributes)
+            milestone['children'] = []
+            container().append(milestone)
+            stack.append(milestone)
+            pos = attributes_end + 2
+        elif tag.endswith('-e'):
+            milestone_tag = tag[:-2]
+            while stack:
+                obj = stack.pop()
+                if obj['type'] == 'milestone' and obj['tag'] == milestone_tag:
+                    obj['endTag'] = f'{tag}\\*'
+                    break
+            if usfm.startswith('\\*', pos):
+                pos += 2
+        elif usfm.startswith('\\*', pos):
+            # Standalone milestone, e.g. \ts\*
+            container().append(OrderedDict([('tag', tag), ('type', 'milestone'), ('children', []),
+                                            ('endTag', f'{tag}\\*')]))
+            pos += 2
+        elif is_end:
+            while stack:
+                obj = stack.pop()
+                if obj['tag'] == tag:
+                    if obj['type'] == 'word':
+                        text, _, attributes_str = obj['text'].partition('|')
+                        obj['text'] = text
+                        obj.update(get_attributes(attributes_str))
+                    else:
+                        obj['endTag'] = f'{tag}*'
+                    break
+        else:
+            if pos < length and usfm[pos] in ' \t':
+                pos += 1
+            if tag == 'w':
+                word = OrderedDict([('text', ''), ('tag', 'w'), ('type', 'word')])
+                container().append(word)
+                stack.append(word)
+            else:
+                marker_type = get_marker_type(tag)
+                obj = OrderedDict([('tag', tag), ('type', marker_type)])
+                container().append(obj)
+                if marker_type == 'character':
+                    obj['children'] = []
+                    stack.append(obj)
+                else:
+                    if pos < length and usfm[pos] == '\n':
+                        obj['nextChar'] = '\n'
+                        pos += 1
+                    paragraph = obj
+
+    for chapter in chapters:
+        front = chapters[chapter]['front']['verseObjects']
+        if not ''.join(obj.get('text', '') for obj in front if obj['type'] == 'text').strip() and \
+                not [obj for obj in front if obj['type'] != 'text']:
+            del chapters[chapter]['front']
+    return chapters
+
+
+def get_tw_words(verse_objects, words=None, linked=None):
+    """
+    Walks verse objects in order collecting every word and which words are tagged with a TW link
+    :return: (list of word texts, list of (tw_link, list of word indexes, list of strongs))
+    """
+    if words is None:
+        words = []
+    if linked is None:
+        linked = []
+    for verse_object in verse_objects:
+        if verse_object['type'] == 'word':
+            if 'tw' in verse_object:
+                linked.append((verse_object['tw'], [len(words)], [verse_object.get('strong', '')]))
+            words.append(verse_object['text'])
+        elif verse_object['type'] == 'milestone' and 'tw' in verse_object:
+            start = len(words)
+            get_tw_words(verse_object['children'], words, [])
+            strongs = []
+            collect_strongs(verse_object['children'], strongs)
+            linked.append((verse_object['tw'], list(range(start, len(words))), strongs))
+        elif 'children' in verse_object:
+            get_tw_words(verse_object['children'], words, linked)
+    return words, linked
+
+
+def collect_strongs(verse_objects, strongs):
+    for verse_object in verse_objects:
+        if verse_object['type'] == 'word':
+            strongs.append(verse_object.get('strong', ''))
+        elif 'children' in verse_object:
+            collect_strongs(verse_object['children'], strongs)
+
+
+def get_tw_group_data(chapters, book_id):
+    """
+    Generates TW group data from the "tw" attributes of an aligned original language book
+    :param chapters: The parsed book from parse_usfm()
+    :param book_id: e.g. 'tit'
+    :return: OrderedDict of category => group ID => list of group data items with contextIds
+    """
+    tw_data = OrderedDict()
+    for chapter in chapters:
+        if not chapter.isdigit():
+            continue
+        for verse in chapters[chapter]:
+            if verse == 'front':
+                continue
+            words, linked = get_tw_words(chapters[chapter][verse]['verseObjects'])
+            for tw_link, indexes, strongs in linked:
+                match = TW_LINK_REGEX.search(tw_link)
+                if not match or not indexes:
+                    continue
+                category, group_id = match.groups()
+                quote_words = words[indexes[0]:indexes[-1] + 1]
+                occurrence = 0
+                for idx in range(indexes[0] + 1):
+                    if words[idx:idx + len(quote_words)] == quote_words:
+                        occurrence += 1
+                if category not in tw_data:
+                    tw_data[category] = OrderedDict()
+                if group_id not in tw_data[category]:
+                    tw_data[category][group_id] = []
+                tw_data[category][group_id].append(OrderedDict([
+                    ('comments', False),
+                    ('reminders', False),
+                    ('selections', False),
+                    ('verseEdits', False),
+                    ('nothingToSelect', False),
+                    ('contextId', OrderedDict([
+                        ('reference', OrderedDict([
+                            ('bookId', book_id),
+                            ('chapter', int(chapter)),
+                            ('verse', int(verse) if verse.isdigit() else verse)
+                        ])),
+                        ('tool', 'translationWords'),
+                        ('groupId', group_id),
+                        ('quote', ' '.join(quote_words)),
+                        ('strong', strongs),
+                        ('occurrence', occurrence)
+                    ]))
+                ]))
+    return tw_data
+
+
+def get_usfm_hash(usfm):
+    return hashlib.sha1(usfm.encode('utf-8')).hexdigest()
+
+
+def get_build_info(book_path):
+    """
+    :param book_path: e.g. <resources_dir>/en/bibles/ult/v18/tit
+    :return: The build info the book was last published with ({'commit': ..., 'usfm_hash': ...}), or {}
+    """
+    return load_json_object(os.path.join(book_path, BUILD_INFO_FILE), {})
+
+
+def publish_dir(build_dir, link_name):
+    """
+    Atomically points link_name at build_dir with a symlink, so other jobs reading link_name see either the
+    previous build or this one, never a partial one
+    """
+    if os.path.isdir(link_name) and not os.path.islink(link_name):
+        # Built before builds were published (e.g. by the Node step)
+        remove_tree(link_name)
+    make_dir(os.path.dirname(link_name))
+    temp_link_name = f'{link_name}.{uuid.uuid4().hex}.tmp'
+    os.symlink(os.path.relpath(build_dir, os.path.dirname(link_name)), temp_link_name)
+    os.replace(temp_link_name, link_name)
+
+
+def build_book_package(usfm, bible_path, book_id, manifest=None, tw_path=None, commit=None, force=False):
+    """
+    Publishes <bible_path>/<book_id>/<chapter>.json for one book and, if tw_path is given, its TW group data
+    as <tw_path>/<category>/groups/<book_id>/<group_id>.json. Each build goes to
+    <bible_path>/.builds/<book_id>-<usfm hash> and is then published with a symlink, so parallel jobs can
+    share the same resources directory. Books whose USFM has not changed since they were last published
+    are not rebuilt.
+    :param usfm: The aligned USFM of the book
+    :param bible_path: The versioned bible path, e.g. <resources_dir>/en/bibles/ult/v18
+    :param book_id: e.g. 'tit'
+    :param manifest: The resource's manifest, written to <bible_path>/manifest.json if given
+    :param tw_path: The versioned TW group data path, only given for original language bibles
+    :param commit: The commit of the resource the USFM came from, recorded with the build
+    :param force: Rebuild even if the USFM has not changed
+    :return: The parsed chapters, or None if the book was already up to date
+    """
+    usfm_hash = get_usfm_hash(usfm)
+    book_path = os.path.join(bible_path, book_id)
+    if not force and get_build_info(book_path).get('usfm_hash') == usfm_hash:
+        return None
+
+    chapters = parse_usfm(usfm)
+    builds_path = os.path.join(bible_path, BUILDS_DIR)
+    build_dir = os.path.join(builds_path, f'{book_id}-{usfm_hash[:12]}')
+    make_dir(builds_path)
+    temp_dir = tempfile.mkdtemp(prefix=f'{book_id}-', suffix='.tmp', dir=builds_path)
+    for chapter in chapters:
+        write_file(os.path.join(temp_dir, f'{chapter}.json'), chapters[chapter])
+    tw_data = get_tw_group_data(chapters, book_id) if tw_path else {}
+    for category in tw_data:
+        for group_id in tw_data[category]:
+            write_file(os.path.join(temp_dir, TW_DIR, category, f'{group_id}.json'), tw_data[category][group_id])
+    write_file(os.path.join(temp_dir, BUILD_INFO_FILE), {'commit': commit, 'usfm_hash': usfm_hash})
+    try:
+        # Fails if the build exists, which is never replaced as it may already be published
+        os.rename(temp_dir, build_dir)
+    except OSError:
+        # Another job already built the same USFM
+        remove_tree(temp_dir)
+
+    if manifest:
+        write_file_atomically(os.path.join(bible_path, 'manifest.json'), manifest)
+    write_file_atomically(os.path.join(bible_path, BUILD_INFO_FILE), {'commit': commit})
+    if tw_path:
+        categories = set(tw_data.keys())
+        if os.path.isdir(tw_path):
+            categories.update(get_child_directories(tw_path))
+        for category in categories:
+            link_name = os.path.join(tw_path, category, 'groups', book_id)
+            if category in tw_data:
+                publish_dir(os.path.join(build_dir, TW_DIR, category), link_name)
+            elif os.path.islink(link_name):
+                os.remove(link_name)
+            else:
+                remove_tree(link_name)
+    publish_dir(build_dir, book_path)
+    link_names = [book_path] + glob(os.path.join(tw_path, '*', 'groups', book_id)) if tw_path else [book_path]
+    remove_old_builds(builds_path, book_id, link_names)
+    return chapters
+
+
+def build_helps_package(helps_path, name, commits, build, force=False):
+    """
+    Publishes <helps_path>/<name> from a build made somewhere else, e.g. the TN group data processBibles.js makes.
+    Each build goes to <helps_path>/.builds/<name>-<commits hash> and is then published with a symlink, like the
+    books of build_book_package(). It is not rebuilt while the commits it depends on stay the same.
+    :param helps_path: e.g. <resources_dir>/en/translationHelps
+    :param name: e.g. 'translationNotes'
+    :param commits: {resource id: commit} of every resource the build is made from
+    :param build: function that makes the build and returns the directory it is in, which is moved from there
+    :param force: Rebuild even if the commits have not changed
+    :return: The published build directory, or None if it was already up to date
+    """
+    link_name = os.path.join(helps_path, name)
+    if not force and get_build_info(link_name).get('commits') == commits:
+        return None
+
+    built_dir = build()
+    write_file(os.path.join(built_dir, BUILD_INFO_FILE), {'commits': commits})
+    commits_hash = hashlib.sha1(json.dumps(commits, sort_keys=True).encode('utf-8')).hexdigest()
+    builds_path = os.path.join(helps_path, BUILDS_DIR)
+    build_dir = os.path.join(builds_path, f'{name}-{commits_hash[:12]}')
+    make_dir(builds_path)
+    try:
+        os.rename(built_dir, build_dir)
+    except OSError:
+        # Another job already built the same commits
+        pass
+    publish_dir(build_dir, link_name)
+    remove_old_builds(builds_path, name, [link_name])
+    return build_dir
+
+
+def get_published_builds(builds_path, link_names):
+    """
+    :return: the build directories in builds_path that the symlinks point at or into
+    """
+    published_builds = set()
+    for link_name in link_names:
+        if os.path.islink(link_name):
+            target = os.path.relpath(os.path.realpath(link_name), os.path.realpath(builds_path))
+            if not target.startswith(os.pardir):
+                published_builds.add(os.path.join(builds_path, target.split(os.path.sep)[0]))
+    return published_builds
+
+
+def remove_old_builds(builds_path, book_id, link_names, max_age=OLD_BUILD_AGE):
+    """
+    Removes the builds of a book that none of link_names point at and that are older than max_age, so neither a
+    build another job has just published nor one a job may still be reading is removed
+    """
+    published_builds = get_published_builds(builds_path, link_names)
+    for old_build in glob(os.path.join(builds_path, f'{book_id}-*')):
+        if old_build.endswith('.tmp') or old_build in published_builds:
+            continue
+        try:
+            if time.time() - os.path.getmtime(old_build) > max_age:
+                remove_tree(old_build)
+        except OSError:
+            # Removed by another job
+            pass
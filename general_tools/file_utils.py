@@ -6,6 +6,7 @@ import zipfile
 import shutil
 import yaml
 import tempfile
+import uuid
 from glob import glob
 from mimetypes import MimeTypes
 from distutils.version import LooseVersion
@@ -165,6 +166,21 @@ def write_file(file_name, file_contents, indent=2):
         out_file.write(text_to_write)
 
 
+def write_file_atomically(file_name, file_contents, indent=2):
+    """
+    Writes the <file_contents> to <file_name> like write_file() does, but to a temporary file that then replaces
+    <file_name>, so other processes reading <file_name> never see it partly written. Bytes are written as they are.
+    """
+    temp_file = f'{file_name}.{uuid.uuid4().hex}.tmp'
+    if isinstance(file_contents, bytes):
+        make_dir(os.path.dirname(file_name))
+        with open(temp_file, 'wb') as out_file:
+            out_file.write(file_contents)
+    else:
+        write_file(temp_file, file_contents, indent)
+    os.replace(temp_file, file_name)
+
+
 def get_mime_type(path):
     mime = MimeTypes()
 
@@ -1,10 +1,20 @@
 import re
 import os
+import json
+import time
+import logging
 from urllib.parse import urlencode
 from door43_tools.td_language import TdLanguage
 from .url_utils import get_url, download_file
+from .file_utils import load_json_object, write_file_atomically
 from .font_maps import FONTS_BY_LANG, PRECEDING_FONT_FAMILIES, DEFAULT_FALLBACK
 
+FONT_MANIFEST_FILE = 'font_manifest.json'
+FONT_MANIFEST_TTL = 30 * 24 * 60 * 60  # Seconds before a family's font face CSS is fetched again
+FONT_URL_REGEX = re.compile(r"^(.*) url\(([^)#?]+)(.*)\)(.*)$")
+
+_font_html_with_local_fonts = {}
+
 
 def get_name(lang_code):
     language = TdLanguage.get_language(lang_code)
@@ -76,6 +86,7 @@ def get_font_families(lang_code):
 def get_font_families_with_fallbacks(lang_code):
     font_families = get_font_families(lang_code)
     if font_families:
+        font_families = list(font_families)  # Don't add the fallbacks to the lists in FONTS_BY_LANG
         if font_families[0] in PRECEDING_FONT_FAMILIES:
             font_families += PRECEDING_FONT_FAMILIES[font_families[0]]
         font_families += get_fallbacks(font_families[-1])
@@ -105,33 +116,124 @@ def get_font_html(lang_code):
     return html
 
 
-def get_font_html_with_local_fonts(lang_code, html_dir):
+def load_font_manifest(fonts_dir):
+    """
+    :return: {font_family: {'url', 'css', 'files', 'fetched'}} of the font faces downloaded to fonts_dir
+    """
+    try:
+        return load_json_object(os.path.join(fonts_dir, FONT_MANIFEST_FILE), {})
+    except (OSError, ValueError):
+        return {}
+
+
+def save_font_manifest(fonts_dir, manifest):
+    write_file_atomically(os.path.join(fonts_dir, FONT_MANIFEST_FILE), json.dumps(manifest, indent=2,
+                                                                                  ensure_ascii=False))
+
+
+def is_font_face_cached(fonts_dir, entry, ttl=FONT_MANIFEST_TTL):
+    """
+    Whether a manifest entry can be used as is. Its files have to still be in fonts_dir, and unless ttl is None,
+    it has to have been fetched less than ttl seconds ago
+    """
+    if not entry or any(not os.path.isfile(os.path.join(fonts_dir, filename)) for filename in entry['files']):
+        return False
+    return ttl is None or time.time() - entry['fetched'] < ttl
+
+
+def fetch_font_face(font_family, fonts_dir):
+    """
+    Gets the font face CSS of a family from Google Fonts, downloading its font files to fonts_dir
+    :return: a manifest entry with the CSS pointing to the local files, or None if the family couldn't be fetched
+    """
+    # The CSS is the existence check, so there's one request for the CSS of a family in production
+    font_face_css_url = get_prod_font_face_url(font_family)
+    font_face_css = get_url(font_face_css_url, catch_exception=True)
+    if not font_face_css:
+        font_face_css_url = get_earlyaccess_font_face_url(font_family)
+        font_face_css = get_url(font_face_css_url, catch_exception=True)
+    if not font_face_css:
+        return None
+    new_font_face_css = []
+    files = []
+    for line in font_face_css.split("\n"):
+        m = FONT_URL_REGEX.match(line)
+        if m:
+            font_url = m.group(2)
+            if font_url.startswith('//'):
+                font_url = f'https:{font_url}'
+            filename = os.path.basename(font_url)
+            filepath = os.path.join(fonts_dir, filename)
+            if not os.path.exists(filepath):
+                download_file(font_url, filepath)
+            files.append(filename)
+            line = f'{m.group(1)} url(fonts/{filename}{m.group(3)}){m.group(4)}'
+        new_font_face_css.append(line)
+    return {'url': font_face_css_url, 'css': "\n".join(new_font_face_css), 'files': files, 'fetched': time.time()}
+
+
+def get_font_face_css(font_families, fonts_dir, offline=False, ttl=FONT_MANIFEST_TTL):
+    """
+    Gets the font face CSS of the Noto families, from the manifest in fonts_dir if they were fetched less than ttl
+    seconds ago, else from Google Fonts. Families that can't be fetched (e.g. offline) use their cached CSS however
+    old it is, or are left out
+    :return: the CSS of all the families
+    """
+    manifest = load_font_manifest(fonts_dir)
+    changed = False
+    font_face_css = []
+    for font_family in font_families:
+        if 'Noto' not in font_family:
+            continue
+        entry = manifest.get(font_family)
+        if not is_font_face_cached(fonts_dir, entry, None if offline else ttl):
+            fetched = None
+            if not offline:
+                try:
+                    fetched = fetch_font_face(font_family, fonts_dir)
+                except IOError as e:
+                    logging.getLogger().warning(f'Unable to download the fonts of {font_family}: {e}')
+            if fetched:
+                entry = manifest[font_family] = fetched
+                changed = True
+            elif not is_font_face_cached(fonts_dir, entry, None):
+                logging.getLogger().warning(f'No font face for {font_family}' + (' offline' if offline else ''))
+                continue
+        font_face_css.append(entry['css'])
+    if changed:
+        # Merged with what other processes may have fetched since it was loaded
+        manifest = dict(load_font_manifest(fonts_dir), **manifest)
+        save_font_manifest(fonts_dir, manifest)
+    return "\n".join(font_face_css)
+
+
+def get_font_files(font_families, fonts_dir):
+    """
+    :return: paths of the downloaded font files of the families, in the order of the families
+    """
+    manifest = load_font_manifest(fonts_dir)
+    font_files = []
+    for font_family in font_families:
+        for filename in manifest.get(font_family, {}).get('files', []):
+            font_file = os.path.join(fonts_dir, filename)
+            if font_file not in font_files and os.path.isfile(font_file):
+                font_files.append(font_file)
+    return font_files
+
+
+def get_font_html_with_local_fonts(lang_code, html_dir, offline=False):
+    """
+    The font face CSS for a language, with the font files downloaded to html_dir/fonts. It is cached for the process
+    per language and directory, and the font faces are cached on disk for all processes by get_font_face_css()
+    """
+    key = (lang_code, os.path.abspath(html_dir))
+    if key in _font_html_with_local_fonts:
+        return _font_html_with_local_fonts[key]
     font_families = get_font_families_with_fallbacks(lang_code)
-    font_face_html = ''
     fonts_dir = os.path.join(html_dir, 'fonts')
     if not os.path.exists(fonts_dir):
-        os.mkdir(fonts_dir)
-    for font_family in font_families:
-        if 'Noto' in font_family:
-            if get_prod_font_face(font_family):
-                font_face_css_url = get_prod_font_face_url(font_family)
-            else:
-                font_face_css_url = get_earlyaccess_font_face_url(font_family)
-            font_face_css = get_url(font_face_css_url)
-            new_font_face_css = []
-            for line in font_face_css.split("\n"):
-                m = re.match(r"^(.*) url\(([^)#?]+)(.*)\)(.*)$", line)
-                if m:
-                    font_url = m.group(2)
-                    if font_url.startswith('//'):
-                        font_url = f'https:{font_url}'
-                    filename = os.path.basename(font_url)
-                    filepath = os.path.join(html_dir, 'fonts', filename)
-                    if not os.path.exists(filepath):
-                        download_file(font_url, filepath)
-                    line = f'{m.group(1)} url(fonts/{filename}{m.group(3)}){m.group(4)}'
-                new_font_face_css.append(line)
-            font_face_html += "\n".join(new_font_face_css)
+        os.makedirs(fonts_dir, exist_ok=True)
+    font_face_html = get_font_face_css(font_families, fonts_dir, offline)
     html = f"""
 <style>
 {font_face_html}
@@ -140,4 +242,5 @@ def get_font_html_with_local_fonts(lang_code, html_dir):
     }}
 </style>
 """
+    _font_html_with_local_fonts[key] = html
     return html
@@ -1,8 +1,18 @@
 import re
+import html as html_lib
 import string
-from bs4 import BeautifulSoup, Tag
+from functools import lru_cache
+from bs4 import BeautifulSoup, Tag, NavigableString
+from bs4.builder import HTMLTreeBuilder
 from .alignment_tools import flatten_alignment
 
+WORD_REGEX_CACHE_SIZE = 2048
+VERSE_INDEX_CACHE_SIZE = 256
+HTML_TAG_REGEX = re.compile(r'<(/?)([A-Za-z][A-Za-z0-9]*)\b[^>]*?(/?)>')
+# The v-num span the renderer opens a verse with, whichever order its class and id are in
+V_NUM_SPAN_REGEX = re.compile(r'\s*<span (?:class="v-num" id="([^"]*)"|id="([^"]*)" class="v-num")',
+                              flags=re.IGNORECASE | re.MULTILINE)
+IMG_SRC_REGEX = re.compile(r'(<img\b[^>]*?\ssrc\s*=\s*)(?:"([^"]*)"|\'([^\']*)\')', flags=re.IGNORECASE)
 PHRASE_PARTS_TO_IGNORE = ['a', 'am', 'an', 'and', 'as', 'are', 'at', 'be', 'by', 'did', 'do', 'does', 'done', 'for', 'from', 'had', 'has', 'have', 'i', 'in', 'into', 'less', 'let', 'may', 'might', 'more', 'my', 'not', 'is', 'of', 'on', 'one', 'onto', 'than', 'the', 'their', 'then', 'this', 'that', 'those', 'these', 'to', 'was', 'we', 'who', 'whom', 'with', 'will', 'were', 'your', 'you', 'would', 'could', 'should', 'shall', 'can']
 
 
@@ -48,9 +58,82 @@ def get_text_strings_from_element(wrapper):
     return text_strings
 
 
+# This gets tricky for phrases that start/end with curly quotes, as then
+# it doesn't see a word break (\b) before or after it, so we also have to look for
+# beginning/end of string (^ $) and punctuation before/after it
+WORD_BREAK_BEFORE = rf'(?:^|\b|(?<=[{re.escape(string.punctuation)}\s]))'
+WORD_BREAK_AFTER = rf'(?:$|\b|(?=[{re.escape(string.punctuation)}\s]))'
+
+
+@lru_cache(maxsize=WORD_REGEX_CACHE_SIZE)
+def get_word_regex(words, break_on_word=True):
+    """
+    Returns a compiled regex that finds any of the given words (a string or tuple of strings), respecting
+    word breaks if break_on_word is set. Compiled patterns are kept in a bounded LRU cache.
+    """
+    if isinstance(words, str):
+        words = (words,)
+    # Longest first so an alternation doesn't stop at a word that is a prefix of another
+    alternation = '|'.join(re.escape(word) for word in sorted(set(words), key=len, reverse=True))
+    if break_on_word:
+        return re.compile(rf'{WORD_BREAK_BEFORE}(?:{alternation}){WORD_BREAK_AFTER}')
+    return re.compile(alternation)
+
+
+class VerseTextIndex:
+    """
+    Offsets of every word looked up in a verse's text, so repeated phrase lookups
+    in the same verse (TW words, TN quotes, quote variations) only scan the text once per word.
+    """
+    def __init__(self, text):
+        self.text = text
+        self.offsets = {}
+
+    def find(self, word, break_on_word=True):
+        key = (word, break_on_word)
+        if key not in self.offsets:
+            regex = get_word_regex(word, break_on_word)
+            self.offsets[key] = [m.start() for m in regex.finditer(self.text)]
+        return self.offsets[key]
+
+    def find_all(self, words, break_on_word=True):
+        """
+        Finds all the given words in one sweep of the text, returning a dict of word => offsets.
+        """
+        words = tuple(sorted(set(words)))
+        missing = [word for word in words if (word, break_on_word) not in self.offsets]
+        if missing:
+            for word in missing:
+                self.offsets[(word, break_on_word)] = []
+            regex = get_word_regex(tuple(missing), break_on_word)
+            pos = 0
+            while True:
+                m = regex.search(self.text, pos)
+                if not m:
+                    break
+                # Record every word starting here, not just the longest, so the results match find()
+                for word in missing:
+                    if self.text.startswith(word, m.start()):
+                        self.offsets[(word, break_on_word)].append(m.start())
+                pos = m.start() + 1
+            if break_on_word:
+                # A shorter word inside the longest match may not end on a word break, so double-check those
+                for word in missing:
+                    self.offsets[(word, break_on_word)] = [
+                        start for start in self.offsets[(word, break_on_word)]
+                        if get_word_regex(word, break_on_word).match(self.text, start)]
+        return {word: self.offsets[(word, break_on_word)] for word in words}
+
+
+@lru_cache(maxsize=VERSE_INDEX_CACHE_SIZE)
+def get_verse_text_index(text):
+    return VerseTextIndex(text)
+
+
 def mark_phrases_in_html(html, phrases, tag='<span class="highlight">', break_on_word=True):
     soup = BeautifulSoup(html, 'html.parser')
     text = soup.text
+    text_index = get_verse_text_index(text)
     for phrase_idx, words in enumerate(phrases):
         phrase = flatten_alignment([words])
 
@@ -60,17 +143,7 @@ def mark_phrases_in_html(html, phrases, tag='<span class="highlight">', break_on
         first_word = words[0]['word']
         first_word_occurrence = words[0]['occurrence']
 
-        if break_on_word:
-            # This gets tricky for phrases that start/end with curly quotes, as then
-            # it doesn't see a word break (\b) before or after it, so we also have to look for
-            # beginning/end of string (^ $) and punctuation before/after it
-            word_break_before = rf'(^|\b|(?<=[{re.escape(string.punctuation)}\s]))'
-            word_break_after = rf'($|\b|(?=[{re.escape(string.punctuation)}\s]))'
-        else:
-            word_break_before = ''
-            word_break_after = ''
-
-        start_indices = [i.start() for i in re.finditer(rf'{word_break_before}{re.escape(first_word)}{word_break_after}', text)]
+        start_indices = text_index.find(first_word, break_on_word)
 
         if len(start_indices) < first_word_occurrence:
             return
@@ -135,8 +208,8 @@ def unnest_a_links(html):
     return html
 
 
-def find_quote_variation_in_text(text, phrase, occurrence=1, ignore_small_words=True):
-    quote_variations = [
+def get_quote_variations(phrase):
+    return [
         # All curly quotes made straight
         phrase.replace('‘', "'").replace('’', "'").replace('“', '"').replace('”', '"'),
         # All straight quotes made curly, first single and double pointing right
@@ -153,11 +226,49 @@ def find_quote_variation_in_text(text, phrase, occurrence=1, ignore_small_words=
         phrase.replace('’', "'"),
         # All right pointing curly single quotes made straight
         phrase.replace('‘', "'")]
-    for quote_variation in quote_variations:
-        if quote_variation != phrase:
-            marked_text = mark_phrases_in_html(text, quote_variation)
-            if marked_text:
-                return quote_variation
+
+
+def find_quote_variation_in_text(text, phrase, occurrence=1, ignore_small_words=True):
+    """
+    Returns the first quote variation of phrase (see get_quote_variations()) that is found in the given
+    text (HTML or plain), looking up all the variations in one sweep of the text.
+    """
+    if '<' in text:
+        text = BeautifulSoup(text, 'html.parser').text
+    variations = []
+    for quote_variation in get_quote_variations(phrase):
+        if quote_variation != phrase and quote_variation not in variations:
+            variations.append(quote_variation)
+    if not variations:
+        return
+    variation_parts = {}
+    for quote_variation in variations:
+        parts = [part.strip() for part in re.split(r'\s*(?:…|\.\.\.)\s*', quote_variation)]
+        if ignore_small_words and len(parts) > 1:
+            parts = [part for part in parts if part.lower() not in PHRASE_PARTS_TO_IGNORE] or parts
+        variation_parts[quote_variation] = list(filter(None, parts))
+    all_parts = [part for parts in variation_parts.values() for part in parts]
+    if not all_parts:
+        return
+    offsets = get_verse_text_index(text).find_all(all_parts)
+    for quote_variation in variations:
+        parts = variation_parts[quote_variation]
+        if not parts:
+            continue
+        # The first part must occur <occurrence> times, and each following part after the previous one
+        starts = offsets[parts[0]]
+        if len(starts) < occurrence:
+            continue
+        position = starts[occurrence - 1] + len(parts[0])
+        found = True
+        for part in parts[1:]:
+            following = [start for start in offsets[part] if start >= position]
+            if not following:
+                found = False
+                break
+            position = following[0] + len(part)
+        if found:
+            return quote_variation
 
 
 def increment_headers(html, increase_depth=1):
@@ -205,3 +316,140 @@ def make_first_header_section_header(html, level=None, no_toc=False, no_header=F
         if header_level:
             header['header-level'] = header_level
     return str(soup)
+
+
+def get_open_tags(html):
+    """
+    Returns the names of the elements still open at the end of the HTML, outermost first, nested the way
+    BeautifulSoup's html.parser nests them (it never closes an element implicitly), or None if an end tag closes
+    an element opened before the HTML, in which case the HTML can't be parsed on its own the same way
+    """
+    open_tags = []
+    for m in HTML_TAG_REGEX.finditer(html):
+        is_end, name, self_closing = m.group(1), m.group(2).lower(), m.group(3)
+        if name in HTMLTreeBuilder.DEFAULT_EMPTY_ELEMENT_TAGS:
+            continue
+        if is_end:
+            if name not in open_tags:
+                return None
+            while open_tags.pop() != name:
+                pass
+        elif not self_closing:
+            open_tags.append(name)
+    return open_tags
+
+
+def serialize_html_elements(elements, nested=False):
+    """
+    Serializes elements the way callers join the contents of a soup, where top-level strings aren't escaped, or,
+    if nested, the way BeautifulSoup serializes them inside a tag
+    """
+    if nested:
+        return ''.join([x.output_ready() if isinstance(x, NavigableString) else '%s' % x for x in elements])
+    return ''.join(['%s' % x for x in elements])
+
+
+def get_text_html(text, nested=False):
+    if not text:
+        return ''
+    soup = BeautifulSoup(f'<div>{text}</div>', 'html.parser')
+    return serialize_html_elements(soup.div.contents, nested)
+
+
+def parse_html_chunk(html, process_soup=None):
+    """
+    Parses a chunk of HTML with BeautifulSoup apart from the chunks around it, for join_html_chunks(). Only the HTML
+    from its first tag to the end of its last one is parsed, as the text at either end belongs to a string that
+    continues into the next chunk and BeautifulSoup only keeps whitespace-only strings as they are when they are
+    part of a longer one. process_soup(soup) can change the soup before it is serialized, or return False to give up.
+    :return: [leading text, HTML, HTML for when it's nested in the elements earlier chunks leave open, trailing text,
+        elements left open (see get_open_tags())], or None if the chunk wouldn't be parsed the same way on its own
+    """
+    tags = list(HTML_TAG_REGEX.finditer(html))
+    if not tags:
+        return [html, '', '', '', []] if '<' not in html else None
+    start = tags[0].start()
+    end = tags[-1].end()
+    if '<' in html[:start] or '<' in html[end:]:
+        return None
+    open_tags = get_open_tags(html[start:end])
+    if open_tags is None:
+        return None
+    soup = BeautifulSoup(html[start:end], 'html.parser')
+    if process_soup and process_soup(soup) is False:
+        return None
+    end_tags = ''.join([f'</{tag}>' for tag in reversed(open_tags)])
+    chunk_htmls = []
+    for nested in [False, True]:
+        chunk_html = serialize_html_elements(soup.contents, nested)
+        if not chunk_html.endswith(end_tags):
+            return None
+        chunk_htmls.append(chunk_html[:len(chunk_html) - len(end_tags)])
+    return [html[:start], chunk_htmls[0], chunk_htmls[1], html[end:], open_tags]
+
+
+def join_html_chunks(chunks):
+    """
+    Joins chunks from parse_html_chunk() into what serialize_html_elements() returns for the contents of the soup of
+    the whole HTML
+    """
+    html = ''
+    text = ''
+    open_tags = []
+    for leading_text, chunk_html, nested_chunk_html, trailing_text, chunk_open_tags in chunks:
+        text += leading_text
+        if chunk_html:
+            html += get_text_html(text, bool(open_tags)) + (nested_chunk_html if open_tags else chunk_html)
+            text = trailing_text
+        open_tags += chunk_open_tags
+    return html + get_text_html(text, bool(open_tags)) + ''.join([f'</{tag}>' for tag in reversed(open_tags)])
+
+
+def get_img_srcs(html):
+    """
+    Returns the unique src attributes of the img tags in the HTML, without parsing it all
+    """
+    srcs = {}
+    for match in IMG_SRC_REGEX.finditer(html):
+        srcs[html_lib.unescape(match.group(2) if match.group(2) is not None else match.group(3))] = True
+    return list(srcs)
+
+
+def replace_img_srcs(html, srcs):
+    """
+    Replaces the src attributes of img tags in one pass
+    :param srcs: {src: new src}, src as returned by get_img_srcs()
+    """
+    def replace_src(match):
+        src = html_lib.unescape(match.group(2) if match.group(2) is not None else match.group(3))
+        if src not in srcs:
+            return match.group(0)
+        return f'{match.group(1)}"{html_lib.escape(srcs[src])}"'
+    return IMG_SRC_REGEX.sub(replace_src, html)
+
+
+def get_plain_scripture_html(verse_html, bible_id):
+    """
+    Gets the HTML of a verse from SingleFilelessHtmlRenderer.render_verses() the way it is shown in the notes: each
+    verse in a verse div, without paragraphs, with its footnotes after it and their ids prefixed by the bible id
+    """
+    footnotes_split = re.compile('<div class="footnotes">', flags=re.IGNORECASE | re.MULTILINE)
+    verses_and_footnotes = re.split(footnotes_split, verse_html, maxsplit=1)
+    scripture = verses_and_footnotes[0]
+    footnotes = ''
+    if len(verses_and_footnotes) == 2:
+        footnotes = f'<div class="footnotes">{verses_and_footnotes[1]}'
+    html = ''
+    if scripture:
+        scripture = V_NUM_SPAN_REGEX.sub(lambda m: f'</div><div class="verse"><span class="v-num" '
+                                                   f'id="{m.group(1) or m.group(2)}"', scripture)
+        scripture = re.sub(r'^</div>', '', scripture)
+        if scripture and '<div class="verse">' in scripture:
+            scripture += '</div>'
+        html = scripture + footnotes
+        html = re.sub(r'\s*\n\s*', ' ', html, flags=re.IGNORECASE | re.MULTILINE)
+        html = re.sub(r'\s*</*p[^>]*>\s*', ' ', html, flags=re.IGNORECASE | re.MULTILINE)
+        html = html.strip()
+        html = re.sub('id="(ref-)*fn-', rf'id="{bible_id}-\1fn-', html, flags=re.IGNORECASE | re.MULTILINE)
+        html = re.sub('href="#(ref-)*fn-', rf'href="#{bible_id}-\1fn-', html, flags=re.IGNORECASE | re.MULTILINE)
+    return html
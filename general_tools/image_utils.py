@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+#
+#  Copyright (c) 2021 unfoldingWord
+#  http://creativecommons.org/licenses/MIT/
+#  See LICENSE file for details.
+
+"""
+Content-addressed cache of images normalized for print: no wider than the page at IMAGE_DPI, JPEG unless they have
+transparency, without metadata. The same image downloaded for different languages is normalized once and stored
+once
+"""
+import io
+import os
+import hashlib
+from PIL import Image
+from .file_utils import write_file_atomically
+
+IMAGE_CACHE_DIR = 'image_cache'
+IMAGE_DPI = 300
+MAX_PRINT_WIDTH = 5.25  # Inches, of the widest page content an image is printed across
+MAX_IMAGE_WIDTH = int(MAX_PRINT_WIDTH * IMAGE_DPI)  # px
+JPEG_QUALITY = 85
+NORMALIZE_VERSION = 1  # Change to normalize cached images again
+
+
+def get_image_key(data, max_width=MAX_IMAGE_WIDTH, quality=JPEG_QUALITY):
+    """
+    Hash of an image's bytes and of how it is normalized, which its normalized image is stored under
+    """
+    key = hashlib.sha1(f'{NORMALIZE_VERSION}:{max_width}:{quality}\n'.encode('utf-8'))
+    key.update(data)
+    return key.hexdigest()
+
+
+def has_transparency(image):
+    return image.mode in ['RGBA', 'LA', 'PA'] or (image.mode == 'P' and 'transparency' in image.info)
+
+
+def normalize_image_data(data, max_width=MAX_IMAGE_WIDTH, quality=JPEG_QUALITY):
+    """
+    :return: [normalized bytes, file extension], or the original bytes and extension if normalizing doesn't make
+        them smaller
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        original_format = (image.format or '').lower()
+        image.load()
+        resized = image.width > max_width
+        if resized:
+            image = image.resize((max_width, round(image.height * max_width / image.width)), Image.LANCZOS)
+        output = io.BytesIO()
+        if has_transparency(image):
+            image.save(output, 'PNG', optimize=True)
+            extension = 'png'
+        else:
+            image.convert('RGB').save(output, 'JPEG', quality=quality, optimize=True, progressive=True)
+            extension = 'jpg'
+    normalized = output.getvalue()
+    if not resized and len(normalized) >= len(data) and original_format in ['jpeg', 'png']:
+        return [data, 'jpg' if original_format == 'jpeg' else 'png']
+    return [normalized, extension]
+
+
+def get_normalized_image(image_file, cache_dir, max_width=MAX_IMAGE_WIDTH, quality=JPEG_QUALITY):
+    """
+    Normalizes an image into the cache, unless the same image has been already
+    :return: the path of the normalized image in cache_dir, or None if the file isn't an image PIL can read
+    """
+    with open(image_file, 'rb') as f:
+        data = f.read()
+    key = get_image_key(data, max_width, quality)
+    key_dir = os.path.join(cache_dir, key[:2])
+    for extension in ['jpg', 'png']:
+        cached_file = os.path.join(key_dir, f'{key}.{extension}')
+        if os.path.isfile(cached_file):
+            return cached_file
+    try:
+        normalized, extension = normalize_image_data(data, max_width, quality)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+    cached_file = os.path.join(key_dir, f'{key}.{extension}')
+    write_file_atomically(cached_file, normalized)
+    return cached_file
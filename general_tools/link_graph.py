@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+#
+#  Copyright (c) 2021 unfoldingWord
+#  http://creativecommons.org/licenses/MIT/
+#  See LICENSE file for details.
+
+"""
+Graphs of the TA and TW articles each TA and TW article links to, built from the markdown of a repo once per commit
+so the articles an appendix needs can be found without rendering the ones it doesn't
+"""
+import os
+import re
+import json
+import hashlib
+import markdown2
+from collections import deque
+from .file_utils import load_json_object, write_file_atomically
+from .link_rewriter import fix_ta_links, fix_tw_links
+from .ta_tools import get_dependency_project, get_recommended_project
+
+LINK_GRAPH_CACHE_DIR = 'link_graph'
+# the "?:" in the regex means to not leave the (ta|tw) match in the result
+RC_LINK_REGEX = re.compile(r'rc://[A-Z0-9_*-]+/(?:ta|tw)/[A-Z0-9/_*-]+', flags=re.IGNORECASE | re.MULTILINE)
+TA_MARKDOWN_EXTRAS = ['markdown-in-html', 'tables', 'break-on-newline']
+
+_link_graphs = {}
+_link_graph_hash = None
+
+
+def get_rc_links(html):
+    """
+    :return: the TA and TW rc links in the HTML, in order, each once
+    """
+    return list(dict.fromkeys(RC_LINK_REGEX.findall(html)))
+
+
+def get_ta_article_links(article_file, lang_code, ta_index, project_id, article_config=None):
+    """
+    Finds the links of a TA article the same way they are in its rendered HTML: its config.yaml dependencies, the
+    links of its 01.md, then its config.yaml recommendations
+    :param ta_index: get_ta_index() of the repo
+    :param article_config: the article's entry in its project's config.yaml
+    """
+    if not isinstance(article_config, dict):
+        article_config = {}
+    rc_links = []
+    for dependency in article_config.get('dependencies') or []:
+        rc_links.append(f'rc://{lang_code}/ta/man/{get_dependency_project(ta_index, dependency, project_id)}/'
+                        f'{dependency}')
+    html = markdown2.markdown_path(article_file, extras=TA_MARKDOWN_EXTRAS)
+    rc_links += get_rc_links(fix_ta_links(html, lang_code, project_id))
+    for recommended in article_config.get('recommended') or []:
+        rec_project = get_recommended_project(ta_index, recommended, project_id)
+        if rec_project:
+            rc_links.append(f'rc://{lang_code}/ta/man/{rec_project}/{recommended}')
+    return list(dict.fromkeys(rc_links))
+
+
+def get_tw_article_links(article_file, lang_code, group):
+    """
+    Finds the links of a TW article the same way they are in its rendered HTML
+    :param group: the category the article is in, which its ../<term>.md links are to
+    """
+    return get_rc_links(fix_tw_links(markdown2.markdown_path(article_file), lang_code, group))
+
+
+def build_ta_link_graph(ta_dir, lang_code, ta_index):
+    """
+    :param ta_index: get_ta_index() of the repo
+    :return: {'<project>/<slug>/01.md': get_ta_article_links()} of every article of a TA repo
+    """
+    graph = {}
+    for slug, project_ids in ta_index['slugs'].items():
+        for project_id in project_ids:
+            article_file = os.path.join(ta_dir, project_id, slug, '01.md')
+            if os.path.isfile(article_file):
+                config = ta_index['configs'].get(project_id) or {}
+                graph[f'{project_id}/{slug}/01.md'] = get_ta_article_links(article_file, lang_code, ta_index,
+                                                                            project_id, config.get(slug))
+    return graph
+
+
+def build_tw_link_graph(tw_dir, lang_code, tw_index):
+    """
+    :param tw_index: get_tw_index() of the repo
+    :return: {'bible/<category>/<term>.md': get_tw_article_links()} of every article of a TW repo
+    """
+    graph = {}
+    for term, categories in tw_index.items():
+        for category in categories:
+            graph[f'bible/{category}/{term}.md'] = get_tw_article_links(
+                os.path.join(tw_dir, 'bible', category, f'{term}.md'), lang_code, category)
+    return graph
+
+
+def get_link_graph_hash():
+    """
+    Hash of the source of this module and of the link rewrites, so a graph found by older code is never used
+    """
+    global _link_graph_hash
+    if not _link_graph_hash:
+        link_graph_hash = hashlib.sha1()
+        for module_file in [__file__, os.path.join(os.path.dirname(__file__), 'link_rewriter.py')]:
+            with open(module_file, 'rb') as f:
+                link_graph_hash.update(f.read())
+        _link_graph_hash = link_graph_hash.hexdigest()
+    return _link_graph_hash
+
+
+def get_link_graph(build, cache_dir=None, repo_name=None, commit=None, lang_code=None):
+    """
+    Gets the link graph of a TA or TW repo, which is built once per repo and commit, kept for the process and saved
+    in cache_dir for other processes
+    :param build: function that builds the graph, e.g. lambda: build_ta_link_graph(ta_dir, lang_code, ta_index)
+    :param cache_dir: where graphs are saved, or None to not save it
+    :param repo_name: the repo and commit the graph is of, without which the graph is built every time
+    :param lang_code: the language of the rc links in the graph
+    """
+    if not repo_name or not commit:
+        return build()
+    key = (repo_name, commit, lang_code)
+    if key in _link_graphs:
+        return _link_graphs[key]
+    cache_file = None
+    graph = None
+    if cache_dir:
+        cache_file = os.path.join(cache_dir, repo_name, commit, f'{lang_code}-{get_link_graph_hash()[:10]}.json')
+        try:
+            graph = load_json_object(cache_file)
+        except (OSError, ValueError):
+            graph = None
+    if graph is None:
+        graph = build()
+        if cache_file:
+            write_file_atomically(cache_file, json.dumps(graph, ensure_ascii=False))
+    _link_graphs[key] = graph
+    return graph
+
+
+def get_linking_levels(start_links, get_links, max_level):
+    """
+    Breadth-first search from the starting articles, so each linked article gets the lowest number of links it takes
+    to reach it
+    :param start_links: {rc link: [rc links]} of the articles at level 0
+    :param get_links: function that returns the rc links of a linked article, or None if it has no article
+    :param max_level: the highest level whose articles' links are followed
+    :return: {rc link: [linking level, [rc links of the articles linking to it, in the order found]]}, in the order
+        found, with the starting articles at level 0
+    """
+    levels = {rc_link: [0, []] for rc_link in start_links}
+    queue = deque((source, 0, rc_links) for source, rc_links in start_links.items())
+    while queue:
+        source, level, rc_links = queue.popleft()
+        for rc_link in rc_links:
+            if rc_link not in levels:
+                levels[rc_link] = [level + 1, []]
+                if level + 1 <= max_level:
+                    linked_links = get_links(rc_link)
+                    if linked_links is not None:
+                        queue.append((rc_link, level + 1, linked_links))
+            if source not in levels[rc_link][1]:
+                levels[rc_link][1].append(source)
+    return levels
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+#
+#  Copyright (c) 2021 unfoldingWord
+#  http://creativecommons.org/licenses/MIT/
+#  See LICENSE file for details.
+
+"""
+Rewrites the links of TA, TW and TSV articles to rc:// links. The patterns are compiled once, with the language,
+project and group only in the replacements, and the rewrites of a stage are applied in one scan of the article
+"""
+import re
+
+LINK_FLAGS = re.IGNORECASE | re.MULTILINE
+
+
+class LinkRewriter(object):
+    """
+    Applies stages of rewrites to a text. The rewrites of a stage are combined into one regex, so the text is scanned
+    once per stage, trying the rewrites in order at each position. That is the same as applying the stage's rewrites
+    one after the other as long as none of them can match inside what another matches or writes, so rewrites that
+    can are put in a later stage
+    """
+
+    def __init__(self, stages, flags=0):
+        """
+        :param stages: [[pattern]], the patterns of each stage in the order they used to be applied
+        """
+        self.stages = []
+        for patterns in stages:
+            regexes = [re.compile(pattern, flags) for pattern in patterns]
+            combined = re.compile('|'.join(f'(?P<rewrite{idx}>{regex.pattern})' for idx, regex in enumerate(regexes)),
+                                  flags) if len(regexes) > 1 else None
+            self.stages.append([regexes, combined])
+
+    def rewrite(self, text, *replacements):
+        """
+        :param replacements: a replacement for each pattern of each stage, in order, as for re.sub(): a template with
+            the pattern's own group numbers (e.g. r'href="\1"'), or a function of the pattern's match
+        """
+        idx = 0
+        for regexes, combined in self.stages:
+            stage_replacements = replacements[idx:idx + len(regexes)]
+            idx += len(regexes)
+            if not combined:
+                text = regexes[0].sub(stage_replacements[0], text)
+                continue
+
+            def replace(match, text=text, regexes=regexes, stage_replacements=stage_replacements):
+                rewrite_idx = int(match.lastgroup[7:])
+                # Matches the rewrite's own regex where the combined one matched, for its own group numbers
+                rewrite_match = regexes[rewrite_idx].match(text, match.start())
+                replacement = stage_replacements[rewrite_idx]
+                return replacement(rewrite_match) if callable(replacement) else rewrite_match.expand(replacement)
+
+            text = combined.sub(replace, text)
+        return text
+
+
+# ../../<project>/<slug>/01.md, ../<slug>/01.md and <slug>
+TA_LINKS = LinkRewriter([[r'href="\.\./\.\./([^/"]+)/([^/"]+?)/*(01\.md)*"',
+                          r'href="\.\./([^/"]+?)/*(01\.md)*"',
+                          r'href="([^# :/"]+)"']], LINK_FLAGS)
+# ../<term>.md and ../<group>/<term>.md links, then (kt/<term>.md) and [[../names/<term>]] references, which can
+# contain the links
+TW_LINKS = LinkRewriter([[r'href="\.\./([^/)]+?)(\.md)*"',
+                          r'href="\.\./([^)]+?)(\.md)*"'],
+                         [r'(\(|\[\[)(\.\./)*(kt|names|other)/([^)]+?)(\.md)*(\)|\]\])(?!\[)']], LINK_FLAGS)
+# [[http...]], then URLs not already in a link, then www. URLs. Each can match in what the one before wrote, e.g. in
+# [[http://a.org[[http://b.org]], so they are applied one after the other
+URL_LINKS = LinkRewriter([[r'\[\[http([^\]]+)\]\]'],
+                          [r'([^">])((http|https|ftp)://[A-Za-z0-9/?&_.:=#-]+[A-Za-z0-9/?&_:=#-])'],
+                          [r'([^/])(www\.[A-Za-z0-9/?&_.:=#-]+[A-Za-z0-9/?&_:=#-])']], re.IGNORECASE)
+# <a ... href="./05.md">, <a ... href="../02/05.md"> and <a ... href="../../tit/02/05.md"> in TSV notes
+TSV_LINK_REGEX = re.compile(r'<a([^>]+)href="(\.[^"]+)"([^>]*)>(.*?)</a>')
+
+
+def fix_ta_links(text, lang_code, project):
+    return TA_LINKS.rewrite(text,
+                            rf'href="rc://{lang_code}/ta/man/\1/\2"',
+                            rf'href="rc://{lang_code}/ta/man/{project}/\1"',
+                            rf'href="rc://{lang_code}/ta/man/{project}/\1"')
+
+
+def fix_tw_links(text, lang_code, group):
+    return TW_LINKS.rewrite(text,
+                            rf'href="rc://{lang_code}/tw/dict/bible/{group}/\1"',
+                            rf'href="rc://{lang_code}/tw/dict/bible/\1"',
+                            rf'[[rc://{lang_code}/tw/dict/bible/\3/\4]]')
+
+
+def fix_urls(html):
+    return URL_LINKS.rewrite(html,
+                             r'<a href="http\1">http\1</a>',
+                             r'\1<a href="\2">\2</a>',
+                             r'\1<a href="http://\2">\2</a>')
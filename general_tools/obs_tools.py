@@ -1,40 +1,122 @@
 import os
+import re
+import copy
+import json
+import hashlib
 import markdown2
 from bs4 import BeautifulSoup
+from .file_utils import load_json_object, write_file_atomically
 
+OBS_INDEX_CACHE_DIR = 'obs_index'
+CHAPTER_FILE_REGEX = re.compile(r'^(\d+)\.md$')
 
-def get_obs_chapter_data(obs_dir, chapter_num):
-    obs_chapter_data = {
+_obs_indexes = {}
+_obs_tools_hash = None
+
+
+def get_empty_chapter_data():
+    return {
         'title': None,
         'frames': [],
         'bible_reference': None
     }
+
+
+def parse_obs_chapter(obs_chapter_file):
+    """
+    Renders a story's markdown to get its title, frames (image and text HTML) and bible reference
+    """
+    obs_chapter_data = get_empty_chapter_data()
+    soup = BeautifulSoup(markdown2.markdown_path(obs_chapter_file), 'html.parser')
+    obs_chapter_data['title'] = soup.h1.text
+    paragraphs = soup.find_all('p')
+    frame = {
+        'image': '',
+        'text': ''
+    }
+    for idx, p in enumerate(paragraphs):
+        if p.img:
+            src = p.img['src'].split('?')[0]
+            if frame['image']:
+                obs_chapter_data['frames'].append(frame)
+                frame = {
+                    'image': '',
+                    'text': ''
+                }
+            frame['image'] = src
+            p.img.extract()
+        if p.text:
+            if idx == len(paragraphs) - 1 and frame['text']:
+                obs_chapter_data['bible_reference'] = p.text
+            else:
+                frame['text'] += str(p)
+    if frame['image']:
+        obs_chapter_data['frames'].append(frame)
+    return obs_chapter_data
+
+
+def build_obs_index(obs_dir):
+    """
+    :return: {chapter_num: parse_obs_chapter() data} of every story in the OBS repo, e.g. {'01': {...}}
+    """
+    content_dir = os.path.join(obs_dir, 'content')
+    obs_index = {}
+    if os.path.isdir(content_dir):
+        for filename in sorted(os.listdir(content_dir)):
+            m = CHAPTER_FILE_REGEX.match(filename)
+            if m and os.path.isfile(os.path.join(content_dir, filename)):
+                obs_index[m.group(1)] = parse_obs_chapter(os.path.join(content_dir, filename))
+    return obs_index
+
+
+def get_obs_tools_hash():
+    """
+    Hash of this module's source, so an index parsed by older code is never used
+    """
+    global _obs_tools_hash
+    if not _obs_tools_hash:
+        with open(__file__, 'rb') as f:
+            _obs_tools_hash = hashlib.sha1(f.read()).hexdigest()
+    return _obs_tools_hash
+
+
+def get_obs_index(obs_dir, cache_dir=None, repo_name=None, commit=None):
+    """
+    Gets the index of all stories of an OBS repo, which is built once per repo and commit, kept for the process and
+    saved in cache_dir for other processes
+    :param cache_dir: where indexes are saved, or None to not save it
+    :param repo_name: the repo and commit obs_dir is of, without which the index is built every time
+    :return: build_obs_index() of the repo
+    """
+    if not repo_name or not commit:
+        return build_obs_index(obs_dir)
+    key = (repo_name, commit)
+    if key in _obs_indexes:
+        return _obs_indexes[key]
+    cache_file = None
+    obs_index = None
+    if cache_dir:
+        cache_file = os.path.join(cache_dir, repo_name, commit, f'obs_index-{get_obs_tools_hash()[:10]}.json')
+        try:
+            obs_index = load_json_object(cache_file)
+        except (OSError, ValueError):
+            obs_index = None
+    if obs_index is None:
+        obs_index = build_obs_index(obs_dir)
+        if cache_file:
+            write_file_atomically(cache_file, json.dumps(obs_index, ensure_ascii=False))
+    _obs_indexes[key] = obs_index
+    return obs_index
+
+
+def get_obs_chapter_data(obs_dir, chapter_num, obs_index=None):
+    """
+    :param obs_index: the get_obs_index() of obs_dir, else the chapter's file is parsed
+    :return: the title, frames and bible reference of a story, which the caller is free to change
+    """
+    if obs_index is not None:
+        return copy.deepcopy(obs_index.get(chapter_num, get_empty_chapter_data()))
     obs_chapter_file = os.path.join(obs_dir, 'content', f'{chapter_num}.md')
     if os.path.isfile(obs_chapter_file):
-        soup = BeautifulSoup(markdown2.markdown_path(os.path.join(obs_dir, 'content', f'{chapter_num}.md')),
-                             'html.parser')
-        obs_chapter_data['title'] = soup.h1.text
-        paragraphs = soup.find_all('p')
-        frame = {
-            'image': '',
-            'text': ''
-        }
-        for idx, p in enumerate(paragraphs):
-            if p.img:
-                src = p.img['src'].split('?')[0]
-                if frame['image']:
-                    obs_chapter_data['frames'].append(frame)
-                    frame = {
-                        'image': '',
-                        'text': ''
-                    }
-                frame['image'] = src
-                p.img.extract()
-            if p.text:
-                if idx == len(paragraphs) - 1 and frame['text']:
-                    obs_chapter_data['bible_reference'] = p.text
-                else:
-                    frame['text'] += str(p)
-        if frame['image']:
-            obs_chapter_data['frames'].append(frame)
-    return obs_chapter_data
+        return parse_obs_chapter(obs_chapter_file)
+    return get_empty_chapter_data()
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+#
+#  Copyright (c) 2021 unfoldingWord
+#  http://creativecommons.org/licenses/MIT/
+#  See LICENSE file for details.
+
+"""
+Estimates, before the first render, the font size each fit-to-page article (e.g. an OBS page of two frames) needs to
+fit on one page. The page box comes from the @page rule of the style sheets and the text is measured with the
+metrics of the language's fonts, so the render loop of PdfConverter.generate_pdf() only has to shrink the pages
+the estimate got wrong
+"""
+import os
+import re
+import json
+import math
+import fcntl
+import unicodedata
+from PIL import Image
+from fontTools.ttLib import TTFont
+from .file_utils import load_json_object, write_file_atomically
+
+FIT_TO_PAGE_PREFIX = 'fit-to-page-'
+FIT_REPORT_FILE = 'fit_estimates.json'
+FONT_SIZE_STEP = 0.05  # em, what the render loop shrinks an overflowing page by
+MIN_FONT_SIZE = 0.5  # em
+FIT_SAFETY = 0.97  # Fraction of the page height the estimated height has to fit in, for what isn't measured
+DEFAULT_CHAR_WIDTH = 0.55  # em, for characters none of the fonts has
+LINE_HEIGHT = 1.2  # em, of .obs-text
+PARAGRAPH_SPACING = 1.0  # em, the default margin between paragraphs
+BIBLE_REFERENCE_SIZE = 0.9  # em, of .bible-reference
+IMAGE_PADDING = 3.75  # pt, the 5px under each .obs-img
+DEFAULT_IMAGE_ASPECT = 9 / 16  # Height over width of the OBS images, when an image can't be read
+DEFAULT_PAGE_SIZE = [612, 792]  # pt, US letter
+DEFAULT_FONT_SIZE = 12  # pt
+
+UNITS = {'pt': 1, 'px': 0.75, 'in': 72, 'cm': 72 / 2.54, 'mm': 72 / 25.4, 'pc': 12}
+LENGTH_REGEX = re.compile(r'^(-?[\d.]+)(pt|px|in|cm|mm|pc)?$')
+PAGE_RULE_REGEX = re.compile(r'@page\s*\{([^{}]*)')
+BODY_FONT_SIZE_REGEX = re.compile(r'(?:^|\})\s*body\s*\{[^}]*?font-size:\s*([^;}]+)', flags=re.MULTILINE)
+PAGE_SIZES = {'letter': [612, 792], 'a4': [595.28, 841.89], 'a5': [419.53, 595.28], 'legal': [612, 1008]}
+
+
+def parse_length(value, default=None):
+    """
+    :return: the CSS length in pt, e.g. 28 for "28pt" and 378 for "5.25in", or default if it isn't one
+    """
+    m = LENGTH_REGEX.match(value.strip())
+    if not m:
+        return default
+    return float(m.group(1)) * UNITS[m.group(2) or 'px']
+
+
+def get_page_geometry(css_texts):
+    """
+    Gets the page content box from the last unnamed @page rule of the style sheets
+    :return: {'width', 'height'} in pt
+    """
+    size = DEFAULT_PAGE_SIZE
+    margins = [54, 54, 54, 54]
+    for css in css_texts:
+        for rule in PAGE_RULE_REGEX.findall(css):
+            declarations = dict(re.findall(r'([\w-]+)\s*:\s*([^;]+);', rule))
+            if 'size' in declarations:
+                values = declarations['size'].split()
+                if values[0].lower() in PAGE_SIZES:
+                    size = list(PAGE_SIZES[values[0].lower()])
+                    if 'landscape' in values:
+                        size.reverse()
+                elif len(values) >= 2:
+                    size = [parse_length(values[0], size[0]), parse_length(values[1], size[1])]
+            if 'margin' in declarations:
+                values = [parse_length(value, 0) for value in declarations['margin'].split()]
+                # top, right, bottom, left, as in CSS shorthand
+                margins = (values * 4)[:4] if len(values) == 1 else \
+                    [values[0], values[1], values[0], values[1]] if len(values) == 2 else \
+                    [values[0], values[1], values[2], values[1]] if len(values) == 3 else values[:4]
+    return {'width': size[0] - margins[1] - margins[3], 'height': size[1] - margins[0] - margins[2]}
+
+
+def get_base_font_size(css_texts):
+    font_size = DEFAULT_FONT_SIZE
+    for css in css_texts:
+        for value in BODY_FONT_SIZE_REGEX.findall(css):
+            font_size = parse_length(value, font_size)
+    return font_size
+
+
+class FontMetrics(object):
+    """
+    Advance widths of characters, in em, from the first of the fonts that has each character
+    """
+
+    def __init__(self, font_files=None):
+        self.fonts = []
+        self.widths = {}
+        for font_file in font_files or []:
+            try:
+                font = TTFont(font_file, lazy=True)
+                self.fonts.append([font.getBestCmap() or {}, font['hmtx'].metrics, font['head'].unitsPerEm])
+            except Exception:
+                # Fonts fontTools can't read (e.g. woff2 without brotli) just aren't measured
+                continue
+
+    def char_width(self, char):
+        if char not in self.widths:
+            width = None
+            for cmap, metrics, units_per_em in self.fonts:
+                glyph = cmap.get(ord(char))
+                if glyph and glyph in metrics:
+                    width = metrics[glyph][0] / units_per_em
+                    break
+            if width is None:
+                width = 1.0 if unicodedata.east_asian_width(char) in ['W', 'F'] else DEFAULT_CHAR_WIDTH
+            self.widths[char] = width
+        return self.widths[char]
+
+    def text_width(self, text):
+        return sum(self.char_width(char) for char in text)
+
+
+def count_lines(text, metrics, font_size, width):
+    """
+    Lines the text wraps to, breaking at spaces, or anywhere in a word wider than a line (e.g. in CJK scripts)
+    """
+    space = metrics.char_width(' ') * font_size
+    lines = 0
+    line_width = None
+    for word in text.split():
+        word_width = metrics.text_width(word) * font_size
+        if line_width is not None and line_width + space + word_width <= width:
+            line_width += space + word_width
+            continue
+        if word_width > width:
+            lines += math.ceil(word_width / width)
+            line_width = word_width % width
+        else:
+            lines += 1
+            line_width = word_width
+    return lines
+
+
+def estimate_article_height(article, metrics, font_size, width, image_aspects=None):
+    """
+    :param article: the fit-to-page article's BeautifulSoup element
+    :param font_size: of its text, in pt
+    :param image_aspects: {src: height over width} of the article's images
+    :return: the estimated height of the article in pt
+    """
+    height = 0
+    for img in article.find_all('img'):
+        aspect = (image_aspects or {}).get(img.get('src'), DEFAULT_IMAGE_ASPECT)
+        height += width * aspect + IMAGE_PADDING
+    for text in article.select('.obs-text'):
+        paragraphs = text.find_all('p') or [text]
+        for paragraph in paragraphs:
+            lines = count_lines(paragraph.get_text(' '), metrics, font_size, width)
+            height += lines * LINE_HEIGHT * font_size
+        height += len(paragraphs) * PARAGRAPH_SPACING * font_size
+    for reference in article.select('.bible-reference'):
+        reference_size = font_size * BIBLE_REFERENCE_SIZE
+        height += count_lines(reference.get_text(' '), metrics, reference_size, width) * LINE_HEIGHT * reference_size
+    return height
+
+
+def estimate_font_size(article, geometry, metrics, base_font_size, image_aspects=None):
+    """
+    :return: the largest font size in em, in FONT_SIZE_STEP steps down from 1, at which the article is estimated to
+        fit on a page
+    """
+    font_size = 1.0
+    while font_size > MIN_FONT_SIZE:
+        height = estimate_article_height(article, metrics, base_font_size * font_size, geometry['width'],
+                                         image_aspects)
+        if height <= geometry['height'] * FIT_SAFETY:
+            break
+        font_size = round(font_size - FONT_SIZE_STEP, 2)
+    return font_size
+
+
+def get_image_aspects(srcs, base_dir):
+    """
+    :return: {src: height over width} of the images that are local files, relative to base_dir
+    """
+    aspects = {}
+    for src in srcs:
+        path = os.path.normpath(os.path.join(base_dir, src))
+        if src and '://' not in src and os.path.isfile(path):
+            try:
+                with Image.open(path) as image:
+                    if image.width:
+                        aspects[src] = image.height / image.width
+            except OSError:
+                continue
+    return aspects
+
+
+def update_fit_report(report_file, lang_code, pages, right):
+    """
+    Adds a render's count of fit-to-page pages, and of the pages whose estimated font size fit without resizing, to
+    the language's totals. Converters running at the same time take turns with a lock on <report_file>.lock
+    :return: the language's totals, {'renders', 'pages', 'right'}
+    """
+    os.makedirs(os.path.dirname(report_file) or '.', exist_ok=True)
+    with open(f'{report_file}.lock', 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            try:
+                report = load_json_object(report_file, {})
+            except (OSError, ValueError):
+                report = {}
+            totals = report.setdefault(lang_code, {'renders': 0, 'pages': 0, 'right': 0})
+            totals['renders'] += 1
+            totals['pages'] += pages
+            totals['right'] += right
+            write_file_atomically(report_file, json.dumps(report, indent=2, sort_keys=True))
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+    return totals
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+#
+#  Copyright (c) 2020 unfoldingWord
+#  http://creativecommons.org/licenses/MIT/
+#  See LICENSE file for details.
+#
+#  Contributors:
+#  Richard Mahn <rich.mahn@unfoldingword.org>
+
+"""
+On-disk cache of SingleFilelessHtmlRenderer output, keyed by a hash of the USFM (and of the renderer's code), so
+converters rendering the same book of a bible can share the rendering
+"""
+import os
+import json
+import hashlib
+from collections import OrderedDict
+from .file_utils import write_file_atomically
+from tx_usfm_tools import abstractRenderer, parseUsfm, singleFilelessHtmlRenderer
+from tx_usfm_tools.singleFilelessHtmlRenderer import SingleFilelessHtmlRenderer
+
+RENDER_CACHE_DIR = 'render_cache'
+RENDER_CACHE_MAX_SIZE = 512 * 1024 * 1024  # Bytes, before the least recently used renderings are removed
+RENDERER_MODULES = [abstractRenderer, parseUsfm, singleFilelessHtmlRenderer]
+
+_renderer_hash = None
+
+
+def get_renderer_hash():
+    """
+    Hash of the renderer's source, so cached renderings of an older renderer are never used
+    """
+    global _renderer_hash
+    if not _renderer_hash:
+        renderer_hash = hashlib.sha1()
+        for module in RENDERER_MODULES:
+            with open(module.__file__, 'rb') as f:
+                renderer_hash.update(f.read())
+        _renderer_hash = renderer_hash.hexdigest()
+    return _renderer_hash
+
+
+def get_render_key(book_id, usfm, verses=False):
+    key = hashlib.sha1(get_renderer_hash().encode('utf-8'))
+    key.update(f'{"verses" if verses else "html"}\n{book_id}\n'.encode('utf-8'))
+    key.update(usfm.encode('utf-8'))
+    return key.hexdigest()
+
+
+def load_cached_render(cache_dir, key):
+    cache_file = os.path.join(cache_dir, f'{key}.json')
+    try:
+        with open(cache_file, encoding='utf-8') as f:
+            data = json.load(f, object_pairs_hook=OrderedDict)
+        os.utime(cache_file)  # Marks it as recently used
+    except (OSError, ValueError):
+        return None
+    return [data['output'], set(data['warnings'])]
+
+
+def save_cached_render(cache_dir, key, output, warnings, max_size=RENDER_CACHE_MAX_SIZE):
+    data = {'output': output, 'warnings': sorted(warnings)}
+    write_file_atomically(os.path.join(cache_dir, f'{key}.json'), json.dumps(data, ensure_ascii=False))
+    evict_cached_renders(cache_dir, max_size)
+
+
+def evict_cached_renders(cache_dir, max_size=RENDER_CACHE_MAX_SIZE):
+    """
+    Removes the least recently used renderings until the cache is no bigger than max_size
+    """
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith('.json'):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append([stat.st_mtime, stat.st_size, entry.path])
+    total_size = sum([entry[1] for entry in entries])
+    for mtime, size, path in sorted(entries):
+        if total_size <= max_size:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total_size -= size
+
+
+def render_usfm(book_id, usfm, cache_dir=None, verses=False):
+    """
+    Renders the USFM of a book with SingleFilelessHtmlRenderer, or gets the rendering from the cache
+    :param book_id: the book ID the renderer is given the USFM under, e.g. TIT
+    :param cache_dir: where renderings are cached, or None to not use the cache
+    :param verses: whether to return the render_verses() output instead of the render() output
+    :return: [html (or verses), warnings]
+    """
+    key = get_render_key(book_id, usfm, verses)
+    if cache_dir:
+        cached = load_cached_render(cache_dir, key)
+        if cached:
+            return cached
+    renderer = SingleFilelessHtmlRenderer({book_id: usfm})
+    output, warnings = renderer.render_verses() if verses else renderer.render()
+    if cache_dir:
+        save_cached_render(cache_dir, key, output, warnings)
+    return [output, warnings]
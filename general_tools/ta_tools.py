@@ -0,0 +1,85 @@
+import os
+import json
+import yaml
+from .file_utils import load_json_object, read_file, write_file_atomically
+
+TA_INDEX_CACHE_DIR = 'ta_index'
+
+_ta_indexes = {}
+
+
+def build_ta_index(ta_dir, project_ids):
+    """
+    Scans the projects of a TA repo
+    :param project_ids: the projects in manifest order, e.g. ['intro', 'process', 'translate', 'checking']
+    :return: {'configs': {project: its parsed config.yaml},
+              'slugs': {article slug: [projects with an article of that slug, in project order]}}
+    """
+    ta_index = {'configs': {}, 'slugs': {}}
+    for project_id in project_ids:
+        project_dir = os.path.join(ta_dir, project_id)
+        if not os.path.isdir(project_dir):
+            continue
+        config_file = os.path.join(project_dir, 'config.yaml')
+        if os.path.isfile(config_file):
+            ta_index['configs'][project_id] = yaml.full_load(read_file(config_file)) or {}
+        for entry in sorted(os.scandir(project_dir), key=lambda e: e.name):
+            if entry.is_dir():
+                ta_index['slugs'].setdefault(entry.name, []).append(project_id)
+    return ta_index
+
+
+def get_ta_index(ta_dir, project_ids, cache_dir=None, repo_name=None, commit=None):
+    """
+    Gets the index of a TA repo, which is built once per repo and commit, kept for the process and saved in cache_dir
+    for other processes
+    :param cache_dir: where indexes are saved, or None to not save it
+    :param repo_name: the repo and commit ta_dir is of, without which the index is built every time
+    :return: build_ta_index() of the repo
+    """
+    if not repo_name or not commit:
+        return build_ta_index(ta_dir, project_ids)
+    key = (repo_name, commit)
+    if key in _ta_indexes:
+        return _ta_indexes[key]
+    cache_file = None
+    ta_index = None
+    if cache_dir:
+        cache_file = os.path.join(cache_dir, repo_name, f'{commit}.json')
+        try:
+            ta_index = load_json_object(cache_file)
+        except (OSError, ValueError):
+            ta_index = None
+    if ta_index is None:
+        ta_index = build_ta_index(ta_dir, project_ids)
+        if cache_file:
+            # Dates and other values YAML parses to objects are saved as strings
+            write_file_atomically(cache_file, json.dumps(ta_index, ensure_ascii=False, default=str))
+    _ta_indexes[key] = ta_index
+    return ta_index
+
+
+def get_slug_projects(ta_index, slug):
+    """
+    :return: the projects that have an article of the slug, in project order
+    """
+    return ta_index['slugs'].get(slug, [])
+
+
+def get_dependency_project(ta_index, slug, project_id):
+    """
+    :return: the project a config.yaml dependency is linked in: the last project with the article, else project_id
+    """
+    projects = get_slug_projects(ta_index, slug)
+    return projects[-1] if projects else project_id
+
+
+def get_recommended_project(ta_index, slug, project_id):
+    """
+    :return: the project a config.yaml recommendation is linked in: project_id if it has the article, else the first
+        project with it, else None
+    """
+    projects = get_slug_projects(ta_index, slug)
+    if project_id in projects:
+        return project_id
+    return projects[0] if projects else None
@@ -0,0 +1,173 @@
+import os
+import shutil
+import subprocess
+import tempfile
+from glob import glob
+from unittest import TestCase, skipUnless
+from .bible_package import parse_usfm, get_tw_group_data, build_book_package, build_helps_package, get_build_info
+from .file_utils import write_file, load_json_object
+
+NODE_RESOURCES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'resources')
+HAS_NODE_RESOURCES = bool(shutil.which('node')) and \
+    os.path.isdir(os.path.join(NODE_RESOURCES_DIR, 'node_modules', 'tc-source-content-updater'))
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'bible_package')
+NODE_FIXTURES_DIR = os.path.join(FIXTURES_DIR, 'node')
+
+
+def read_fixture_usfm(repo_name):
+    with open(os.path.join(FIXTURES_DIR, repo_name, '57-TIT.usfm'), encoding='utf-8') as usfm_file:
+        return usfm_file.read()
+
+
+UGNT_TIT_USFM = read_fixture_usfm('el-x-koine_ugnt')
+ULT_TIT_USFM = read_fixture_usfm('en_ult')
+
+
+class TestBiblePackage(TestCase):
+
+    def test_parse_usfm(self):
+        chapters = parse_usfm(ULT_TIT_USFM)
+        self.assertEqual(list(chapters.keys()), ['1'])
+        self.assertEqual(list(chapters['1'].keys()), ['front', '1'])
+        verse_objects = chapters['1']['1']['verseObjects']
+        self.assertEqual(verse_objects[0]['type'], 'milestone')
+        self.assertEqual(verse_objects[0]['tag'], 'zaln')
+        self.assertEqual(verse_objects[0]['content'], 'Παῦλος')
+        self.assertEqual(verse_objects[0]['occurrence'], 1)
+        self.assertEqual(verse_objects[0]['children'],
+                         [{'text': 'Paul', 'tag': 'w', 'type': 'word', 'occurrence': 1, 'occurrences': 1}])
+        self.assertEqual(verse_objects[1], {'type': 'text', 'text': ',\n'})
+        self.assertEqual([child['text'] for child in verse_objects[2]['children']], ['a', '\n', 'servant'])
+        self.assertEqual(verse_objects[4], {'tag': 'q1', 'type': 'quote'})
+        self.assertEqual(verse_objects[6]['tag'], 'ts')
+        self.assertEqual(verse_objects[6]['children'], [])
+
+        ol_verse_objects = parse_usfm(UGNT_TIT_USFM)['1']['2']['verseObjects']
+        self.assertEqual(ol_verse_objects[0]['lemma'], 'ἐπί')
+        self.assertEqual(ol_verse_objects[2]['tw'], 'rc://*/tw/dict/bible/kt/hope')
+        self.assertEqual(ol_verse_objects[3], {'tag': 'f', 'type': 'footnote', 'content': '+ \\ft A note',
+                                               'endTag': 'f*'})
+
+    def test_get_tw_group_data(self):
+        tw_data = get_tw_group_data(parse_usfm(UGNT_TIT_USFM), 'tit')
+        self.assertEqual(sorted(tw_data.keys()), ['kt', 'names', 'other'])
+        self.assertEqual(sorted(tw_data['kt'].keys()), ['god', 'hope'])
+        servant = [item['contextId'] for item in tw_data['other']['servant']]
+        self.assertEqual([context_id['occurrence'] for context_id in servant], [1, 2])
+        self.assertEqual(servant[0]['reference'], {'bookId': 'tit', 'chapter': 1, 'verse': 1})
+        self.assertEqual(servant[0]['quote'], 'δοῦλος')
+        self.assertEqual(servant[0]['strong'], ['G14010'])
+        self.assertEqual(tw_data['kt']['god'][0]['contextId']['quote'], 'Θεοῦ')
+        self.assertEqual(tw_data['kt']['god'][0]['contextId']['tool'], 'translationWords')
+
+    def test_build_book_package(self):
+        temp_dir = tempfile.mkdtemp(prefix='bible_package_')
+        try:
+            bible_path = os.path.join(temp_dir, 'bibles', 'ugnt', 'v0.1')
+            tw_path = os.path.join(temp_dir, 'translationWords', 'v0.1')
+            write_file(os.path.join(tw_path, 'kt', 'groups', 'tit', 'stale.json'), [])
+            self.assertIsNotNone(build_book_package(UGNT_TIT_USFM, bible_path, 'tit', tw_path=tw_path, commit='abc'))
+            chapter_data = load_json_object(os.path.join(bible_path, 'tit', '1.json'))
+            self.assertEqual(sorted(chapter_data.keys()), ['1', '2', 'front'])
+            self.assertTrue(os.path.islink(os.path.join(bible_path, 'tit')))
+            self.assertFalse(os.path.exists(os.path.join(tw_path, 'kt', 'groups', 'tit', 'stale.json')))
+            self.assertEqual(len(load_json_object(os.path.join(tw_path, 'other', 'groups', 'tit', 'servant.json'))), 2)
+            self.assertEqual(get_build_info(os.path.join(bible_path, 'tit'))['commit'], 'abc')
+
+            # Unchanged USFM isn't rebuilt, even with a new commit
+            self.assertIsNone(build_book_package(UGNT_TIT_USFM, bible_path, 'tit', tw_path=tw_path, commit='def'))
+
+            # Another job building the same USFM leaves the published build in place
+            builds_path = os.path.join(bible_path, '.builds')
+            first_build = os.path.realpath(os.path.join(bible_path, 'tit'))
+            first_build_inode = os.stat(first_build).st_ino
+            build_book_package(UGNT_TIT_USFM, bible_path, 'tit', tw_path=tw_path, commit='abc', force=True)
+            self.assertEqual(first_build_inode, os.stat(first_build).st_ino)
+            self.assertEqual(os.listdir(builds_path), [os.path.basename(first_build)])
+
+            changed_usfm = UGNT_TIT_USFM.replace(' x-tw="rc://*/tw/dict/bible/names/paul"', '')
+            self.assertIsNotNone(build_book_package(changed_usfm, bible_path, 'tit', tw_path=tw_path, commit='def'))
+            self.assertEqual(get_build_info(os.path.join(bible_path, 'tit'))['commit'], 'def')
+            self.assertFalse(os.path.exists(os.path.join(tw_path, 'names', 'groups', 'tit')))
+            # The previous build is kept for jobs that may still be reading it until it is old
+            self.assertEqual(len(os.listdir(builds_path)), 2)
+            os.utime(os.path.realpath(os.path.join(bible_path, 'tit')), (0, 0))
+            self.assertIsNotNone(build_book_package(UGNT_TIT_USFM, bible_path, 'tit', tw_path=tw_path, commit='ghi'))
+            self.assertEqual(os.listdir(builds_path), [os.path.basename(first_build)])
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def test_build_helps_package(self):
+        temp_dir = tempfile.mkdtemp(prefix='helps_package_')
+        builds = []
+
+        def build():
+            # Like processBibles.js, building the TN group data in a scratch resources directory
+            built_dir = os.path.join(temp_dir, f'node-{len(builds)}', 'translationNotes')
+            write_file(os.path.join(built_dir, 'v1', 'tit', 'figs-metaphor.json'), [len(builds)])
+            builds.append(built_dir)
+            return built_dir
+        try:
+            helps_path = os.path.join(temp_dir, 'resources', 'en', 'translationHelps')
+            tn_path = os.path.join(helps_path, 'translationNotes')
+            commits = {'ugnt': 'a1', 'ult': 'b1', 'ust': 'c1', 'ta': 'd1', 'tw': 'e1', 'tn': 'f1'}
+            self.assertIsNotNone(build_helps_package(helps_path, 'translationNotes', commits, build))
+            self.assertTrue(os.path.islink(tn_path))
+            self.assertEqual([0], load_json_object(os.path.join(tn_path, 'v1', 'tit', 'figs-metaphor.json')))
+            self.assertEqual(commits, get_build_info(tn_path)['commits'])
+
+            # The same commits aren't rebuilt
+            self.assertIsNone(build_helps_package(helps_path, 'translationNotes', dict(commits), build))
+            self.assertEqual(1, len(builds))
+
+            # A new commit of only a bible the notes are aligned against is
+            self.assertIsNotNone(build_helps_package(helps_path, 'translationNotes', dict(commits, ugnt='a2'),
+                                                     build))
+            self.assertEqual(2, len(builds))
+            self.assertEqual([1], load_json_object(os.path.join(tn_path, 'v1', 'tit', 'figs-metaphor.json')))
+            self.assertIsNotNone(build_helps_package(helps_path, 'translationNotes', dict(commits, ult='b2'), build))
+            self.assertEqual(3, len(builds))
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def assert_matches_node_output(self, node_path):
+        temp_dir = tempfile.mkdtemp(prefix='bible_package_')
+        try:
+            tw_path = os.path.join(temp_dir, 'tw')
+            for resource_id, repo_name in [('ugnt', 'el-x-koine_ugnt'), ('ult', 'en_ult')]:
+                usfm = read_fixture_usfm(repo_name)
+                bible_path = os.path.join(temp_dir, resource_id)
+                build_book_package(usfm, bible_path, 'tit', tw_path=tw_path if resource_id == 'ugnt' else None)
+                node_chapter_files = sorted(glob(os.path.join(node_path, resource_id, 'tit', '*.json')))
+                self.assertTrue(node_chapter_files)
+                for node_chapter_file in node_chapter_files:
+                    self.assertEqual(load_json_object(node_chapter_file),
+                                     load_json_object(os.path.join(bible_path, 'tit',
+                                                                   os.path.basename(node_chapter_file))))
+
+            node_group_files = sorted(glob(os.path.join(node_path, 'tw', '*', 'groups', 'tit', '*.json')))
+            self.assertEqual([os.path.relpath(group_file, os.path.join(node_path, 'tw'))
+                              for group_file in node_group_files],
+                             sorted(os.path.relpath(group_file, tw_path) for group_file in
+                                    glob(os.path.join(tw_path, '*', 'groups', 'tit', '*.json'))))
+            for node_group_file in node_group_files:
+                self.assertEqual(load_json_object(node_group_file),
+                                 load_json_object(os.path.join(tw_path, os.path.relpath(
+                                     node_group_file, os.path.join(node_path, 'tw')))))
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    @skipUnless(os.path.isdir(NODE_FIXTURES_DIR),
+                'requires the fixture made by "node makeBiblePackageFixtures.js" in resources/')
+    def test_matches_node_fixture(self):
+        self.assert_matches_node_output(NODE_FIXTURES_DIR)
+
+    @skipUnless(HAS_NODE_RESOURCES, 'requires node and "npm install" in resources/')
+    def test_matches_node_output(self):
+        temp_dir = tempfile.mkdtemp(prefix='bible_package_node_')
+        try:
+            subprocess.check_call(['node', 'makeBiblePackageFixtures.js', FIXTURES_DIR, temp_dir],
+                                  cwd=NODE_RESOURCES_DIR)
+            self.assert_matches_node_output(temp_dir)
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
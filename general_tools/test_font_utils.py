@@ -0,0 +1,50 @@
+import os
+import time
+import shutil
+import tempfile
+from unittest import TestCase
+from .font_utils import get_font_face_css, save_font_manifest, load_font_manifest, is_font_face_cached, \
+    get_font_families_with_fallbacks
+from .file_utils import write_file
+
+FONT_FACE_CSS = """@font-face {
+  font-family: 'Noto Sans';
+  src: url(fonts/NotoSans-Regular.ttf) format('truetype');
+}"""
+
+
+class TestFontUtils(TestCase):
+
+    def setUp(self):
+        self.fonts_dir = tempfile.mkdtemp(prefix='font_utils_')
+
+    def tearDown(self):
+        shutil.rmtree(self.fonts_dir, ignore_errors=True)
+
+    def save_entry(self, fetched):
+        write_file(os.path.join(self.fonts_dir, 'NotoSans-Regular.ttf'), 'font')
+        save_font_manifest(self.fonts_dir, {'Noto Sans': {'url': 'https://fonts.googleapis.com/css2?family=Noto+Sans',
+                                                          'css': FONT_FACE_CSS, 'files': ['NotoSans-Regular.ttf'],
+                                                          'fetched': fetched}})
+
+    def test_get_font_face_css_from_manifest(self):
+        self.save_entry(time.time())
+        # Fresh entries are used without fetching anything, and families that aren't Noto are skipped
+        self.assertEqual(FONT_FACE_CSS, get_font_face_css(['Noto Sans', 'Arial'], self.fonts_dir))
+        self.assertEqual(FONT_FACE_CSS, get_font_face_css(['Noto Sans'], self.fonts_dir, offline=True))
+
+    def test_get_font_face_css_offline(self):
+        self.save_entry(time.time() - 365 * 24 * 60 * 60)
+        entry = load_font_manifest(self.fonts_dir)['Noto Sans']
+        self.assertFalse(is_font_face_cached(self.fonts_dir, entry))
+        # Offline, an expired entry is still used, and a family that was never fetched is left out
+        self.assertEqual(FONT_FACE_CSS, get_font_face_css(['Noto Sans', 'Noto Serif'], self.fonts_dir, offline=True))
+
+        os.remove(os.path.join(self.fonts_dir, 'NotoSans-Regular.ttf'))
+        self.assertFalse(is_font_face_cached(self.fonts_dir, entry, None))
+        self.assertEqual('', get_font_face_css(['Noto Sans'], self.fonts_dir, offline=True))
+
+    def test_get_font_families_with_fallbacks(self):
+        font_families = list(get_font_families_with_fallbacks('ar'))
+        self.assertEqual(font_families, get_font_families_with_fallbacks('ar'))
+        self.assertEqual('Noto Sans Syriac Eastern', font_families[0])
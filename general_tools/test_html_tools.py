@@ -1,5 +1,53 @@
+import os
+import re
+from collections import OrderedDict
 from unittest import TestCase
-from .html_tools import mark_phrases_in_html, unnest_a_links
+from bs4 import BeautifulSoup
+from tx_usfm_tools.singleFilelessHtmlRenderer import SingleFilelessHtmlRenderer
+from .file_utils import read_file
+from .html_tools import mark_phrases_in_html, unnest_a_links, find_quote_variation_in_text, get_verse_text_index, \
+    VerseTextIndex, get_open_tags, parse_html_chunk, join_html_chunks, serialize_html_elements, get_img_srcs, \
+    replace_img_srcs, get_plain_scripture_html
+
+TIT_USFM_FILE = os.path.join(os.path.dirname(__file__), 'fixtures', '57-TIT.usfm')
+
+
+def populate_book_data_by_render(unaligned_usfm, book_id):
+    """
+    How TsvPdfConverter.populate_book_data got the verses from render() before render_verses()
+    """
+    book_data = OrderedDict()
+    book_html, warnings = SingleFilelessHtmlRenderer({book_id: unaligned_usfm}).render()
+    html_verse_splits = re.split(r'(<span id="[^"]+-ch-0*(\d+)-v-(\d+(?:-\d+)?)" class="v-num">)', book_html)
+    for i in range(1, len(html_verse_splits), 4):
+        chapter = html_verse_splits[i+1]
+        book_data.setdefault(chapter, OrderedDict())
+        verse_html = html_verse_splits[i] + html_verse_splits[i+3]
+        verse_html = re.split('<h2', verse_html)[0]
+        verse_soup = BeautifulSoup(verse_html, 'html.parser')
+        for tag in verse_soup.find_all():
+            if (not tag.contents or len(tag.get_text(strip=True)) <= 0) and tag.name not in ['br', 'img']:
+                tag.decompose()
+        for verse in re.findall(r'\d+', html_verse_splits[i+2]):
+            book_data[chapter][verse.lstrip('0')] = str(verse_soup)
+    return book_data
+
+
+def get_plain_scripture_by_bs4_html(verse_html, bible_id):
+    """
+    How TsvPdfConverter.generate_plain_scripture worked on the BeautifulSoup output, whose v-num spans have the
+    class first
+    """
+    scripture, *footnotes = re.split('<div class="footnotes">', verse_html, maxsplit=1)
+    scripture = re.sub(r'\s*<span class="v-num"', '</div><div class="verse"><span class="v-num"', scripture)
+    scripture = re.sub(r'^</div>', '', scripture)
+    if scripture and '<div class="verse">' in scripture:
+        scripture += '</div>'
+    html = scripture + ''.join([f'<div class="footnotes">{footnote}' for footnote in footnotes])
+    html = re.sub(r'\s*\n\s*', ' ', html)
+    html = re.sub(r'\s*</*p[^>]*>\s*', ' ', html).strip()
+    html = re.sub('id="(ref-)*fn-', rf'id="{bible_id}-\1fn-', html)
+    return re.sub('href="#(ref-)*fn-', rf'href="#{bible_id}-\1fn-', html)
 
 
 class Test(TestCase):
@@ -65,3 +113,59 @@ class Test(TestCase):
         highlighted_html = mark_phrases_in_html(html, phrases, phrases_string)
         expected = '<div class="verse"><span class="v-num" id="en-ugnt-bible-tit-01-004"><sup><b>4</b></sup></span> Τίτῳ, γνησίῳ τέκνῳ, κατὰ κοινὴν πίστιν: <span class="highlight">χάρις καὶ εἰρήνη</span> ἀπὸ Θεοῦ Πατρὸς  καὶ Χριστοῦ Ἰησοῦ  τοῦ Σωτῆρος ἡμῶν.</div>'
         self.assertEqual(expected, highlighted_html)
+
+    def test_find_quote_variation_in_text(self):
+        html = '<div class="verse"><span class="v-num">5</span> He said, “Go,” and she said, ‘I won’t.’</div>'
+        self.assertEqual('“Go,”', find_quote_variation_in_text(html, '"Go,"'))
+        self.assertEqual('‘I won’t.’', find_quote_variation_in_text(html, "'I won't.'"))
+        self.assertEqual('He said, “Go', find_quote_variation_in_text(html, 'He said, "Go'))
+        self.assertEqual('“Go,”…‘I', find_quote_variation_in_text(html, '"Go,"…\'I'))
+        self.assertIsNone(find_quote_variation_in_text(html, '"Stay"'))
+        self.assertIsNone(find_quote_variation_in_text(html, '"Go,"', occurrence=2))
+
+    def test_verse_text_index(self):
+        text = 'the woman and the Moabite woman, womanly'
+        index = get_verse_text_index(text)
+        self.assertIs(index, get_verse_text_index(text))
+        self.assertEqual([4, 26], index.find('woman'))
+        self.assertEqual([4, 26, 33], index.find('woman', break_on_word=False))
+        self.assertEqual({'the': [0, 14], 'the woman': [0], 'woman': [4, 26]},
+                         VerseTextIndex(text).find_all(['the woman', 'woman', 'the']))
+
+
+    def test_get_open_tags(self):
+        self.assertEqual(['p', 'p'], get_open_tags('<p>a<p>b<br>c<span>d</span><ul><li>e</ul><hr/>'))
+        self.assertEqual([], get_open_tags('<b>a<i>b</b>'))
+        self.assertIsNone(get_open_tags('<p>a</span></p></div>'))
+
+    def test_join_html_chunks(self):
+        chunk_htmls = ['a &amp; b<p>Intro', '\n\n<h2>One</h2>\n<p>a &amp; b', '\n\n', ' text\n<p class="x">c</p>\n ',
+                       '\n\n<h2>Two</h2><ul><li>d</ul>\n']
+        html = ''.join(chunk_htmls)
+        chunks = [parse_html_chunk(chunk_html) for chunk_html in chunk_htmls]
+        self.assertEqual(serialize_html_elements(BeautifulSoup(html, 'html.parser').contents), join_html_chunks(chunks))
+        self.assertIsNone(parse_html_chunk('a</p>b'))
+
+    def test_replace_img_srcs(self):
+        html = '<p><img alt="a" src="http://x.org/a.png?w=1&amp;h=2"><img data-src="b.png" SRC=\'http://x.org/b.png\'>' \
+               '<img src="http://x.org/a.png?w=1&amp;h=2"/><img src="local.png"></p>'
+        self.assertEqual(['http://x.org/a.png?w=1&h=2', 'http://x.org/b.png', 'local.png'], get_img_srcs(html))
+        self.assertEqual('<p><img alt="a" src="../images/a.png"><img data-src="b.png" SRC="../images/b&amp;c.png">'
+                         '<img src="../images/a.png"/><img src="local.png"></p>',
+                         replace_img_srcs(html, {'http://x.org/a.png?w=1&h=2': '../images/a.png',
+                                                 'http://x.org/b.png': '../images/b&c.png'}))
+
+    def test_get_plain_scripture_html(self):
+        usfm = read_file(TIT_USFM_FILE)
+        verses, warnings = SingleFilelessHtmlRenderer({'TIT': usfm}).render_verses()
+        baseline = populate_book_data_by_render(usfm, 'TIT')
+        self.assertEqual(list(baseline), list(verses))
+        for chapter, chapter_verses in baseline.items():
+            self.assertEqual(list(chapter_verses), list(verses[chapter]))
+            for verse, verse_html in chapter_verses.items():
+                self.assertEqual(get_plain_scripture_by_bs4_html(verse_html, 'ult'),
+                                 get_plain_scripture_html(verses[chapter][verse]['html'], 'ult'), f'{chapter}:{verse}')
+        self.assertTrue(get_plain_scripture_html(verses['1']['1']['html'], 'ult').startswith(
+            '<div class="verse"><span class="v-num" id="056-ch-001-v-001"><sup><b>1</b></sup></span> Paul,'))
+        self.assertIn('<span id="ult-ref-fn-056-001-012-1">',
+                      get_plain_scripture_html(verses['1']['12']['html'], 'ult'))
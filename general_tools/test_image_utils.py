@@ -0,0 +1,45 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+from PIL import Image
+from .image_utils import get_normalized_image, MAX_IMAGE_WIDTH
+from .file_utils import write_file
+
+
+class TestImageUtils(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix='image_utils_')
+        self.cache_dir = os.path.join(self.temp_dir, 'image_cache')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def save_image(self, name, mode, size, color, image_format):
+        image_file = os.path.join(self.temp_dir, name)
+        Image.new(mode, size, color).save(image_file, image_format)
+        return image_file
+
+    def test_get_normalized_image(self):
+        # Too wide for the page at print resolution, and a PNG without transparency
+        wide_file = self.save_image('wide.png', 'RGB', (3150, 600), (200, 100, 50), 'PNG')
+        normalized_file = get_normalized_image(wide_file, self.cache_dir)
+        self.assertTrue(normalized_file.endswith('.jpg'))
+        with Image.open(normalized_file) as image:
+            self.assertEqual((MAX_IMAGE_WIDTH, 300), image.size)
+            self.assertEqual('JPEG', image.format)
+
+        # Transparency is kept
+        logo_file = self.save_image('logo.png', 'RGBA', (256, 256), (0, 0, 0, 0), 'PNG')
+        self.assertTrue(get_normalized_image(logo_file, self.cache_dir).endswith('.png'))
+
+        # The same image downloaded for another language is stored once
+        shutil.copy(wide_file, os.path.join(self.temp_dir, 'copy.png'))
+        self.assertEqual(normalized_file, get_normalized_image(os.path.join(self.temp_dir, 'copy.png'),
+                                                               self.cache_dir))
+        self.assertEqual(2, sum(len(files) for _, _, files in os.walk(self.cache_dir)))
+
+    def test_get_normalized_image_not_an_image(self):
+        write_file(os.path.join(self.temp_dir, 'error.jpg'), '<html>Not found</html>')
+        self.assertIsNone(get_normalized_image(os.path.join(self.temp_dir, 'error.jpg'), self.cache_dir))
@@ -0,0 +1,77 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+from . import link_graph
+from .link_graph import get_link_graph, build_ta_link_graph, build_tw_link_graph, get_linking_levels
+from .ta_tools import get_ta_index
+from .tw_tools import get_tw_index
+from .file_utils import write_file
+
+CONFIG_YAML = '''figs-metaphor:
+  recommended:
+    - figs-simile
+  dependencies:
+    - figs-intro
+'''
+
+
+class TestLinkGraph(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix='link_graph_')
+        self.ta_dir = os.path.join(self.temp_dir, 'en_ta')
+        self.tw_dir = os.path.join(self.temp_dir, 'en_tw')
+        write_file(os.path.join(self.ta_dir, 'translate', 'figs-metaphor', '01.md'),
+                   'Like [a simile](../figs-simile/01.md), see [[rc://en/tw/dict/bible/kt/god]].')
+        write_file(os.path.join(self.ta_dir, 'translate', 'figs-simile', '01.md'),
+                   'See [Translate](../../intro/translate-why/01.md).')
+        write_file(os.path.join(self.ta_dir, 'translate', 'figs-intro', '01.md'), 'No links')
+        write_file(os.path.join(self.ta_dir, 'intro', 'translate-why', '01.md'), 'No links')
+        write_file(os.path.join(self.ta_dir, 'translate', 'config.yaml'), CONFIG_YAML)
+        write_file(os.path.join(self.tw_dir, 'bible', 'kt', 'god.md'),
+                   '# God #\n\n* [lord](../kt/lord.md)\n* (See also: [[rc://en/ta/man/translate/figs-metaphor]])')
+        write_file(os.path.join(self.tw_dir, 'bible', 'kt', 'lord.md'), '# Lord #\n\n* [god](../god.md)')
+
+    def tearDown(self):
+        link_graph._link_graphs.clear()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_build_link_graphs(self):
+        ta_index = get_ta_index(self.ta_dir, ['intro', 'translate'])
+        self.assertEqual({
+            'intro/translate-why/01.md': [],
+            'translate/figs-intro/01.md': [],
+            'translate/figs-metaphor/01.md': ['rc://en/ta/man/translate/figs-intro',
+                                              'rc://en/ta/man/translate/figs-simile',
+                                              'rc://en/tw/dict/bible/kt/god'],
+            'translate/figs-simile/01.md': ['rc://en/ta/man/intro/translate-why'],
+        }, build_ta_link_graph(self.ta_dir, 'en', ta_index))
+        self.assertEqual({
+            'bible/kt/god.md': ['rc://en/tw/dict/bible/kt/lord', 'rc://en/ta/man/translate/figs-metaphor'],
+            'bible/kt/lord.md': ['rc://en/tw/dict/bible/kt/god'],
+        }, build_tw_link_graph(self.tw_dir, 'en', get_tw_index(self.tw_dir)))
+
+    def test_get_link_graph(self):
+        cache_dir = os.path.join(self.temp_dir, 'cache')
+        tw_index = get_tw_index(self.tw_dir)
+        graph = get_link_graph(lambda: build_tw_link_graph(self.tw_dir, 'en', tw_index), cache_dir, 'en_tw', 'abc',
+                               'en')
+        self.assertIs(graph, get_link_graph(None, cache_dir, 'en_tw', 'abc', 'en'))
+
+        # Loaded from the saved graph by another process
+        link_graph._link_graphs.clear()
+        self.assertEqual(graph, get_link_graph(None, cache_dir, 'en_tw', 'abc', 'en'))
+
+    def test_get_linking_levels(self):
+        graph = {'a': ['b', 'c'], 'b': ['d'], 'c': ['a', 'e'], 'd': ['f']}
+        linked = []
+
+        def get_links(rc_link):
+            linked.append(rc_link)
+            return graph.get(rc_link)
+        levels = get_linking_levels({'body': ['c', 'a'], 'a2': ['c']}, get_links, 1)
+        self.assertEqual({'body': [0, []], 'a2': [0, []], 'c': [1, ['body', 'a2', 'a']], 'a': [1, ['body', 'c']],
+                          'e': [2, ['c']], 'b': [2, ['a']]}, levels)
+        # Only the links of articles up to the level are needed
+        self.assertEqual(['c', 'a'], linked)
@@ -0,0 +1,68 @@
+import re
+import random
+from unittest import TestCase
+from .link_rewriter import fix_ta_links, fix_tw_links, fix_urls
+
+
+def fix_ta_links_by_passes(text, lang_code, project):
+    text = re.sub(r'href="\.\./\.\./([^/"]+)/([^/"]+?)/*(01\.md)*"', rf'href="rc://{lang_code}/ta/man/\1/\2"', text,
+                  flags=re.IGNORECASE | re.MULTILINE)
+    text = re.sub(r'href="\.\./([^/"]+?)/*(01\.md)*"', rf'href="rc://{lang_code}/ta/man/{project}/\1"', text,
+                  flags=re.IGNORECASE | re.MULTILINE)
+    text = re.sub(r'href="([^# :/"]+)"', rf'href="rc://{lang_code}/ta/man/{project}/\1"', text,
+                  flags=re.IGNORECASE | re.MULTILINE)
+    return text
+
+
+def fix_tw_links_by_passes(text, lang_code, group):
+    text = re.sub(r'href="\.\./([^/)]+?)(\.md)*"', rf'href="rc://{lang_code}/tw/dict/bible/{group}/\1"', text,
+                  flags=re.IGNORECASE | re.MULTILINE)
+    text = re.sub(r'href="\.\./([^)]+?)(\.md)*"', rf'href="rc://{lang_code}/tw/dict/bible/\1"', text,
+                  flags=re.IGNORECASE | re.MULTILINE)
+    text = re.sub(r'(\(|\[\[)(\.\./)*(kt|names|other)/([^)]+?)(\.md)*(\)|\]\])(?!\[)',
+                  rf'[[rc://{lang_code}/tw/dict/bible/\3/\4]]', text, flags=re.IGNORECASE | re.MULTILINE)
+    return text
+
+
+def fix_urls_by_passes(html):
+    html = re.sub(r'\[\[http([^\]]+)\]\]', r'<a href="http\1">http\1</a>', html, flags=re.IGNORECASE)
+    html = re.sub(r'([^">])((http|https|ftp)://[A-Za-z0-9/?&_.:=#-]+[A-Za-z0-9/?&_:=#-])', r'\1<a href="\2">\2</a>',
+                  html, flags=re.IGNORECASE)
+    html = re.sub(r'([^/])(www\.[A-Za-z0-9/?&_.:=#-]+[A-Za-z0-9/?&_:=#-])', r'\1<a href="http://\2">\2</a>', html,
+                  flags=re.IGNORECASE)
+    return html
+
+
+TA_PIECES = ['<a href="../../translate/figs-metaphor/01.md">', '<a href="../figs-simile/01.md">', '<a href="../x/">',
+             '<a href="figs-idiom">', '<a href="#note">', '<a href="../../checking/">', '<a HREF="../../a/b">',
+             '<a href="https://door43.org">', '</a>', 'Metaphor', ' ', '\n', '../', '01.md', '"']
+TW_PIECES = ['<a href="../god.md">', '<a href="../kt/god.md">', '<a href="../../other/bread">', '(kt/god.md)',
+             '(../names/paul.md)', '[[../other/bread]]', '[[kt/grace]]', '[[', ']]', '(', ')', '[', 'kt/',
+             'See: ', '</a>', ', ', '\n', '"', '.md']
+URL_PIECES = ['[[https://unfoldingword.org]]', 'http://door43.org/u/x?y=z#a', 'www.unfoldingword.org',
+              'https://www.google.com', '<a href="https://x.org">https://x.org</a>', 'ftp://files.org/a.',
+              '[[http://www.ufw.org/a]]', ' ', '>', '"', '/', '.', '[[', ']]', 'text', '\n']
+
+
+class TestLinkRewriter(TestCase):
+
+    def assert_same_as_passes(self, pieces, rewrite, rewrite_by_passes):
+        rand = random.Random(1)
+        for _ in range(3000):
+            text = ''.join(rand.choice(pieces) for _ in range(rand.randint(1, 12)))
+            self.assertEqual(rewrite_by_passes(text), rewrite(text), text)
+
+    def test_fix_ta_links(self):
+        self.assertEqual('<a href="rc://en/ta/man/translate/figs-simile">',
+                         fix_ta_links('<a href="../figs-simile/01.md">', 'en', 'translate'))
+        self.assert_same_as_passes(TA_PIECES, lambda t: fix_ta_links(t, 'en', 'translate'),
+                                   lambda t: fix_ta_links_by_passes(t, 'en', 'translate'))
+
+    def test_fix_tw_links(self):
+        self.assertEqual('See: [[rc://en/tw/dict/bible/kt/god]]', fix_tw_links('See: (kt/god.md)', 'en', 'other'))
+        self.assert_same_as_passes(TW_PIECES, lambda t: fix_tw_links(t, 'en', 'other'),
+                                   lambda t: fix_tw_links_by_passes(t, 'en', 'other'))
+
+    def test_fix_urls(self):
+        self.assertEqual('See <a href="http://www.ufw.org">www.ufw.org</a>', fix_urls('See www.ufw.org'))
+        self.assert_same_as_passes(URL_PIECES, fix_urls, fix_urls_by_passes)
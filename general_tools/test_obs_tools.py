@@ -0,0 +1,64 @@
+import os
+import shutil
+import tempfile
+from glob import glob
+from unittest import TestCase
+from . import obs_tools
+from .obs_tools import get_obs_index, get_obs_chapter_data, build_obs_index
+from .file_utils import write_file
+
+CHAPTER_MD = '''# 1. The Creation
+
+![OBS Image](https://cdn.door43.org/obs/jpg/360px/obs-en-01-01.jpg?raw=true)
+
+This is how the beginning of everything happened.
+
+![OBS Image](https://cdn.door43.org/obs/jpg/360px/obs-en-01-02.jpg)
+
+But God was there.
+
+_A Bible story from: Genesis 1-2_
+'''
+
+
+class TestObsTools(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix='obs_tools_')
+        self.obs_dir = os.path.join(self.temp_dir, 'en_obs')
+        write_file(os.path.join(self.obs_dir, 'content', '01.md'), CHAPTER_MD)
+        write_file(os.path.join(self.obs_dir, 'content', 'front', 'intro.md'), '# Front')
+
+    def tearDown(self):
+        obs_tools._obs_indexes.clear()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_get_obs_chapter_data(self):
+        chapter_data = get_obs_chapter_data(self.obs_dir, '01')
+        self.assertEqual('1. The Creation', chapter_data['title'])
+        self.assertEqual('A Bible story from: Genesis 1-2', chapter_data['bible_reference'])
+        self.assertEqual(['https://cdn.door43.org/obs/jpg/360px/obs-en-01-01.jpg',
+                          'https://cdn.door43.org/obs/jpg/360px/obs-en-01-02.jpg'],
+                         [frame['image'] for frame in chapter_data['frames']])
+        self.assertEqual('<p>But God was there.</p>', chapter_data['frames'][1]['text'])
+        self.assertEqual(None, get_obs_chapter_data(self.obs_dir, '02')['title'])
+
+        obs_index = build_obs_index(self.obs_dir)
+        self.assertEqual(['01'], list(obs_index.keys()))
+        self.assertEqual(chapter_data, get_obs_chapter_data(self.obs_dir, '01', obs_index))
+        self.assertEqual([], get_obs_chapter_data(self.obs_dir, '02', obs_index)['frames'])
+        # Callers get their own copy to change
+        get_obs_chapter_data(self.obs_dir, '01', obs_index)['frames'].pop()
+        self.assertEqual(2, len(obs_index['01']['frames']))
+
+    def test_get_obs_index_cached(self):
+        cache_dir = os.path.join(self.temp_dir, 'cache')
+        obs_index = get_obs_index(self.obs_dir, cache_dir, 'en_obs', 'test-index')
+        self.assertEqual(1, len(glob(os.path.join(cache_dir, 'en_obs', 'test-index', 'obs_index-*.json'))))
+        self.assertIs(obs_index, get_obs_index(self.obs_dir, cache_dir, 'en_obs', 'test-index'))
+
+        # Another process loads the index saved for the repo and commit, even if the files have since changed
+        write_file(os.path.join(self.obs_dir, 'content', '01.md'), '# Changed\n')
+        obs_tools._obs_indexes.clear()
+        self.assertEqual(obs_index, get_obs_index(self.obs_dir, cache_dir, 'en_obs', 'test-index'))
+        self.assertEqual('Changed', get_obs_index(self.obs_dir, cache_dir, 'en_obs', 'other')['01']['title'])
@@ -0,0 +1,94 @@
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+from bs4 import BeautifulSoup
+from fontTools.fontBuilder import FontBuilder
+from fontTools.pens.ttGlyphPen import TTGlyphPen
+from .page_fitting import get_page_geometry, get_base_font_size, FontMetrics, count_lines, estimate_font_size, \
+    update_fit_report, DEFAULT_CHAR_WIDTH
+from .file_utils import read_file
+
+CSS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'templates', 'css')
+FRAME_TEXT = 'God created everything. He created the universe and everything in it in six days. '
+
+
+def get_article(paragraphs):
+    text = ''.join(f'<p>{FRAME_TEXT * count}</p>' for count in paragraphs)
+    return BeautifulSoup(f'''<article class="obs-page" id="fit-to-page-01-01-02">
+    <div class="obs-frame"><img src="a.jpg" class="obs-img"/><div class="obs-text">{text}</div></div>
+    <div class="obs-frame"><img src="b.jpg" class="obs-img"/><div class="obs-text">{text}</div>
+    <div class="bible-reference">A Bible story from: Genesis 1-2</div></div>
+</article>''', 'html.parser').article
+
+
+def build_font(font_file, advance_width):
+    font_builder = FontBuilder(1000, isTTF=True)
+    font_builder.setupGlyphOrder(['.notdef', 'a', 'space'])
+    font_builder.setupCharacterMap({ord('a'): 'a', ord(' '): 'space'})
+    glyph = TTGlyphPen(None).glyph()
+    font_builder.setupGlyf({'.notdef': glyph, 'a': glyph, 'space': glyph})
+    font_builder.setupHorizontalMetrics({'.notdef': (500, 0), 'a': (advance_width, 0), 'space': (250, 0)})
+    font_builder.setupHorizontalHeader(ascent=800, descent=-200)
+    font_builder.setupNameTable({'familyName': 'Test', 'styleName': 'Regular'})
+    font_builder.setupOS2()
+    font_builder.setupPost()
+    font_builder.save(font_file)
+
+
+class TestPageFitting(TestCase):
+
+    def setUp(self):
+        self.css_texts = [read_file(os.path.join(CSS_DIR, 'style.css')),
+                          read_file(os.path.join(CSS_DIR, 'obs_style.css'))]
+
+    def test_get_page_geometry(self):
+        # 5.25in x 8in with 28pt margins
+        self.assertEqual({'width': 322, 'height': 520}, get_page_geometry(self.css_texts))
+        self.assertEqual({'width': 595.28 - 20, 'height': 841.89 - 20},
+                         get_page_geometry(['@page { size: A4; margin: 10pt; }']))
+        self.assertEqual(9, get_base_font_size(self.css_texts))
+
+    def test_font_metrics(self):
+        temp_dir = tempfile.mkdtemp(prefix='page_fitting_')
+        try:
+            build_font(os.path.join(temp_dir, 'narrow.ttf'), 400)
+            build_font(os.path.join(temp_dir, 'wide.ttf'), 800)
+            metrics = FontMetrics([os.path.join(temp_dir, 'narrow.ttf'), os.path.join(temp_dir, 'wide.ttf'),
+                                   os.path.join(temp_dir, 'missing.ttf')])
+            self.assertEqual(0.4, metrics.char_width('a'))
+            self.assertEqual(DEFAULT_CHAR_WIDTH, metrics.char_width('b'))
+            self.assertEqual(1.0, metrics.char_width('神'))
+            # 10pt "aaaaa" words are 20pt wide, with 2.5pt spaces
+            self.assertEqual(1, count_lines('aaaaa aaaaa', metrics, 10, 42.5))
+            self.assertEqual(2, count_lines('aaaaa aaaaa', metrics, 10, 42))
+            self.assertEqual(3, count_lines('aaaaaaaaaaaaaaa', metrics, 10, 25))
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def test_estimate_font_size(self):
+        geometry = get_page_geometry(self.css_texts)
+        metrics = FontMetrics()
+        self.assertEqual(1.0, estimate_font_size(get_article([1]), geometry, metrics, 9))
+        font_size = estimate_font_size(get_article([3, 2]), geometry, metrics, 9)
+        self.assertLess(font_size, 1.0)
+        self.assertLessEqual(estimate_font_size(get_article([3, 3]), geometry, metrics, 9), font_size)
+        # Shorter images leave room for more text
+        self.assertGreater(estimate_font_size(get_article([3, 2]), geometry, metrics, 9, {'a.jpg': 0.3, 'b.jpg': 0.3}),
+                           font_size)
+
+    def test_update_fit_report(self):
+        temp_dir = tempfile.mkdtemp(prefix='page_fitting_')
+        try:
+            report_file = os.path.join(temp_dir, 'fit_estimates.json')
+            update_fit_report(report_file, 'en', 10, 8)
+            update_fit_report(report_file, 'fr', 10, 10)
+            self.assertEqual({'renders': 2, 'pages': 20, 'right': 17}, update_fit_report(report_file, 'en', 10, 9))
+
+            # Converters updating it at the same time don't lose each other's counts
+            with ThreadPoolExecutor(8) as executor:
+                list(executor.map(lambda _: update_fit_report(report_file, 'de', 2, 1), range(40)))
+            self.assertEqual({'renders': 41, 'pages': 82, 'right': 41}, update_fit_report(report_file, 'de', 2, 1))
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
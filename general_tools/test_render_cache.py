@@ -0,0 +1,51 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+from .render_cache import render_usfm, get_render_key, save_cached_render, evict_cached_renders
+
+TIT_USFM = r'''\id TIT
+\h Titus
+\c 1
+\p
+\v 1 Paul, a servant\f + \ft a note\f* of God.
+\v 2 In hope of life,
+\c 2
+\p
+\v 1 But you, say what is fitting.
+\v 10 Not stealing.
+\v 2 Older men.
+'''
+
+
+class TestRenderCache(TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp(prefix='render_cache_')
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def test_render_usfm(self):
+        html, warnings = render_usfm('TIT', TIT_USFM, self.cache_dir)
+        self.assertEqual(1, len(os.listdir(self.cache_dir)))
+        self.assertEqual([html, warnings], render_usfm('TIT', TIT_USFM))
+        self.assertEqual([html, warnings], render_usfm('TIT', TIT_USFM, self.cache_dir))
+
+        key = get_render_key('TIT', TIT_USFM)
+        save_cached_render(self.cache_dir, key, 'cached html', {'a warning'})
+        self.assertEqual(['cached html', {'a warning'}], render_usfm('TIT', TIT_USFM, self.cache_dir))
+
+        verses, warnings = render_usfm('TIT', TIT_USFM, self.cache_dir, verses=True)
+        self.assertEqual(2, len(os.listdir(self.cache_dir)))
+        cached_verses, cached_warnings = render_usfm('TIT', TIT_USFM, self.cache_dir, verses=True)
+        self.assertEqual(['1', '10', '2'], list(cached_verses['2'].keys()))
+        self.assertEqual(verses, cached_verses)
+
+    def test_evict_cached_renders(self):
+        for idx, key in enumerate(['a', 'b', 'c']):
+            save_cached_render(self.cache_dir, key, 'x' * 1000, set())
+            os.utime(os.path.join(self.cache_dir, f'{key}.json'), (idx, idx))
+        os.utime(os.path.join(self.cache_dir, 'a.json'))  # Used most recently
+        evict_cached_renders(self.cache_dir, 2500)
+        self.assertEqual(['a.json', 'c.json'], sorted(os.listdir(self.cache_dir)))
@@ -0,0 +1,55 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+from . import ta_tools
+from .ta_tools import get_ta_index, get_slug_projects, get_dependency_project, get_recommended_project
+from .file_utils import write_file
+
+CONFIG_YAML = '''figs-metaphor:
+  recommended:
+    - figs-simile
+  dependencies:
+    - figs-intro
+'''
+
+
+class TestTaTools(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix='ta_tools_')
+        self.ta_dir = os.path.join(self.temp_dir, 'en_ta')
+        for path in ['intro/ta-intro', 'translate/figs-metaphor', 'translate/figs-simile', 'translate/figs-intro',
+                     'checking/figs-intro']:
+            write_file(os.path.join(self.ta_dir, path, '01.md'), path)
+        write_file(os.path.join(self.ta_dir, 'translate', 'config.yaml'), CONFIG_YAML)
+        write_file(os.path.join(self.ta_dir, 'translate', 'toc.yaml'), 'sections: []')
+
+    def tearDown(self):
+        ta_tools._ta_indexes.clear()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_get_ta_index(self):
+        cache_dir = os.path.join(self.temp_dir, 'cache')
+        project_ids = ['intro', 'translate', 'checking', 'process']
+        ta_index = get_ta_index(self.ta_dir, project_ids, cache_dir, 'en_ta', 'abc')
+        self.assertEqual(['figs-simile'], ta_index['configs']['translate']['figs-metaphor']['recommended'])
+        self.assertNotIn('intro', ta_index['configs'])
+        self.assertEqual(['translate', 'checking'], get_slug_projects(ta_index, 'figs-intro'))
+        self.assertEqual(['intro'], get_slug_projects(ta_index, 'ta-intro'))
+        self.assertEqual([], get_slug_projects(ta_index, 'toc.yaml'))
+        self.assertIs(ta_index, get_ta_index(self.ta_dir, project_ids, cache_dir, 'en_ta', 'abc'))
+
+        # Loaded from the saved index by another process
+        ta_tools._ta_indexes.clear()
+        shutil.rmtree(os.path.join(self.ta_dir, 'checking'))
+        self.assertEqual(ta_index, get_ta_index(self.ta_dir, project_ids, cache_dir, 'en_ta', 'abc'))
+        self.assertEqual(['translate'], get_slug_projects(get_ta_index(self.ta_dir, project_ids), 'figs-intro'))
+
+    def test_get_linked_projects(self):
+        ta_index = get_ta_index(self.ta_dir, ['intro', 'translate', 'checking'])
+        self.assertEqual('checking', get_dependency_project(ta_index, 'figs-intro', 'translate'))
+        self.assertEqual('translate', get_dependency_project(ta_index, 'no-article', 'translate'))
+        self.assertEqual('translate', get_recommended_project(ta_index, 'figs-intro', 'translate'))
+        self.assertEqual('translate', get_recommended_project(ta_index, 'figs-simile', 'intro'))
+        self.assertIsNone(get_recommended_project(ta_index, 'no-article', 'translate'))
@@ -0,0 +1,43 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+from . import tw_tools
+from .tw_tools import build_tw_index, get_tw_index, find_tw_term
+from .file_utils import write_file
+
+
+class TestTwTools(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix='tw_tools_')
+        self.tw_dir = os.path.join(self.temp_dir, 'en_tw')
+        for path in ['kt/god', 'kt/life', 'names/paul', 'other/falsegod', 'other/god', 'other/README']:
+            write_file(os.path.join(self.tw_dir, 'bible', f'{path}.md'), f'# {path}')
+        write_file(os.path.join(self.tw_dir, 'bible', 'other', 'notes.txt'), '')
+
+    def tearDown(self):
+        tw_tools._tw_indexes.clear()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_find_tw_term(self):
+        tw_index = build_tw_index(self.tw_dir)
+        self.assertEqual(['kt', 'other'], tw_index['god'])
+        self.assertNotIn('notes', tw_index)
+        self.assertEqual(['kt', 'god'], find_tw_term(tw_index, 'god'))
+        self.assertEqual(['other', 'god'], find_tw_term(tw_index, 'god', 'other'))
+        self.assertEqual(['names', 'paul'], find_tw_term(tw_index, 'paul', 'kt'))
+        self.assertEqual(['other', 'falsegod'], find_tw_term(tw_index, 'idol', None, {'idol': 'falsegod'}))
+        self.assertIsNone(find_tw_term(tw_index, 'idol'))
+        self.assertIsNone(find_tw_term(tw_index, 'witness', None, {'witness': 'testimony'}))
+
+    def test_get_tw_index_cached(self):
+        cache_dir = os.path.join(self.temp_dir, 'cache')
+        tw_index = get_tw_index(self.tw_dir, cache_dir, 'en_tw', 'abc')
+        self.assertTrue(os.path.isfile(os.path.join(cache_dir, 'en_tw', 'abc.json')))
+        self.assertIs(tw_index, get_tw_index(self.tw_dir, cache_dir, 'en_tw', 'abc'))
+
+        os.remove(os.path.join(self.tw_dir, 'bible', 'kt', 'life.md'))
+        tw_tools._tw_indexes.clear()
+        self.assertEqual(tw_index, get_tw_index(self.tw_dir, cache_dir, 'en_tw', 'abc'))
+        self.assertNotIn('life', get_tw_index(self.tw_dir, cache_dir, 'en_tw', 'def'))
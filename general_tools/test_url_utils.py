@@ -0,0 +1,120 @@
+import os
+import shutil
+import tempfile
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from unittest import TestCase
+from . import url_utils
+from .url_utils import download_files, get_session, fetch_url
+
+
+class ImageHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keeps connections alive
+    requests = []
+    flaky_fails = 1
+    down = False
+    statuses = []
+    in_flight = 0
+    max_in_flight = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        ImageHandler.requests.append([self.path, self.client_address])
+        if ImageHandler.down:
+            self.respond(503, b'unavailable')
+        elif self.path == '/etag.txt':
+            if self.headers.get('If-None-Match') == '"v1"':
+                self.respond(304, b'', etag='"v1"')
+            else:
+                self.respond(200, b'version 1', etag='"v1"')
+        elif self.path.startswith('/slow/'):
+            with ImageHandler.lock:
+                ImageHandler.in_flight += 1
+                ImageHandler.max_in_flight = max(ImageHandler.max_in_flight, ImageHandler.in_flight)
+            time.sleep(0.05)
+            with ImageHandler.lock:
+                ImageHandler.in_flight -= 1
+            self.respond(200, b'slow')
+        elif self.path == '/flaky.png' and ImageHandler.flaky_fails:
+            ImageHandler.flaky_fails -= 1
+            self.respond(503, b'unavailable')
+        elif self.path.startswith('/images/') or self.path == '/flaky.png':
+            self.respond(200, f'image {self.path}'.encode('utf-8'))
+        else:
+            self.respond(404, b'not found')
+
+    def respond(self, status, body, etag=None):
+        ImageHandler.statuses.append(status)
+        self.send_response(status)
+        self.send_header('Content-Type', 'image/png')
+        if etag:
+            self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestUrlUtils(TestCase):
+
+    def setUp(self):
+        ImageHandler.requests = []
+        ImageHandler.flaky_fails = 1
+        ImageHandler.max_in_flight = 0
+        ImageHandler.down = False
+        ImageHandler.statuses = []
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), ImageHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self.temp_dir = tempfile.mkdtemp(prefix='url_utils_')
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_download_files(self):
+        downloads = [(f'{self.url}/images/{idx}.png', os.path.join(self.temp_dir, 'images', f'{idx}.png'))
+                     for idx in range(20)]
+        downloads.append((f'{self.url}/flaky.png', os.path.join(self.temp_dir, 'flaky.png')))
+        downloads.append((f'{self.url}/missing.png', os.path.join(self.temp_dir, 'missing.png')))
+        with get_session(pool_size=4, retries=2) as session:
+            session.adapters['http://'].max_retries.backoff_factor = 0
+            errors = download_files(downloads, workers=4, session=session)
+
+        self.assertEqual(list(errors.keys()), [f'{self.url}/missing.png'])
+        self.assertFalse(os.path.exists(os.path.join(self.temp_dir, 'missing.png')))
+        self.assertEqual([name for name in os.listdir(self.temp_dir) if name.endswith('.tmp')], [])
+        with open(os.path.join(self.temp_dir, 'images', '7.png')) as f:
+            self.assertEqual(f.read(), 'image /images/7.png')
+        with open(os.path.join(self.temp_dir, 'flaky.png')) as f:
+            self.assertEqual(f.read(), 'image /flaky.png')
+        self.assertEqual(len([path for path, _ in ImageHandler.requests if path == '/flaky.png']), 2)
+        # Connections are kept alive and reused, never more than one per worker
+        self.assertLessEqual(len({client for _, client in ImageHandler.requests}), 4)
+
+    def test_fetch_url_revalidates_cached_responses(self):
+        cache_dir = os.path.join(self.temp_dir, 'http_cache')
+        url = f'{self.url}/etag.txt'
+        with get_session(retries=1, backoff_factor=0) as session:
+            self.assertEqual(b'version 1', fetch_url(url, session, cache_dir=cache_dir))
+            self.assertEqual(b'version 1', fetch_url(url, session, cache_dir=cache_dir))
+            self.assertEqual(ImageHandler.statuses, [200, 304])
+            # The cached response is used when the server fails, but without one the error is raised
+            ImageHandler.down = True
+            self.assertEqual(b'version 1', fetch_url(url, session, cache_dir=cache_dir))
+            with self.assertRaises(url_utils.requests.HTTPError):
+                fetch_url(url, session, cache_dir='')
+
+    def test_host_connections(self):
+        host_connections = url_utils.HOST_CONNECTIONS
+        url_utils.HOST_CONNECTIONS = 2
+        try:
+            downloads = [(f'{self.url}/slow/{idx}', os.path.join(self.temp_dir, f'{idx}.txt')) for idx in range(8)]
+            self.assertEqual(download_files(downloads, workers=8), {})
+        finally:
+            url_utils.HOST_CONNECTIONS = host_connections
+        self.assertEqual(ImageHandler.max_in_flight, 2)
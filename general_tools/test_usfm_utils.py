@@ -0,0 +1,118 @@
+import os
+import re
+import random
+import shutil
+import tempfile
+from glob import glob
+from unittest import TestCase, skipUnless
+from .usfm_utils import unalign_usfm, get_unaligned_usfm
+from .file_utils import read_file, write_file
+
+# Set to a directory of aligned USFM files (e.g. a clone of en_ult) to also compare all of its books
+USFM_BOOKS_DIR = os.environ.get('USFM_BOOKS_DIR')
+
+ALIGNED_USFM = r'''\id TIT EN_ULT en_English_ltr unfoldingWord Literal Text
+\usfm 3.0
+\h Titus
+
+\s5
+\c 1
+\p
+\v 1 \zaln-s |x-strong="G39720" x-lemma="Παῦλος" x-morph="Gr,N,,,,,NMS," x-occurrence="1" x-occurrences="1" x-content="Παῦλος"\*\w Paul|x-occurrence="1" x-occurrences="1"\w*\zaln-e\*,
+\zaln-s |x-strong="G14010" x-lemma="δοῦλος" x-morph="Gr,N,,,,,NMS," x-occurrence="1" x-occurrences="2" x-content="δοῦλος"\*\w a|x-occurrence="1" x-occurrences="1"\w*
+\w servant|x-occurrence="1" x-occurrences="1"\w*\zaln-e\* ( \w of|x-occurrence="1" x-occurrences="1"\w* ) \ts\*
+\k-s | x-tw="rc://*/tw/dict/bible/kt/god"\*\w God|x-occurrence="1" x-occurrences="1"\w*\k-e\* ' s " \w hope|x-occurrence="1" x-occurrences="1"\w* "\f + \ft Some \fqa versions\fqa read\f*
+\q1"\w Selah|x-occurrence="1" x-occurrences="1"\w* .
+
+
+\c 2
+\v 1 "open
+'''
+
+
+def unalign_usfm_by_passes(aligned_usfm):
+    """
+    unalign_usfm() as it was before it was reduced to fewer passes, to compare its output to
+    """
+    usfm = re.sub(r'\\ts(-s)*\s*\\\*\s*', r'', aligned_usfm, flags=re.UNICODE | re.MULTILINE)
+    usfm = re.sub(r'\\zaln-s[^*]*?\*', r'', usfm, flags=re.UNICODE | re.MULTILINE)
+    usfm = re.sub(r'\\zaln-e\\\*', r'', usfm, flags=re.UNICODE | re.MULTILINE)
+    usfm = re.sub(r'\\k-s.*?\\\*', r'', usfm, flags=re.UNICODE | re.MULTILINE)
+    usfm = re.sub(r'\\k-e\\\*', r'', usfm, flags=re.UNICODE | re.MULTILINE)
+    usfm = re.sub(r'\\w ([^|]+)\|.*?\\w\*', r'\1', usfm, flags=re.UNICODE | re.MULTILINE)
+    usfm = re.sub(r'^\n', '', usfm, flags=re.UNICODE | re.MULTILINE)
+    usfm = re.sub(r'^([^\\].*)\n(?=[^\\])', r'\1 ', usfm, flags=re.UNICODE | re.MULTILINE)
+    usfm = re.sub(r'^\\(.*)\n(?=[^\\])', r'\\\1 ', usfm, flags=re.UNICODE | re.MULTILINE)
+    usfm = re.sub(r'  +', ' ', usfm, flags=re.UNICODE | re.MULTILINE)
+    usfm = re.sub(r"\s*' s(?!\w)", "'s", usfm, flags=re.UNICODE | re.MULTILINE)
+    usfm = re.sub(r'\\s5', '', usfm, flags=re.UNICODE | re.MULTILINE)
+    usfm = re.sub(r'\\fqa([^*]+)\\fqa(?![*])', r'\\fqa\1\\fqa*', usfm, flags=re.UNICODE | re.MULTILINE)
+    chapters = re.compile(r'\\c ').split(usfm)
+    usfm = chapters[0]
+    for chapter in chapters[1:]:
+        chapter = re.sub(r'\s*"\s*([^"]+)\s*"\s*', r' "\1" ', chapter, flags=re.UNICODE | re.MULTILINE | re.DOTALL)
+        usfm += f'\\c {chapter}'
+    usfm = re.sub(r'\\(\w+\**)([^\w* \n])', r'\\\1 \2', usfm, flags=re.UNICODE | re.MULTILINE)
+    usfm = re.sub(r" ' ", r" '", usfm, flags=re.UNICODE | re.MULTILINE)
+    usfm = re.sub(r' +([:;.?,!\]})-])', r'\1', usfm, flags=re.UNICODE | re.MULTILINE)
+    usfm = re.sub(r'([{(\[-]) +', r'\1', usfm, flags=re.UNICODE | re.MULTILINE)
+    return usfm.strip()
+
+
+def get_fuzz_aligned_usfm(rand, count):
+    pieces = ['\\zaln-s |x-occurrence="1" x-content="Θεοῦ"\\*', '\\zaln-e\\*', '\\w word|x-occurrence="1"\\w*',
+              '\\w word\\w*',
+              '\\w two words|x-occurrence="2"\\w*', '\\k-s | x-tw="rc://*/tw/dict/bible/kt/god"\\*', '\\k-e\\*',
+              '\\ts\\*', '\\ts-s \\*', '\\s5', '\\c 1', '\\c 2\n', '\\v 3 ', '\\p', '\\q1', '\\f + \\ft ', '\\f*',
+              '\\fqa', '\\fqa*', 'text', ' ', '  ', '\n', '\n\n', '\t', '"', "'", "' s", ',', '.', '(', ')', '-',
+              '[', '}', ':', '\u00a0']
+    return ''.join(rand.choice(pieces) for _ in range(count))
+
+
+class TestUsfmUtils(TestCase):
+
+    def test_unalign_usfm(self):
+        usfm = unalign_usfm(ALIGNED_USFM)
+        self.assertIn('\\v 1 Paul, a servant (of) God\'s "hope " \\f + \\ft Some \\fqa versions\\fqa* read\\f*\n', usfm)
+        self.assertIn('\\q1 "Selah.\n', usfm)
+        self.assertNotIn('\\zaln', usfm)
+        self.assertNotIn('\\s5', usfm)
+        self.assertEqual(usfm, unalign_usfm_by_passes(ALIGNED_USFM))
+
+    def test_unalign_usfm_word_without_attributes(self):
+        # The \w without attributes runs on to the "|" of the next \w, once the alignment tags between them are gone
+        aligned_usfm = '\\v 1 \\w Paul\\w*, \\zaln-s |x-occurrence="1" x-content="δοῦλος"\\*' \
+                       '\\w servant|x-occurrence="1"\\w*\\zaln-e\\*'
+        self.assertEqual('\\v 1 Paul\\w*, \\w servant', unalign_usfm(aligned_usfm))
+        self.assertEqual(unalign_usfm_by_passes(aligned_usfm), unalign_usfm(aligned_usfm))
+
+    def test_unalign_usfm_matches_passes_fuzzed(self):
+        rand = random.Random(36)
+        for _ in range(1000):
+            aligned_usfm = get_fuzz_aligned_usfm(rand, rand.randint(1, 60))
+            self.assertEqual(unalign_usfm(aligned_usfm), unalign_usfm_by_passes(aligned_usfm), repr(aligned_usfm))
+
+    @skipUnless(USFM_BOOKS_DIR, 'USFM_BOOKS_DIR not set')
+    def test_unalign_usfm_matches_passes_for_books(self):
+        for usfm_file in sorted(glob(os.path.join(USFM_BOOKS_DIR, '*.usfm'))):
+            aligned_usfm = read_file(usfm_file)
+            with self.subTest(usfm_file=os.path.basename(usfm_file)):
+                self.assertEqual(unalign_usfm(aligned_usfm), unalign_usfm_by_passes(aligned_usfm))
+
+    def test_get_unaligned_usfm_cached(self):
+        temp_dir = tempfile.mkdtemp(prefix='usfm_utils_')
+        try:
+            usfm_file = os.path.join(temp_dir, '57-TIT.usfm')
+            write_file(usfm_file, ALIGNED_USFM)
+            cache_dir = os.path.join(temp_dir, 'cache')
+            usfm = get_unaligned_usfm(usfm_file, cache_dir, 'en_ult', 'abc', 'tit')
+            self.assertEqual(usfm, unalign_usfm(ALIGNED_USFM))
+            self.assertEqual(len(glob(os.path.join(cache_dir, 'en_ult', 'abc', 'TIT-*.usfm'))), 1)
+
+            # The same repo, commit and book come from the cache, even if the file has since changed
+            write_file(usfm_file, '\\id TIT\n')
+            self.assertEqual(get_unaligned_usfm(usfm_file, cache_dir, 'en_ult', 'abc', 'tit'), usfm)
+            self.assertEqual(get_unaligned_usfm(usfm_file, cache_dir, 'en_ult', 'def', 'tit'), '\\id TIT')
+            self.assertEqual(get_unaligned_usfm(usfm_file), '\\id TIT')
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
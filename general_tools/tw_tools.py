@@ -0,0 +1,68 @@
+import os
+import json
+from .file_utils import load_json_object, write_file_atomically
+
+TW_INDEX_CACHE_DIR = 'tw_index'
+TW_CATEGORIES = ['kt', 'names', 'other']
+
+_tw_indexes = {}
+
+
+def build_tw_index(tw_dir):
+    """
+    Scans the bible directory of a TW repo
+    :return: {term: [categories it has an article in, in TW_CATEGORIES order]}, e.g. {'god': ['kt']}
+    """
+    tw_index = {}
+    for category in TW_CATEGORIES:
+        category_dir = os.path.join(tw_dir, 'bible', category)
+        if not os.path.isdir(category_dir):
+            continue
+        for entry in sorted(os.scandir(category_dir), key=lambda e: e.name):
+            if entry.name.endswith('.md') and entry.is_file():
+                tw_index.setdefault(entry.name[:-3], []).append(category)
+    return tw_index
+
+
+def get_tw_index(tw_dir, cache_dir=None, repo_name=None, commit=None):
+    """
+    Gets the term to category index of a TW repo, which is built once per repo and commit, kept for the process
+    and saved in cache_dir for other processes
+    :param cache_dir: where indexes are saved, or None to not save it
+    :param repo_name: the repo and commit tw_dir is of, without which the index is built every time
+    :return: build_tw_index() of the repo
+    """
+    if not repo_name or not commit:
+        return build_tw_index(tw_dir)
+    key = (repo_name, commit)
+    if key in _tw_indexes:
+        return _tw_indexes[key]
+    cache_file = None
+    tw_index = None
+    if cache_dir:
+        cache_file = os.path.join(cache_dir, repo_name, f'{commit}.json')
+        try:
+            tw_index = load_json_object(cache_file)
+        except (OSError, ValueError):
+            tw_index = None
+    if tw_index is None:
+        tw_index = build_tw_index(tw_dir)
+        if cache_file:
+            write_file_atomically(cache_file, json.dumps(tw_index, ensure_ascii=False))
+    _tw_indexes[key] = tw_index
+    return tw_index
+
+
+def find_tw_term(tw_index, term, category=None, term_fixes=None):
+    """
+    Finds the article of a term, in the given category if it has one there, else in the first category it has one
+    in, else the article of the term it is fixed to by term_fixes
+    :param term_fixes: {term: term to use instead}, for terms that are known to be wrong
+    :return: [category, term] of the article, or None if there is none
+    """
+    categories = tw_index.get(term)
+    if categories:
+        return [category if category in categories else categories[0], term]
+    if term_fixes and term in term_fixes and tw_index.get(term_fixes[term]):
+        return [tw_index[term_fixes[term]][0], term_fixes[term]]
+    return None
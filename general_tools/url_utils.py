@@ -1,9 +1,139 @@
 from __future__ import print_function, unicode_literals
-from contextlib import closing
+from contextlib import closing, contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+import os
 import json
-import shutil
-import sys
-import urllib.request as urllib2
+import uuid
+import hashlib
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from .file_utils import write_file_atomically
+
+DOWNLOAD_WORKERS = 8
+DOWNLOAD_RETRIES = 3
+DOWNLOAD_TIMEOUT = 60  # Seconds to wait to connect and between bytes, not for the whole download
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+HOST_CONNECTIONS = 4  # Most requests to one host at once, across all threads
+# Where GET responses are cached to be revalidated with ETag/Last-Modified, if anywhere. See set_http_cache_dir()
+HTTP_CACHE_DIR = os.environ.get('HTTP_CACHE_DIR')
+
+_session = None
+_lock = threading.Lock()
+_host_semaphores = {}
+
+
+def get_session(pool_size=DOWNLOAD_WORKERS, retries=DOWNLOAD_RETRIES, backoff_factor=0.5):
+    """
+    Returns a requests session that keeps up to pool_size connections per host alive, and retries failed
+    connections and server errors with an exponentially increasing delay
+    """
+    session = requests.Session()
+    retry = Retry(total=retries, backoff_factor=backoff_factor, status_forcelist=RETRY_STATUSES,
+                  allowed_methods=frozenset(['GET', 'HEAD']), raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def get_shared_session():
+    """
+    The session all requests of the process go through by default, so connections are reused between callers
+    """
+    global _session
+    with _lock:
+        if not _session:
+            _session = get_session()
+        return _session
+
+
+def set_http_cache_dir(cache_dir):
+    global HTTP_CACHE_DIR
+    HTTP_CACHE_DIR = cache_dir
+
+
+@contextmanager
+def host_slot(url):
+    """
+    Waits until fewer than HOST_CONNECTIONS requests are being made to the host of the URL
+    """
+    host = urlsplit(url).netloc
+    with _lock:
+        if host not in _host_semaphores:
+            _host_semaphores[host] = threading.BoundedSemaphore(HOST_CONNECTIONS)
+        semaphore = _host_semaphores[host]
+    with semaphore:
+        yield
+
+
+def get_cache_files(url, cache_dir):
+    """
+    :return: [metadata JSON file, body file] of the URL in the response cache
+    """
+    key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+    return [os.path.join(cache_dir, f'{key}.json'), os.path.join(cache_dir, f'{key}.body')]
+
+
+def load_cached_response(url, cache_dir):
+    """
+    :return: [{'url', 'etag', 'last_modified'}, body] of the URL in the response cache, or None
+    """
+    meta_file, body_file = get_cache_files(url, cache_dir)
+    try:
+        with open(meta_file, encoding='utf-8') as f:
+            meta = json.load(f)
+        with open(body_file, 'rb') as f:
+            return [meta, f.read()]
+    except (OSError, ValueError):
+        return None
+
+
+def save_cached_response(url, cache_dir, response):
+    meta_file, body_file = get_cache_files(url, cache_dir)
+    meta = {'url': url, 'etag': response.headers.get('ETag'), 'last_modified': response.headers.get('Last-Modified')}
+    try:
+        write_file_atomically(body_file, response.content)
+        write_file_atomically(meta_file, json.dumps(meta))
+    except OSError as e:
+        logging.getLogger().warning(f'Unable to cache the response of {url}: {e}')
+
+
+def fetch_url(url, session=None, timeout=DOWNLOAD_TIMEOUT, cache_dir=None):
+    """
+    GETs a URL over the shared session. With a response cache, a cached response is revalidated with
+    If-None-Match/If-Modified-Since, and is used as is if the server can't be reached
+    :param cache_dir: the response cache, HTTP_CACHE_DIR if None, or '' to not use one
+    :return: the body bytes
+    """
+    if cache_dir is None:
+        cache_dir = HTTP_CACHE_DIR
+    if not session:
+        session = get_shared_session()
+    cached = load_cached_response(url, cache_dir) if cache_dir else None
+    headers = {}
+    if cached:
+        if cached[0].get('etag'):
+            headers['If-None-Match'] = cached[0]['etag']
+        if cached[0].get('last_modified'):
+            headers['If-Modified-Since'] = cached[0]['last_modified']
+    try:
+        with host_slot(url):
+            response = session.get(url, headers=headers, timeout=timeout)
+        if cached and response.status_code == 304:
+            return cached[1]
+        response.raise_for_status()
+    except requests.RequestException as e:
+        if cached:
+            logging.getLogger().warning(f'Using the cached response of {url}: {e}')
+            return cached[1]
+        raise
+    if cache_dir:
+        save_cached_response(url, cache_dir, response)
+    return response.content
 
 
 def get_url(url, catch_exception=False):
@@ -11,45 +141,65 @@ def get_url(url, catch_exception=False):
     :param str|unicode url: URL to open
     :param bool catch_exception: If <True> catches all exceptions and returns <False>
     """
-    return _get_url(url, catch_exception, urlopen=urllib2.urlopen)
-
-
-def _get_url(url, catch_exception, urlopen):
     if catch_exception:
         # noinspection PyBroadException
         try:
-            with closing(urlopen(url)) as request:
-                response = request.read()
-        except:
-            response = False
-    else:
-        with closing(urlopen(url)) as request:
-            response = request.read()
-
-    # convert bytes to str (Python 3.5)
-    if type(response) is bytes:
-        return response.decode('utf-8')
-    else:
-        return response
-
-
-def download_file(url, outfile):
-    """Downloads a file and saves it."""
-    _download_file(url, outfile, urlopen=urllib2.urlopen)
+            return fetch_url(url).decode('utf-8')
+        except Exception:
+            return False
+    return fetch_url(url).decode('utf-8')
 
 
-def _download_file(url, outfile, urlopen, handle_error=False):
+def _download_file(session, url, outfile, timeout=DOWNLOAD_TIMEOUT):
+    """
+    Streams the URL to a temporary file that is then moved to outfile, so a failed download never leaves a
+    partial outfile
+    """
+    temp_file = f'{outfile}.{uuid.uuid4().hex}.tmp'
     try:
-        with closing(urlopen(url)) as request:
-            with open(outfile, 'wb') as fp:
-                shutil.copyfileobj(request, fp)
-    except IOError as err:
-        if handle_error:
-            print('ERROR retrieving %s' % url)
-            print(err)
-            sys.exit(1)
-        else:
-            raise err
+        with host_slot(url):
+            with closing(session.get(url, stream=True, timeout=timeout)) as response:
+                response.raise_for_status()
+                os.makedirs(os.path.dirname(outfile) or '.', exist_ok=True)
+                with open(temp_file, 'wb') as fp:
+                    for chunk in response.iter_content(chunk_size=64 * 1024):
+                        fp.write(chunk)
+        os.replace(temp_file, outfile)
+    finally:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+
+
+def download_file(url, outfile, session=None, timeout=DOWNLOAD_TIMEOUT):
+    """Downloads a file and saves it."""
+    _download_file(session or get_shared_session(), url, outfile, timeout)
+
+
+def download_files(downloads, workers=DOWNLOAD_WORKERS, session=None, timeout=DOWNLOAD_TIMEOUT):
+    """
+    Downloads files concurrently over one session, so connections to the same host are reused
+    :param downloads: [(url, outfile)], each written to a temporary file first, so a failed download never
+        leaves a partial outfile
+    :param workers: how many files to download at once, though never more than HOST_CONNECTIONS from one host
+    :return: {url: error} for the downloads that failed
+    """
+    if not session:
+        session = get_shared_session()
+
+    def download(url, outfile):
+        try:
+            _download_file(session, url, outfile, timeout)
+        except (requests.RequestException, OSError) as err:
+            return err
+        return None
+
+    errors = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(downloads)))) as executor:
+        results = executor.map(lambda download_args: download(*download_args), downloads)
+        for (url, _outfile), error in zip(downloads, results):
+            if error:
+                errors[url] = error
+    return errors
 
 
 def get_languages():
@@ -1,6 +1,33 @@
 # coding=utf-8
 
+import os
 import re
+import hashlib
+from .file_utils import read_file, write_file_atomically
+
+UNALIGNED_CACHE_DIR = 'unaligned_usfm'
+
+# All the tags used for alignments, removed in one pass. The alternatives can't overlap in well-formed tags, so this
+# gives the same text as removing each kind of tag in its own pass
+ALIGNMENT_REGEX = re.compile(r'\\ts(?:-s)*\s*\\\*\s*|\\zaln-s[^*]*?\*|\\zaln-e\\\*|\\k-s.*?\\\*|\\k-e\\\*',
+                             flags=re.UNICODE | re.MULTILINE)
+# A \w keeps its word. This stays its own pass after the alignment tags are gone: a \w without "|attributes" matches
+# on to the next "|", which may be in an alignment tag
+WORD_REGEX = re.compile(r'\\w ([^|]+)\|.*?\\w\*', flags=re.UNICODE | re.MULTILINE)
+BLANK_LINES_REGEX = re.compile(r'\n\n+')
+# Lines not starting with a marker are joined to the line before them
+LINE_JOIN_REGEX = re.compile(r'\n(?=[^\\])')
+SPACES_REGEX = re.compile(r'  +')
+APOSTROPHE_S_REGEX = re.compile(r"\s*' s(?!\w)", flags=re.UNICODE)
+S5_REGEX = re.compile(r'\\s5')
+FQA_REGEX = re.compile(r'\\fqa([^*]+)\\fqa(?![*])')
+CHAPTER_REGEX = re.compile(r'\\c ')
+QUOTE_REGEX = re.compile(r'\s*"\s*([^"]+)\s*"\s*', flags=re.UNICODE | re.DOTALL)
+MARKER_PUNCTUATION_REGEX = re.compile(r'\\(\w+\**)([^\w* \n])', flags=re.UNICODE)
+SPACE_BEFORE_PUNCTUATION_REGEX = re.compile(r' +([:;.?,!\]})-])')
+SPACE_AFTER_PUNCTUATION_REGEX = re.compile(r'([{(\[-]) +')
+
+_unalign_hash = None
 
 
 def unalign_usfm(aligned_usfm):
@@ -9,32 +36,53 @@ def unalign_usfm(aligned_usfm):
     :param aligned_usfm:
     :return: the unaligned USFM of the string
     """
-    # Remove all tags used for alignments and words
-    usfm = re.sub(r'\\ts(-s)*\s*\\\*\s*', r'', aligned_usfm, flags=re.UNICODE | re.MULTILINE)
-    usfm = re.sub(r'\\zaln-s[^*]*?\*', r'', usfm, flags=re.UNICODE | re.MULTILINE)
-    usfm = re.sub(r'\\zaln-e\\\*', r'', usfm, flags=re.UNICODE | re.MULTILINE)
-    usfm = re.sub(r'\\k-s.*?\\\*', r'', usfm, flags=re.UNICODE | re.MULTILINE)
-    usfm = re.sub(r'\\k-e\\\*', r'', usfm, flags=re.UNICODE | re.MULTILINE)
-    usfm = re.sub(r'\\w ([^|]+)\|.*?\\w\*', r'\1', usfm, flags=re.UNICODE | re.MULTILINE)
-    usfm = re.sub(r'^\n', '', usfm, flags=re.UNICODE | re.MULTILINE)
-    usfm = re.sub(r'^([^\\].*)\n(?=[^\\])', r'\1 ', usfm, flags=re.UNICODE | re.MULTILINE)
-    usfm = re.sub(r'^\\(.*)\n(?=[^\\])', r'\\\1 ', usfm, flags=re.UNICODE | re.MULTILINE)
-    usfm = re.sub(r'  +', ' ', usfm, flags=re.UNICODE | re.MULTILINE)
+    # Remove all tags used for alignments and words, and blank lines, then join lines
+    usfm = ALIGNMENT_REGEX.sub('', aligned_usfm)
+    usfm = WORD_REGEX.sub(r'\1', usfm)
+    usfm = BLANK_LINES_REGEX.sub('\n', usfm).lstrip('\n')
+    usfm = LINE_JOIN_REGEX.sub(' ', usfm)
+    usfm = SPACES_REGEX.sub(' ', usfm)
 
     # Clean up bad USFM data and fixing punctuation
-    usfm = re.sub(r"\s*' s(?!\w)", "'s", usfm, flags=re.UNICODE | re.MULTILINE)
-    usfm = re.sub(r'\\s5', '', usfm, flags=re.UNICODE | re.MULTILINE)
-    usfm = re.sub(r'\\fqa([^*]+)\\fqa(?![*])', r'\\fqa\1\\fqa*', usfm, flags=re.UNICODE | re.MULTILINE)
-    
+    usfm = APOSTROPHE_S_REGEX.sub("'s", usfm)
+    usfm = S5_REGEX.sub('', usfm)
+    usfm = FQA_REGEX.sub(r'\\fqa\1\\fqa*', usfm)
+
     # Pair up quotes by chapter
-    chapters = re.compile(r'\\c ').split(usfm)
-    usfm = chapters[0]
-    for chapter in chapters[1:]:
-        chapter = re.sub(r'\s*"\s*([^"]+)\s*"\s*', r' "\1" ', chapter, flags=re.UNICODE | re.MULTILINE | re.DOTALL)
-        usfm += f'\\c {chapter}'
-    usfm = re.sub(r'\\(\w+\**)([^\w* \n])', r'\\\1 \2', usfm, flags=re.UNICODE | re.MULTILINE)  # \\q1" => \q1 "
-    usfm = re.sub(r" ' ", r" '", usfm, flags=re.UNICODE | re.MULTILINE)
-    usfm = re.sub(r' +([:;.?,!\]})-])', r'\1', usfm, flags=re.UNICODE | re.MULTILINE)
-    usfm = re.sub(r'([{(\[-]) +', r'\1', usfm, flags=re.UNICODE | re.MULTILINE)
+    chapters = CHAPTER_REGEX.split(usfm)
+    usfm = '\\c '.join([chapters[0]] + [QUOTE_REGEX.sub(r' "\1" ', chapter) for chapter in chapters[1:]])
+    usfm = MARKER_PUNCTUATION_REGEX.sub(r'\\\1 \2', usfm)  # \\q1" => \q1 "
+    usfm = usfm.replace(" ' ", " '")
+    usfm = SPACE_BEFORE_PUNCTUATION_REGEX.sub(r'\1', usfm)
+    usfm = SPACE_AFTER_PUNCTUATION_REGEX.sub(r'\1', usfm)
 
     return usfm.strip()
+
+
+def get_unalign_hash():
+    """
+    Hash of this module's source, so unaligned USFM cached by an older unalign_usfm() is never used
+    """
+    global _unalign_hash
+    if not _unalign_hash:
+        with open(__file__, 'rb') as f:
+            _unalign_hash = hashlib.sha1(f.read()).hexdigest()
+    return _unalign_hash
+
+
+def get_unaligned_usfm(usfm_file, cache_dir=None, repo_name=None, commit=None, book_id=None):
+    """
+    Reads and unaligns the USFM file of a book, or gets its unaligned USFM from the cache
+    :param cache_dir: where unaligned USFM is cached, or None to not use the cache
+    :param repo_name: the repo, commit and book the USFM file is of, which is what the cache is keyed by
+    :return: the unaligned USFM of the file
+    """
+    cache_file = None
+    if cache_dir and repo_name and commit and book_id:
+        cache_file = os.path.join(cache_dir, repo_name, commit, f'{book_id.upper()}-{get_unalign_hash()[:10]}.usfm')
+        if os.path.isfile(cache_file):
+            return read_file(cache_file)
+    usfm = unalign_usfm(read_file(usfm_file))
+    if cache_file:
+        write_file_atomically(cache_file, usfm)
+    return usfm
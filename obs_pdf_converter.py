@@ -15,7 +15,6 @@ import markdown2
 from bs4 import BeautifulSoup
 from pdf_converter import PdfConverter, run_converter
 from general_tools.file_utils import read_file
-from general_tools import obs_tools
 from general_tools.url_utils import get_url
 
 
@@ -51,7 +50,7 @@ class ObsPdfConverter(PdfConverter):
 '''
         for chapter in range(1, 51):
             chapter_str = str(chapter).zfill(2)
-            obs_chapter_data = obs_tools.get_obs_chapter_data(self.main_resource.repo_dir, chapter_str)
+            obs_chapter_data = self.get_obs_chapter_data(chapter_str)
             chapter_title = obs_chapter_data['title']
             html += f'''
 <article class="obs-chapter-title-page no-header-footer">
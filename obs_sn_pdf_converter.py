@@ -15,7 +15,7 @@ import markdown2
 import general_tools.html_tools as html_tools
 from pdf_converter import run_converter
 from obs_sn_sq_pdf_converter import ObsSnSqPdfConverter
-from general_tools import obs_tools, alignment_tools
+from general_tools import alignment_tools
 
 
 class ObsSnPdfConverter(ObsSnSqPdfConverter):
@@ -44,7 +44,7 @@ class ObsSnPdfConverter(ObsSnSqPdfConverter):
         for chapter in range(1, 51):
             chapter_num = str(chapter).zfill(2)
             sn_chapter_dir = os.path.join(self.resources['obs-sn'].repo_dir, 'content', chapter_num)
-            chapter_data = obs_tools.get_obs_chapter_data(self.resources['obs'].repo_dir, chapter_num)
+            chapter_data = self.get_obs_chapter_data(chapter_num)
             obs_sn_html += f'<article id="{self.lang_code}-obs-sn-{chapter_num}">\n\n'
             obs_sn_html += f'<h2 class="section-header">{chapter_data["title"]}</h2>\n'
             if 'bible_reference' in chapter_data and chapter_data['bible_reference']:
@@ -16,7 +16,7 @@ import markdown2
 import general_tools.html_tools as html_tools
 from bs4 import BeautifulSoup
 from pdf_converter import PdfConverter, run_converter
-from general_tools import obs_tools, alignment_tools
+from general_tools import alignment_tools
 
 
 class ObsSnSqPdfConverter(PdfConverter):
@@ -61,7 +61,7 @@ class ObsSnSqPdfConverter(PdfConverter):
             chapter_num = str(chapter_num).zfill(2)
             sn_chapter_dir = os.path.join(self.resources['obs-sn'].repo_dir, 'content', chapter_num)
             sq_chapter_file = os.path.join(self.resources['obs-sq'].repo_dir, 'content', f'{chapter_num}.md')
-            obs_chapter_data = obs_tools.get_obs_chapter_data(self.resources['obs'].repo_dir, chapter_num)
+            obs_chapter_data = self.get_obs_chapter_data(chapter_num)
             chapter_title = obs_chapter_data['title']
             # HANDLE RC LINKS FOR OBS SN CHAPTER
             obs_sn_chapter_rc_link = f'rc://{self.lang_code}/obs-sn/help/obs/{chapter_num}'
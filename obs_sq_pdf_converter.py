@@ -17,7 +17,6 @@ import general_tools.html_tools as html_tools
 from glob import glob
 from bs4 import BeautifulSoup
 from pdf_converter import run_converter
-from general_tools import obs_tools
 from obs_sn_sq_pdf_converter import ObsSnSqPdfConverter
 
 
@@ -60,7 +59,7 @@ class ObsSqPdfConverter(ObsSnSqPdfConverter):
             # HANDLE OBS SQ RC CHAPTER LINKS
             obs_sq_rc_link = f'rc://{self.lang_code}/obs-sq/help/{chapter_num}'
             obs_sq_rc = self.add_rc(obs_sq_rc_link, title=title, article=chapter_html)
-            chapter_data = obs_tools.get_obs_chapter_data(self.resources['obs'].repo_dir, chapter_num)
+            chapter_data = self.get_obs_chapter_data(chapter_num)
             if len(chapter_data['frames']):
                 frames_html = '<div class="obs-frames">\n'
                 for idx, frame in enumerate(chapter_data['frames']):
@@ -16,7 +16,8 @@ import markdown2
 from glob import glob
 from pdf_converter import PdfConverter, run_converter
 from general_tools.file_utils import load_json_object
-from general_tools import obs_tools, html_tools, alignment_tools
+from general_tools import html_tools, alignment_tools
+from general_tools.tw_tools import find_tw_term
 
 # Enter ignores in lowercase
 TN_TITLES_TO_IGNORE = {
@@ -66,20 +67,8 @@ class ObsTnPdfConverter(PdfConverter):
                 for frame in chapter['frames']:
                     self._tw_cat[chapter['id']][frame['id']] = []
                     for item in frame['items']:
-                        term = item['id']
-                        category = None
-                        for c in ['kt', 'names', 'other']:
-                            if os.path.exists(os.path.join(self.resources['tw'].repo_dir, 'bible', c, f'{term}.md')):
-                                category = c
-                                break
-                        if not category and term in mapping:
-                            category = None
-                            for c in ['kt', 'names', 'other']:
-                                if os.path.exists(os.path.join(self.resources['tw'].repo_dir, 'bible', c,
-                                                               f'{mapping[term]}.md')):
-                                    category = c
-                                    term = mapping[term]
-                                    break
+                        found = find_tw_term(self.tw_index, item['id'], term_fixes=mapping)
+                        category, term = found if found else [None, item['id']]
                         if category:
                             self._tw_cat[chapter['id']][frame['id']].append(
                                 f'rc://{self.lang_code}/tw/dict/bible/{category}/{term}')
@@ -108,7 +97,7 @@ class ObsTnPdfConverter(PdfConverter):
         for obs_tn_chapter_dir in obs_tn_chapter_dirs:
             if os.path.isdir(obs_tn_chapter_dir):
                 chapter_num = os.path.basename(obs_tn_chapter_dir)
-                chapter_data = obs_tools.get_obs_chapter_data(self.resources['obs'].repo_dir, chapter_num)
+                chapter_data = self.get_obs_chapter_data(chapter_num)
                 obs_tn_html += f'''
     <article id="{self.lang_code}-obs-tn-{chapter_num}">
         <h2 class="section-header">{chapter_data['title']}</h2>
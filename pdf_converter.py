@@ -26,16 +26,30 @@ from cssutils.css import CSSStyleDeclaration
 # import pypandoc
 import json
 import general_tools.html_tools as html_tools
+import general_tools.link_rewriter as link_rewriter
 from typing import List, Type
+from collections import OrderedDict
 from bs4 import BeautifulSoup
 from abc import abstractmethod
 from weasyprint import HTML, CSS
 from general_tools.file_utils import write_file, read_file, load_json_object, symlink, unzip
-from general_tools.font_utils import get_font_html_with_local_fonts
-from general_tools.url_utils import download_file
+from general_tools.font_utils import get_font_html_with_local_fonts, get_font_files, \
+    get_font_families_with_fallbacks
+from general_tools.page_fitting import FIT_TO_PAGE_PREFIX, FIT_REPORT_FILE, FontMetrics, get_page_geometry, \
+    get_base_font_size, get_image_aspects, estimate_font_size, update_fit_report
+from general_tools.render_cache import RENDER_CACHE_DIR
+from general_tools.image_utils import IMAGE_CACHE_DIR, get_normalized_image
+from general_tools.usfm_utils import UNALIGNED_CACHE_DIR
+from general_tools.obs_tools import OBS_INDEX_CACHE_DIR, get_obs_index, get_obs_chapter_data
+from general_tools.tw_tools import TW_INDEX_CACHE_DIR, get_tw_index, find_tw_term
+from general_tools.ta_tools import TA_INDEX_CACHE_DIR, get_ta_index, get_dependency_project, get_recommended_project
+from general_tools.link_graph import LINK_GRAPH_CACHE_DIR, get_link_graph, build_ta_link_graph, build_tw_link_graph, \
+    get_ta_article_links, get_tw_article_links, get_rc_links, get_linking_levels, TA_MARKDOWN_EXTRAS
+from general_tools.url_utils import download_file, download_files, set_http_cache_dir
 from urllib.parse import urlsplit, urlunsplit, urlparse
 from resource import Resource, Resources, DEFAULT_REF, DEFAULT_OWNER
 from rc_link import ResourceContainerLink
+from door43_tools.td_language import TdLanguage
 
 DEFAULT_LANG_CODE = 'en'
 DEFAULT_ULT_ID = 'ult'
@@ -48,6 +62,9 @@ LANGUAGE_FILES = {
 }
 APPENDIX_LINKING_LEVEL = 1
 APPENDIX_RESOURCES = ['ta', 'tw']
+TW_TERM_FIXES = {
+    'live': 'life'
+}
 CONTRIBUTORS_TO_HIDE = ['ugnt', 'uhb']
 
 
@@ -73,6 +90,13 @@ class PdfConverter:
         self.save_dir = None
         self.log_dir = None
         self.images_dir = None
+        self.render_cache_dir = None
+        self.unaligned_cache_dir = None
+        self.obs_index_cache_dir = None
+        self.tw_index_cache_dir = None
+        self.image_cache_dir = None
+        self.ta_index_cache_dir = None
+        self.link_graph_cache_dir = None
         self.output_res_dir = None
 
         self.errors = {}
@@ -90,6 +114,11 @@ class PdfConverter:
         self.converters_dir = os.path.dirname(os.path.realpath(__file__))
         self.style_sheets = []
         self._font_html = ''
+        self._obs_index = None
+        self._tw_index = None
+        self._ta_index = None
+        self._ta_link_graph = None
+        self._tw_link_graph = None
 
         self._project = None
 
@@ -204,10 +233,60 @@ class PdfConverter:
         else:
             return str(num).zfill(2)
 
+    @property
+    def obs_index(self):
+        if self._obs_index is None:
+            obs = self.resources['obs']
+            self._obs_index = get_obs_index(obs.repo_dir, self.obs_index_cache_dir, obs.repo_name, obs.commit)
+        return self._obs_index
+
+    def get_obs_chapter_data(self, chapter_num):
+        return get_obs_chapter_data(self.resources['obs'].repo_dir, chapter_num, self.obs_index)
+
+    @property
+    def tw_index(self):
+        if self._tw_index is None:
+            tw = self.resources['tw']
+            self._tw_index = get_tw_index(tw.repo_dir, self.tw_index_cache_dir, tw.repo_name, tw.commit)
+        return self._tw_index
+
+    @property
+    def ta_index(self):
+        if self._ta_index is None:
+            ta = self.resources['ta']
+            project_ids = [project['identifier'] for project in ta.projects or []]
+            self._ta_index = get_ta_index(ta.repo_dir, project_ids, self.ta_index_cache_dir, ta.repo_name, ta.commit)
+        return self._ta_index
+
+    @property
+    def ta_link_graph(self):
+        if self._ta_link_graph is None:
+            ta = self.resources['ta']
+            self._ta_link_graph = get_link_graph(
+                lambda: build_ta_link_graph(ta.repo_dir, self.lang_code, self.ta_index),
+                self.link_graph_cache_dir, ta.repo_name, ta.commit, self.lang_code)
+        return self._ta_link_graph
+
+    @property
+    def tw_link_graph(self):
+        if self._tw_link_graph is None:
+            tw = self.resources['tw']
+            self._tw_link_graph = get_link_graph(
+                lambda: build_tw_link_graph(tw.repo_dir, self.lang_code, self.tw_index),
+                self.link_graph_cache_dir, tw.repo_name, tw.commit, self.lang_code)
+        return self._tw_link_graph
+
+    def get_ta_config(self, project_id):
+        if project_id in self.ta_index['configs']:
+            return self.ta_index['configs'][project_id]
+        # A project that isn't in the manifest
+        config_file = os.path.join(self.resources['ta'].repo_dir, project_id, 'config.yaml')
+        return yaml.full_load(read_file(config_file)) if os.path.isfile(config_file) else {}
+
     @property
     def font_html(self):
         if not self._font_html:
-            self._font_html = get_font_html_with_local_fonts(self.lang_code, self.output_dir)
+            self._font_html = get_font_html_with_local_fonts(self.lang_code, self.output_dir, self.offline)
         return self._font_html
 
     @property
@@ -343,6 +422,8 @@ class PdfConverter:
             os.mkdir(self.output_res_dir)
         self.logger.info(f'Resource output directory is {self.output_res_dir}')
 
+        set_http_cache_dir(os.path.join(self.output_dir, 'http_cache'))
+
         self.images_dir = os.path.join(self.output_dir, 'images')
         if not os.path.exists(self.images_dir):
             os.makedirs(self.images_dir)
@@ -355,6 +436,44 @@ class PdfConverter:
                 unzip(os.path.join(self.images_dir, 'images.zip'), jpg_dir)
                 os.unlink(os.path.join(self.images_dir, 'images.zip'))
 
+        self.ta_index_cache_dir = os.path.join(self.output_dir, TA_INDEX_CACHE_DIR)
+        if not os.path.exists(self.ta_index_cache_dir):
+            os.makedirs(self.ta_index_cache_dir)
+        self.logger.info(f'TA index cache directory is {self.ta_index_cache_dir}')
+
+        self.link_graph_cache_dir = os.path.join(self.output_dir, LINK_GRAPH_CACHE_DIR)
+        if not os.path.exists(self.link_graph_cache_dir):
+            os.makedirs(self.link_graph_cache_dir)
+        self.logger.info(f'Link graph cache directory is {self.link_graph_cache_dir}')
+
+        self.image_cache_dir = os.path.join(self.output_dir, IMAGE_CACHE_DIR)
+        if not os.path.exists(self.image_cache_dir):
+            os.makedirs(self.image_cache_dir)
+        self.logger.info(f'Image cache directory is {self.image_cache_dir}')
+
+        self.render_cache_dir = os.path.join(self.output_dir, RENDER_CACHE_DIR)
+        if not os.path.exists(self.render_cache_dir):
+            os.makedirs(self.render_cache_dir)
+        self.logger.info(f'Render cache directory is {self.render_cache_dir}')
+
+        TdLanguage.cache_dir = os.path.join(self.output_dir, 'langnames')
+        TdLanguage.offline = self.offline
+
+        self.unaligned_cache_dir = os.path.join(self.output_dir, UNALIGNED_CACHE_DIR)
+        if not os.path.exists(self.unaligned_cache_dir):
+            os.makedirs(self.unaligned_cache_dir)
+        self.logger.info(f'Unaligned USFM cache directory is {self.unaligned_cache_dir}')
+
+        self.obs_index_cache_dir = os.path.join(self.output_dir, OBS_INDEX_CACHE_DIR)
+        if not os.path.exists(self.obs_index_cache_dir):
+            os.makedirs(self.obs_index_cache_dir)
+        self.logger.info(f'OBS index cache directory is {self.obs_index_cache_dir}')
+
+        self.tw_index_cache_dir = os.path.join(self.output_dir, TW_INDEX_CACHE_DIR)
+        if not os.path.exists(self.tw_index_cache_dir):
+            os.makedirs(self.tw_index_cache_dir)
+        self.logger.info(f'TW index cache directory is {self.tw_index_cache_dir}')
+
         self.save_dir = os.path.join(self.output_dir, 'save')
         if not os.path.exists(self.save_dir):
             os.makedirs(self.save_dir)
@@ -479,6 +598,8 @@ class PdfConverter:
             all_pages_fit = False
             doc = None
             tries = 0
+            fit_to_page_ids = self.estimate_fit_to_page_font_sizes(soup)
+            resized_ids = set()
             while not all_pages_fit and tries < 10:
                 all_pages_fit = True
                 tries += 1
@@ -507,9 +628,17 @@ class PdfConverter:
                             style['font-size'] = font_size_str
                             css = style.cssText
                             element['style'] = css
+                            resized_ids.add(anchor)
                             self.logger.info(f'RESIZING {anchor} to {font_size_str}... ({diff}, {page.anchors[anchor]})')
                 write_file(os.path.join(self.output_res_dir, f'{self.file_project_and_ref}_resized.html'),
                            str(soup))
+            if fit_to_page_ids:
+                right = len([fit_id for fit_id in fit_to_page_ids if fit_id not in resized_ids])
+                totals = update_fit_report(os.path.join(self.output_dir, FIT_REPORT_FILE), self.lang_code,
+                                           len(fit_to_page_ids), right)
+                self.logger.info(f'Estimated font sizes fit {right} of {len(fit_to_page_ids)} pages without resizing '
+                                 f'after {tries} render(s). For {self.lang_code} so far: {totals["right"]} of '
+                                 f'{totals["pages"]} pages in {totals["renders"]} PDFs')
             if doc:
                 doc.write_pdf(self.pdf_file)
                 self.logger.info('Generated PDF file.')
@@ -518,6 +647,37 @@ class PdfConverter:
             self.logger.info(
                 f'PDF file {self.pdf_file} is already there. Not generating. Use -r to force regeneration.')
 
+    def estimate_fit_to_page_font_sizes(self, soup):
+        """
+        Sets the font size of each fit-to-page article to the size it is estimated to fit on a page at, so the
+        render loop of generate_pdf() rarely has to shrink it
+        :return: the ids of the fit-to-page articles
+        """
+        articles = soup.find_all(id=re.compile(f'^{FIT_TO_PAGE_PREFIX}'))
+        if not articles:
+            return []
+        css_texts = []
+        for style_sheet in self.style_sheets:
+            style_path = os.path.normpath(os.path.join(self.output_res_dir, style_sheet))
+            if os.path.isfile(style_path):
+                css_texts.append(read_file(style_path))
+        geometry = get_page_geometry(css_texts)
+        base_font_size = get_base_font_size(css_texts)
+        font_files = get_font_files(get_font_families_with_fallbacks(self.lang_code),
+                                    os.path.join(self.output_dir, 'fonts'))
+        metrics = FontMetrics(font_files)
+        srcs = set(img.get('src') for article in articles for img in article.find_all('img'))
+        image_aspects = get_image_aspects(srcs, self.output_res_dir)
+        for article in articles:
+            font_size = estimate_font_size(article, geometry, metrics, base_font_size, image_aspects)
+            if font_size < 1:
+                style = parseStyle(article['style']) if article.has_attr('style') else CSSStyleDeclaration()
+                style['font-size'] = f'{"%.2f" % font_size}em'
+                article['style'] = style.cssText
+        self.logger.info(f'Estimated the font sizes of {len(articles)} fit-to-page articles with {len(font_files)} '
+                         f'font files')
+        return [article['id'] for article in articles]
+
     # def generate_docx(self):
     #     if self.regenerate or not os.path.exists(self.docx_file):
     #         if os.path.islink(self.docx_file):
@@ -722,19 +882,36 @@ class PdfConverter:
             return {}
 
     def download_all_images(self, html):
-        soup = BeautifulSoup(html, 'html.parser')
-        for img in soup.find_all('img'):
-            if img['src'].startswith('http'):
-                u = urlsplit(img['src'])._replace(query="", fragment="")
+        srcs = {}
+        downloads = OrderedDict()
+        for src in html_tools.get_img_srcs(html):
+            if src.startswith('http'):
+                u = urlsplit(src)._replace(query="", fragment="")
                 url = urlunsplit(u)
                 file_path = f'images/{u.netloc}{u.path}'
                 full_file_path = os.path.join(self.output_dir, file_path)
                 if not os.path.exists(full_file_path) and not self.offline and all(ord(c) < 128 for c in url):
-                    os.makedirs(os.path.dirname(full_file_path), exist_ok=True)
-                    self.logger.info(f'Downloading {url} to {full_file_path}...')
-                    download_file(url, full_file_path)
-                img['src'] = f'../{file_path}'
-        return str(soup)
+                    downloads[url] = full_file_path
+                srcs[src] = f'../{file_path}'
+        if downloads:
+            self.logger.info(f'Downloading {len(downloads)} images to {self.images_dir}...')
+            errors = download_files(list(downloads.items()))
+            for url, error in errors.items():
+                self.logger.error(f'Unable to download {url}: {error}')
+            # Images that couldn't be downloaded keep their URL
+            srcs = {src: local_src for src, local_src in srcs.items()
+                    if urlunsplit(urlsplit(src)._replace(query="", fragment="")) not in errors}
+        # Points to the images normalized for print, which are shared by the PDFs of all languages
+        normalized_count = 0
+        for src, local_src in srcs.items():
+            full_file_path = os.path.join(self.output_dir, local_src[3:])
+            if os.path.isfile(full_file_path):
+                normalized_file = get_normalized_image(full_file_path, self.image_cache_dir)
+                if normalized_file:
+                    srcs[src] = f'../{os.path.relpath(normalized_file, self.output_dir)}'
+                    normalized_count += 1
+        self.logger.info(f'Using {normalized_count} images normalized for print from {self.image_cache_dir}')
+        return html_tools.replace_img_srcs(html, srcs)
 
     @abstractmethod
     def get_body_html(self):
@@ -966,62 +1143,85 @@ class PdfConverter:
 
     @staticmethod
     def _fix_links(html):
-        # Change [[http.*]] to <a href="http\1">http\1</a>
-        html = re.sub(r'\[\[http([^\]]+)\]\]', r'<a href="http\1">http\1</a>', html, flags=re.IGNORECASE)
-
-        # convert URLs to links if not already
-        html = re.sub(r'([^">])((http|https|ftp)://[A-Za-z0-9/?&_.:=#-]+[A-Za-z0-9/?&_:=#-])',
-                      r'\1<a href="\2">\2</a>', html, flags=re.IGNORECASE)
-
-        # URLS wth just www at the start, no http
-        html = re.sub(r'([^/])(www\.[A-Za-z0-9/?&_.:=#-]+[A-Za-z0-9/?&_:=#-])', r'\1<a href="http://\2">\2</a>',
-                      html, flags=re.IGNORECASE)
-
-        return html
+        # Changes [[http.*]] to <a href="http\1">http\1</a>, then URLs not already in links and ones with just www to
+        # links
+        return link_rewriter.fix_urls(html)
 
     def fix_links(self, html):
         # can be implemented by child class
         return html
 
     def get_appendix_rcs(self):
-        for rc_link, rc in self.rcs.items():
-            self.crawl_ta_tw_deep_linking(rc)
-
-    def crawl_ta_tw_deep_linking(self, source_rc: ResourceContainerLink):
-        if not source_rc or not source_rc.article:
-            return
-        self.logger.info(f'Crawling {source_rc.rc_link} (level: {source_rc.linking_level})...')
-        # get all rc links. the "?:" in the regex means to not leave the (ta|tw) match in the result
-        rc_links = re.findall(r'rc://[A-Z0-9_*-]+/(?:ta|tw)/[A-Z0-9/_*-]+', source_rc.article, flags=re.IGNORECASE | re.MULTILINE)
-        for rc_link in rc_links:
-            if rc_link in self.rcs or rc_link in self.appendix_rcs:
-                rc = self.rcs[rc_link] if rc_link in self.rcs else self.appendix_rcs[rc_link]
-                if rc.linking_level > source_rc.linking_level + 1:
-                    rc.linking_level = source_rc.linking_level + 1
-                already_crawled = True
-            else:
-                rc = self.add_appendix_rc(rc_link, linking_level=source_rc.linking_level + 1)
-                if rc.resource not in self.resources:
-                    # We don't have this resource in our list of resources, so adding
-                    resource = Resource(resource_name=rc.resource, repo_name=f'{self.lang_code}_{rc.resource}',
-                                        owner=self.main_resource.owner)
-                    self.setup_resource(resource)
-                already_crawled = False
-            rc.add_reference(source_rc)
-            if not rc.article and (not already_crawled or rc.linking_level <= APPENDIX_LINKING_LEVEL):
+        # Levels of the TA and TW articles linked from the body, from the link graphs, so only the articles in the
+        # appendix are rendered
+        start_links = {rc_link: self.get_article_rc_links(rc.article) for rc_link, rc in self.rcs.items()}
+        levels = get_linking_levels(start_links, self.get_linked_rc_links, APPENDIX_LINKING_LEVEL)
+        for rc_link, (linking_level, source_links) in levels.items():
+            source_rcs = [self.rcs[link] if link in self.rcs else self.appendix_rcs[link] for link in source_links
+                          if link in self.rcs or link in self.appendix_rcs]
+            if rc_link in self.rcs:
+                for source_rc in source_rcs:
+                    self.rcs[rc_link].add_reference(source_rc)
+                continue
+            rc = self.create_rc(rc_link, linking_level=linking_level)
+            if rc.resource not in self.resources or not source_rcs:
+                # Links to a resource we don't have, or from an article that couldn't be rendered
+                continue
+            self.appendix_rcs[rc.rc_link] = rc
+            for source_rc in source_rcs:
+                rc.add_reference(source_rc)
+            if rc.linking_level <= APPENDIX_LINKING_LEVEL:
+                self.logger.info(f'Rendering {rc.rc_link} (level: {rc.linking_level})...')
                 if rc.resource == 'ta':
-                    self.get_ta_article_html(rc, source_rc)
+                    self.get_ta_article_html(rc, source_rcs[0])
                 elif rc.resource == 'tw':
-                    self.get_tw_article_html(rc, source_rc)
-                if rc.article and rc.title:
-                    if rc.linking_level <= APPENDIX_LINKING_LEVEL:
-                        self.crawl_ta_tw_deep_linking(rc)
-                    else:
-                        rc.set_article(None)
-                else:
+                    self.get_tw_article_html(rc, source_rcs[0])
+                found = rc.article and rc.title
+            else:
+                # Only needs to exist
+                found = self.find_ta_article(rc, source_rcs[0]) if rc.resource == 'ta' \
+                    else self.find_tw_article(rc, source_rcs[0])
+            if not found:
+                for source_rc in source_rcs:
                     self.add_error_message(source_rc, rc.rc_link)
                     self.logger.error(f'LINK TO UNKNOWN RESOURCE FOUND IN {source_rc.rc_link}: {rc.rc_link}')
-                    del self.appendix_rcs[rc.rc_link]
+                del self.appendix_rcs[rc.rc_link]
+
+    def get_article_rc_links(self, html):
+        """
+        :return: the TA and TW rc links in an article, as their RCs' rc_link
+        """
+        if not html:
+            return []
+        return list(dict.fromkeys(self.create_rc(rc_link).rc_link for rc_link in get_rc_links(html)))
+
+    def get_linked_rc_links(self, rc_link):
+        """
+        :return: the TA and TW rc links of the article of a TA or TW rc link, from the link graph of its resource, or
+            None if there is no such article
+        """
+        rc = self.create_rc(rc_link)
+        if rc.resource not in APPENDIX_RESOURCES or rc.resource not in self.resources:
+            return None
+        repo_dir = self.resources[rc.resource].repo_dir
+        if rc.resource == 'ta':
+            article_file = self.get_ta_article_file(rc)
+            graph = self.ta_link_graph
+        else:
+            article_file = self.get_tw_article_file(rc)[0]
+            graph = self.tw_link_graph
+        if not os.path.isfile(article_file):
+            return None
+        rc_links = graph.get(os.path.relpath(article_file, repo_dir).replace(os.path.sep, '/'))
+        if rc_links is None:
+            # An article the graph doesn't have, e.g. of a TA project that isn't in the manifest
+            if rc.resource == 'ta':
+                rc_links = get_ta_article_links(article_file, self.lang_code, self.ta_index, rc.project,
+                                                self.get_ta_config(rc.project).get(rc.path))
+            else:
+                rc_links = get_tw_article_links(article_file, self.lang_code,
+                                                os.path.basename(os.path.dirname(article_file)))
+        return [self.create_rc(link).rc_link for link in rc_links]
 
     def get_appendix_html(self, resource):
         html = ''
@@ -1048,22 +1248,12 @@ class PdfConverter:
 
     def get_ta_article_html(self, rc, source_rc, config=None, toc_level=2):
         if not config:
-            config_file = os.path.join(self.resources[rc.resource].repo_dir, rc.project, 'config.yaml')
-            config = yaml.full_load(read_file(config_file))
-        article_dir = os.path.join(self.resources[rc.resource].repo_dir, rc.project, rc.path)
-        article_file = os.path.join(article_dir, '01.md')
-        if os.path.isfile(article_file):
-            article_file_html = markdown2.markdown_path(article_file, extras=['markdown-in-html', 'tables', 'break-on-newline'])
-        else:
-            message = 'no corresponding article found'
-            if os.path.isdir(article_dir):
-                if not os.path.isfile(article_file):
-                    message = 'dir exists but no 01.md file'
-                else:
-                    message = '01.md file exists but no content'
-            self.add_error_message(source_rc, rc.rc_link, message)
-            self.logger.error(f'TA ARTICLE NOT FOUND: {article_file} - {message}')
+            config = self.get_ta_config(rc.project)
+        article_file = self.find_ta_article(rc, source_rc)
+        if not article_file:
             return
+        article_dir = os.path.dirname(article_file)
+        article_file_html = markdown2.markdown_path(article_file, extras=TA_MARKDOWN_EXTRAS)
         top_box = ''
         bottom_box = ''
         question = ''
@@ -1087,11 +1277,7 @@ class PdfConverter:
             if 'dependencies' in config[rc.path] and config[rc.path]['dependencies']:
                 lis = ''
                 for dependency in config[rc.path]['dependencies']:
-                    dep_project = rc.project
-                    for project in self.resources['ta'].projects:
-                        dep_article_dir = os.path.join(self.resources['ta'].repo_dir, project['identifier'], dependency)
-                        if os.path.isdir(dep_article_dir):
-                            dep_project = project['identifier']
+                    dep_project = get_dependency_project(self.ta_index, dependency, rc.project)
                     dep_rc_link = f'rc://{self.lang_code}/ta/man/{dep_project}/{dependency}'
                     lis += f'''
                     <li>[[{dep_rc_link}]]</li>
@@ -1107,15 +1293,8 @@ class PdfConverter:
             if 'recommended' in config[rc.path] and config[rc.path]['recommended']:
                 lis = ''
                 for recommended in config[rc.path]['recommended']:
-                    rec_project = rc.project
-                    rec_article_dir = os.path.join(self.resources['ta'].repo_dir, rec_project, recommended)
-                    if not os.path.exists(rec_article_dir):
-                        for project in self.resources['ta'].projects:
-                            rec_article_dir = os.path.join(self.resources['ta'].repo_dir, project['identifier'], recommended)
-                            if os.path.isdir(rec_article_dir):
-                                rec_project = project['identifier']
-                                break
-                    if not os.path.exists(rec_article_dir):
+                    rec_project = get_recommended_project(self.ta_index, recommended, rc.project)
+                    if not rec_project:
                         bad_rc_link = f"{rc.project}/config.yaml -> '{rc.path}' -> 'recommended' -> '{recommended}'"
                         self.add_error_message(rc, bad_rc_link)
                         self.logger.error(f'RECOMMENDED NOT FOUND FOR {bad_rc_link}')
@@ -1156,6 +1335,23 @@ class PdfConverter:
         article_html = self.fix_ta_links(article_html, rc.project)
         rc.set_article(article_html)
 
+    def get_ta_article_file(self, rc):
+        return os.path.join(self.resources[rc.resource].repo_dir, rc.project, rc.path, '01.md')
+
+    def find_ta_article(self, rc, source_rc):
+        """
+        :return: the 01.md file of a TA article, or None after adding an error for it to source_rc
+        """
+        article_file = self.get_ta_article_file(rc)
+        if os.path.isfile(article_file):
+            return article_file
+        message = 'no corresponding article found'
+        if os.path.isdir(os.path.dirname(article_file)):
+            message = 'dir exists but no 01.md file'
+        self.add_error_message(source_rc, rc.rc_link, message)
+        self.logger.error(f'TA ARTICLE NOT FOUND: {article_file} - {message}')
+        return None
+
     def get_go_back_to_html(self, source_rc):
         if source_rc.linking_level == 0:
             return ''
@@ -1175,33 +1371,44 @@ class PdfConverter:
         return go_back_to_html
 
     def fix_ta_links(self, text, project):
-        text = re.sub(r'href="\.\./\.\./([^/"]+)/([^/"]+?)/*(01\.md)*"', rf'href="rc://{self.lang_code}/ta/man/\1/\2"', text,
-                      flags=re.IGNORECASE | re.MULTILINE)
-        text = re.sub(r'href="\.\./([^/"]+?)/*(01\.md)*"', rf'href="rc://{self.lang_code}/ta/man/{project}/\1"', text,
-                      flags=re.IGNORECASE | re.MULTILINE)
-        text = re.sub(r'href="([^# :/"]+)"', rf'href="rc://{self.lang_code}/ta/man/{project}/\1"', text,
-                      flags=re.IGNORECASE | re.MULTILINE)
-        return text
+        return link_rewriter.fix_ta_links(text, self.lang_code, project)
 
-    def get_tw_article_html(self, rc, source_rc=None, increment_header_depth=1):
+    def get_tw_article_file(self, rc):
+        """
+        :return: [the markdown file of a TW article, the fix for its rc link if it is found under another one or None]
+        """
         file_path = os.path.join(self.resources[rc.resource].repo_dir, rc.project, f'{rc.path}.md')
         fix = None
-        if not os.path.exists(file_path):
-            bad_names = {
-                'live': 'bible/kt/life'
-            }
-            if rc.extra_info[-1] in bad_names:
-                path2 = bad_names[rc.extra_info[-1]]
-            elif rc.path.startswith('bible/other/'):
-                path2 = re.sub(r'^bible/other/', r'bible/kt/', rc.path)
-            else:
-                path2 = re.sub(r'^bible/kt/', r'bible/other/', rc.path)
-            fix = 'change to rc://{0}/tw/dict/{1}'.format(self.lang_code, path2)
-            file_path = os.path.join(self.resources[rc.resource].repo_dir, rc.project, f'{path2}.md')
-        if os.path.isfile(file_path):
-            if fix:
-                self.add_error_message(source_rc, rc.rc_link, fix)
-                self.logger.error(f'FIX FOUND FOR FOR TW ARTICLE IN {source_rc.rc_link}: {rc.rc_link} => {fix}')
+        if rc.project == 'bible' and rc.extra_info:
+            # Finds the article in another category (e.g. kt instead of other) if it isn't in the linked one
+            category = rc.extra_info[0] if len(rc.extra_info) > 1 else None
+            found = find_tw_term(self.tw_index, rc.extra_info[-1], category, TW_TERM_FIXES)
+            if found:
+                if found != [category, rc.extra_info[-1]]:
+                    fix = f'change to rc://{self.lang_code}/tw/dict/bible/{found[0]}/{found[1]}'
+                file_path = os.path.join(self.resources[rc.resource].repo_dir, rc.project, found[0],
+                                         f'{found[1]}.md')
+        return [file_path, fix]
+
+    def find_tw_article(self, rc, source_rc=None):
+        """
+        :return: the markdown file of a TW article, or None after adding an error for it to source_rc. An article
+            found under another rc link adds the fix to source_rc
+        """
+        file_path, fix = self.get_tw_article_file(rc)
+        if not os.path.isfile(file_path):
+            self.add_error_message(source_rc, rc.rc_link)
+            self.logger.error(f'TW ARTICLE NOT FOUND: {file_path}')
+            return None
+        if fix:
+            self.add_error_message(source_rc, rc.rc_link, fix)
+            self.logger.error(f'FIX FOUND FOR FOR TW ARTICLE IN {source_rc.rc_link if source_rc else None}: '
+                              f'{rc.rc_link} => {fix}')
+        return file_path
+
+    def get_tw_article_html(self, rc, source_rc=None, increment_header_depth=1):
+        file_path = self.find_tw_article(rc, source_rc)
+        if file_path:
             tw_article_html = markdown2.markdown_path(file_path)
             tw_article_html = html_tools.make_first_header_section_header(tw_article_html)
             tw_article_html = html_tools.increment_headers(tw_article_html, increment_header_depth)
@@ -1213,19 +1420,9 @@ class PdfConverter:
 '''
             rc.set_title(html_tools.get_title_from_html(tw_article_html))
             rc.set_article(tw_article_html)
-        else:
-            self.add_error_message(source_rc, rc.rc_link)
-            self.logger.error(f'TW ARTICLE NOT FOUND: {file_path}')
 
     def fix_tw_links(self, text, group):
-        text = re.sub(r'href="\.\./([^/)]+?)(\.md)*"', rf'href="rc://{self.lang_code}/tw/dict/bible/{group}/\1"', text,
-                      flags=re.IGNORECASE | re.MULTILINE)
-        text = re.sub(r'href="\.\./([^)]+?)(\.md)*"', rf'href="rc://{self.lang_code}/tw/dict/bible/\1"', text,
-                      flags=re.IGNORECASE | re.MULTILINE)
-        text = re.sub(r'(\(|\[\[)(\.\./)*(kt|names|other)/([^)]+?)(\.md)*(\)|\]\])(?!\[)',
-                      rf'[[rc://{self.lang_code}/tw/dict/bible/\3/\4]]', text,
-                      flags=re.IGNORECASE | re.MULTILINE)
-        return text
+        return link_rewriter.fix_tw_links(text, self.lang_code, group)
 
 
 def run_converter(resource_names: List[str], pdf_converter_class: Type[PdfConverter], logo_url=None,
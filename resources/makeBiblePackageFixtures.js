@@ -0,0 +1,17 @@
+// Writes what tc-source-content-updater makes of the test bibles in general_tools/fixtures/bible_package, the same
+// way processBibles.js processes the bibles, for general_tools/test_bible_package.py to compare the Python port to:
+//   cd resources && npm install && node makeBiblePackageFixtures.js
+const path = require('path');
+const SourceContentUpdater = require('tc-source-content-updater').default;
+
+const fixturesPath = process.argv.length > 2 ? process.argv[2] :
+  path.join(__dirname, '..', 'general_tools', 'fixtures', 'bible_package');
+const outputPath = process.argv.length > 3 ? process.argv[3] : path.join(fixturesPath, 'node');
+const updater = new SourceContentUpdater();
+
+const ugnt = {languageId: 'el-x-koine', resourceId: 'ugnt', downloadUrl: 'https://test.com'};
+updater.parseBiblePackage(ugnt, path.join(fixturesPath, 'el-x-koine_ugnt'), path.join(outputPath, 'ugnt'));
+updater.generateTwGroupDataFromAlignedBible(ugnt, path.join(outputPath, 'ugnt'), path.join(outputPath, 'tw'));
+
+const ult = {languageId: 'en', resourceId: 'ult', downloadUrl: 'https://test.com'};
+updater.parseBiblePackage(ult, path.join(fixturesPath, 'en_ult'), path.join(outputPath, 'ult'));
@@ -45,6 +45,7 @@ class SnPdfConverter(TsvPdfConverter):
         self.populate_sn_book_data()
         html = self.get_sn_html()
         self.sn_book_data = None
+        self.clear_book_data()
         return html
 
     def populate_sn_book_data(self):
@@ -59,6 +59,7 @@ class SnSqPdfConverter(TsvPdfConverter):
         self.populate_sq_book_data()
         html = self.get_sn_sq_html()
         self.sn_book_data = None
+        self.clear_book_data()
         return html
 
     def populate_sn_book_data(self):
@@ -15,15 +15,11 @@ import re
 import markdown2
 import subprocess
 import general_tools.html_tools as html_tools
-from bs4 import BeautifulSoup
 from collections import OrderedDict
 from pdf_converter import RepresentsInt
 from tsv_pdf_converter import TsvPdfConverter, main
-from tx_usfm_tools.singleFilelessHtmlRenderer import SingleFilelessHtmlRenderer
 from general_tools.bible_books import BOOK_NUMBERS, BOOK_CHAPTER_VERSES
 from general_tools.alignment_tools import flatten_alignment, flatten_quote
-from general_tools.file_utils import read_file, get_latest_version_path
-from general_tools.usfm_utils import unalign_usfm
 
 DEFAULT_ULT_ID = 'ult'
 DEFAULT_UST_ID = 'ust'
@@ -59,6 +55,7 @@ class SqPdfConverter(TsvPdfConverter):
         self.populate_sq_book_data()
         html = self.get_sq_html()
         self.sq_book_data = None
+        self.clear_book_data()
         return html
 
     def get_usfm_from_verse_objects(self, verse_objects):
@@ -111,55 +108,6 @@ class SqPdfConverter(TsvPdfConverter):
                 exit(1)
         return usfm
 
-    def populate_book_data(self, bible_id, lang_code=None):
-        if not lang_code:
-            lang_code = self.lang_code
-        bible_path = os.path.join(self.resources_dir, lang_code, 'bibles', bible_id)
-        if not bible_path:
-            self.logger.error(f'{bible_path} not found!')
-            exit(1)
-        bible_version_path = get_latest_version_path(bible_path)
-        if not bible_version_path:
-            self.logger.error(f'No versions found in {bible_path}!')
-            exit(1)
-
-        book_data = OrderedDict()
-        book_file = os.path.join(self.resources[bible_id].repo_dir, f'{self.book_number}-{self.project_id.upper()}.usfm')
-        book_usfm = read_file(book_file)
-
-        unaligned_usfm = unalign_usfm(book_usfm)
-        self.logger.info(f'Converting {self.project_id.upper()} from USFM to HTML...')
-        book_html, warnings = SingleFilelessHtmlRenderer({self.project_id.upper(): unaligned_usfm}).render()
-        html_verse_splits = re.split(r'(<span id="[^"]+-ch-0*(\d+)-v-(\d+(?:-\d+)?)" class="v-num">)', book_html)
-        usfm_chapter_splits = re.split(r'\\c ', unaligned_usfm)
-        usfm_verse_splits = None
-        chapter_verse_index = 0
-        for i in range(1, len(html_verse_splits), 4):
-            chapter = html_verse_splits[i+1]
-            verses = html_verse_splits[i+2]
-            if chapter not in book_data:
-                book_data[chapter] = OrderedDict()
-                usfm_chapter = f'\\c {usfm_chapter_splits[int(chapter)]}'
-                usfm_verse_splits = re.split(r'\\v ', usfm_chapter)
-                chapter_verse_index = 0
-            chapter_verse_index += 1
-            verse_usfm = f'\\v {usfm_verse_splits[chapter_verse_index]}'
-            verse_html = html_verse_splits[i] + html_verse_splits[i+3]
-            verse_html = re.split('<h2', verse_html)[0]  # remove next chapter since only split on verses
-            verse_soup = BeautifulSoup(verse_html, 'html.parser')
-            for tag in verse_soup.find_all():
-                if (not tag.contents or len(tag.get_text(strip=True)) <= 0) and tag.name not in ['br', 'img']:
-                    tag.decompose()
-            verse_html = str(verse_soup)
-            verses = re.findall(r'\d+', verses)
-            for verse in verses:
-                verse = verse.lstrip('0')
-                book_data[chapter][verse] = {
-                    'usfm': verse_usfm,
-                    'html': verse_html
-                }
-        self.book_data[bible_id] = book_data
-
     def populate_sq_book_data(self):
         book_filename = f'{self.lang_code}_{self.main_resource.resource_name}_{self.book_number}-{self.project_id.upper()}.tsv'
         book_filepath = os.path.join(self.main_resource.repo_dir, book_filename)
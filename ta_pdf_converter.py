@@ -81,7 +81,7 @@ class TaPdfConverter(PdfConverter):
             project_id = project['identifier']
             project_path = os.path.join(self.main_resource.repo_dir, project_id)
             toc = yaml.full_load(read_file(os.path.join(project_path, 'toc.yaml')))
-            self.config = yaml.full_load(read_file(os.path.join(project_path, 'config.yaml')))
+            self.config = self.get_ta_config(project_id)
             articles_html += f'''
 <article id="{self.lang_code}-{project_id}-cover" class="manual-cover cover">
     <img src="{self.main_resource.logo_url}" alt="{project_id}" />
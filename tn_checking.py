@@ -70,6 +70,7 @@ class TnCheckingPdfConverter(TnPdfConverter):
         self.logger.info('Creating TN Checking for {0}...'.format(self.file_project_and_ref))
         self.add_style_sheet('../css/tn_style.css')
         self.process_bibles()
+        self.process_helps()
         self.populate_book_data(self.ult_id)
         self.populate_book_data(self.ust_id)
         self.populate_book_data(self.ol_bible_id, self.ol_lang_code)
@@ -40,6 +40,7 @@ class TnPdfConverter(TsvPdfConverter):
     def get_body_html(self):
         self.logger.info('Creating TN for {0}...'.format(self.file_project_and_ref))
         self.process_bibles()
+        self.process_helps()
         self.populate_book_data(self.ult_id)
         self.populate_book_data(self.ust_id)
         self.populate_book_data(self.ol_bible_id, self.ol_lang_code)
@@ -50,6 +51,7 @@ class TnPdfConverter(TsvPdfConverter):
         self.tn_book_data = None
         self.tn_groups_data = None
         self.tw_words_data = None
+        self.clear_book_data()
         return html
 
     def populate_tn_book_data(self):
@@ -351,6 +353,13 @@ class TnPdfConverter(TsvPdfConverter):
         self.tn_groups_data = groups_data
 
     def get_scripture_with_tw_words(self, bible_id, chapter, verse, rc=None):
+        if rc:
+            # Not cached, since bad highlights get reported for the given rc
+            return self.generate_scripture_with_tw_words(bible_id, chapter, verse, rc)
+        return self.get_cached_scripture('tw_words', bible_id, chapter, verse,
+                                         lambda: self.generate_scripture_with_tw_words(bible_id, chapter, verse))
+
+    def generate_scripture_with_tw_words(self, bible_id, chapter, verse, rc=None):
         scripture = self.get_plain_scripture(bible_id, chapter, verse)
         footnotes_split = re.compile('<div class="footnotes">', flags=re.IGNORECASE | re.MULTILINE)
         verses_and_footnotes = re.split(footnotes_split, scripture, maxsplit=1)
@@ -11,9 +11,9 @@
 This script generates the HTML and PDF TSV (parent class) documents
 """
 import os
-import re
 import argparse
 import csv
+import tempfile
 import subprocess
 from bs4 import BeautifulSoup
 from collections import OrderedDict
@@ -21,8 +21,13 @@ from pdf_converter import PdfConverter, run_converter, DEFAULT_ULT_ID, DEFAULT_U
 from tx_usfm_tools.singleFilelessHtmlRenderer import SingleFilelessHtmlRenderer
 from general_tools.bible_books import BOOK_NUMBERS
 from general_tools.alignment_tools import get_alignment, flatten_quote
-from general_tools.file_utils import read_file, load_json_object, get_latest_version_path, get_child_directories
-from general_tools.usfm_utils import unalign_usfm
+from general_tools.file_utils import read_file, load_json_object, get_latest_version_path, get_child_directories, \
+    remove_tree
+from general_tools.usfm_utils import get_unaligned_usfm
+from general_tools.bible_package import build_book_package, build_helps_package
+from general_tools.render_cache import render_usfm
+from general_tools.html_tools import get_plain_scripture_html
+from general_tools.link_rewriter import TSV_LINK_REGEX
 
 DEFAULT_RESOURCES = ['ugnt', 'uhb', 'tn', DEFAULT_ULT_ID, DEFAULT_UST_ID]
 
@@ -46,6 +51,9 @@ class TsvPdfConverter(PdfConverter):
 
         self.resources_dir = None
         self.book_data = OrderedDict()
+        self.scripture_cache = {}
+        self.scripture_cache_hits = 0
+        self.scripture_cache_misses = 0
         self.last_ended_with_quote_tag = False
         self.last_ended_with_paragraph_tag = False
         self.open_quote = False
@@ -73,17 +81,52 @@ class TsvPdfConverter(PdfConverter):
             return ''
 
     def process_bibles(self):
+        # Commits aren't part of the name, so new commits reuse the directory and only rebuild what changed
         resources = filter(lambda x: self.resources[x].resource_name in DEFAULT_RESOURCES, self.resources)
         resources = sorted(resources, key=lambda x: self.resources[x].resource_name)
-        resource_names_and_refs = '-'.join(list(map(lambda x: f'{self.resources[x].resource_name}_{self.resources[x].ref}' + (f'_{self.resources[x].commit}' if not self.resources[x].ref_is_tag else ''), resources)))
+        resource_names_and_refs = '-'.join(list(map(lambda x: f'{self.resources[x].resource_name}_{self.resources[x].ref}', resources)))
         self.resources_dir = os.path.join(self.working_dir, f'resources_{resource_names_and_refs}')
-        if self.update or not os.path.exists(self.resources_dir):
-            cmd = f'cd "{self.converters_dir}/resources" && node start {self.lang_code} "{self.resources_dir}" {self.ult_id} {self.ust_id}'
+        for bible_id, lang_code in [(self.ult_id, self.lang_code), (self.ust_id, self.lang_code),
+                                    (self.ol_bible_id, self.ol_lang_code)]:
+            resource = self.resources[bible_id]
+            bible_path = os.path.join(self.resources_dir, lang_code, 'bibles', bible_id, f'v{resource.version}')
+            tw_path = None
+            if bible_id == self.ol_bible_id:
+                tw_path = os.path.join(self.resources_dir, lang_code, 'translationHelps', 'translationWords',
+                                       f'v{resource.version}')
+            book_file = os.path.join(resource.repo_dir, f'{self.book_number}-{self.project_id.upper()}.usfm')
+            if build_book_package(read_file(book_file), bible_path, self.project_id, resource.manifest, tw_path,
+                                  commit=resource.commit):
+                self.logger.info(f'Built {bible_id.upper()} {self.project_id.upper()} package in {bible_path}')
+            else:
+                self.logger.info(f'{bible_id.upper()} {self.project_id.upper()} package is up to date')
+
+    def process_helps(self):
+        # TN group data still comes from tc-source-content-updater, which processes TA, TW and TN for all books
+        # and aligns the notes against the original language bibles and the ULT, so it is only rerun when one of
+        # their commits changes. It also parses every bible into the resources directory it is given, so it is
+        # given its own, and only its TN group data is published from there like the bibles are
+        helps_path = os.path.join(self.resources_dir, self.lang_code, 'translationHelps')
+        commits = {resource_id: self.resources[resource_id].commit
+                   for resource_id in ['uhb', 'ugnt', self.ult_id, self.ust_id, 'ta', 'tw', 'tn']
+                   if resource_id in self.resources}
+        # processBibles.js finds the repos in the parent of the resources directory, the working directory
+        node_resources_dir = tempfile.mkdtemp(prefix=f'{os.path.basename(self.resources_dir)}-node-',
+                                              dir=self.working_dir)
+
+        def run_node():
+            cmd = f'cd "{self.converters_dir}/resources" && node start {self.lang_code} "{node_resources_dir}" {self.ult_id} {self.ust_id}'
             self.logger.info(f'Running: {cmd}')
             ret = subprocess.call(cmd, shell=True)
             if ret:
                 self.logger.error('Error running resources/processBibles.js. Exiting.')
                 exit(1)
+            return os.path.join(node_resources_dir, self.lang_code, 'translationHelps', 'translationNotes')
+
+        try:
+            build_helps_package(helps_path, 'translationNotes', commits, run_node)
+        finally:
+            remove_tree(node_resources_dir)
 
     def get_usfm_from_verse_objects(self, verse_objects):
         usfm = ''
@@ -147,42 +190,34 @@ class TsvPdfConverter(PdfConverter):
             self.logger.error(f'No versions found in {bible_path}!')
             exit(1)
 
-        book_data = OrderedDict()
-        book_file = os.path.join(self.resources[bible_id].repo_dir, f'{self.book_number}-{self.project_id.upper()}.usfm')
-        book_usfm = read_file(book_file)
-
-        unaligned_usfm = unalign_usfm(book_usfm)
+        resource = self.resources[bible_id]
+        book_file = os.path.join(resource.repo_dir, f'{self.book_number}-{self.project_id.upper()}.usfm')
+        unaligned_usfm = get_unaligned_usfm(book_file, self.unaligned_cache_dir, resource.repo_name, resource.commit,
+                                            self.project_id)
         self.logger.info(f'Converting {self.project_id.upper()} from USFM to HTML...')
-        book_html, warnings = SingleFilelessHtmlRenderer({self.project_id.upper(): unaligned_usfm}).render()
-        html_verse_splits = re.split(r'(<span id="[^"]+-ch-0*(\d+)-v-(\d+(?:-\d+)?)" class="v-num">)', book_html)
-        usfm_chapter_splits = re.split(r'\\c ', unaligned_usfm)
-        usfm_verse_splits = None
-        chapter_verse_index = 0
-        for i in range(1, len(html_verse_splits), 4):
-            chapter = html_verse_splits[i+1]
-            verses = html_verse_splits[i+2]
-            if chapter not in book_data:
-                book_data[chapter] = OrderedDict()
-                usfm_chapter = f'\\c {usfm_chapter_splits[int(chapter)]}'
-                usfm_verse_splits = re.split(r'\\v ', usfm_chapter)
-                chapter_verse_index = 0
-            chapter_verse_index += 1
-            verse_usfm = f'\\v {usfm_verse_splits[chapter_verse_index]}'
-            verse_html = html_verse_splits[i] + html_verse_splits[i+3]
-            verse_html = re.split('<h2', verse_html)[0]  # remove next chapter since only split on verses
-            verse_soup = BeautifulSoup(verse_html, 'html.parser')
-            for tag in verse_soup.find_all():
-                if (not tag.contents or len(tag.get_text(strip=True)) <= 0) and tag.name not in ['br', 'img']:
-                    tag.decompose()
-            verse_html = str(verse_soup)
-            verses = re.findall(r'\d+', verses)
-            for verse in verses:
-                verse = verse.lstrip('0')
-                book_data[chapter][verse] = {
-                    'usfm': verse_usfm,
-                    'html': verse_html
-                }
+        book_data, warnings = render_usfm(self.project_id.upper(), unaligned_usfm, self.render_cache_dir, verses=True)
         self.book_data[bible_id] = book_data
+        self.scripture_cache = {key: value for key, value in self.scripture_cache.items() if key[1] != bible_id}
+
+    def clear_book_data(self):
+        self.logger.info(f'Scripture cache: {self.scripture_cache_hits} hits, {self.scripture_cache_misses} misses')
+        self.book_data = OrderedDict()
+        self.scripture_cache = {}
+        self.scripture_cache_hits = 0
+        self.scripture_cache_misses = 0
+
+    def get_cached_scripture(self, view, bible_id, chapter, verse, generator):
+        """
+        Returns the given view (e.g. 'plain') of a verse, calling generator() only the first time it is asked
+        for since book_data was populated for the bible
+        """
+        key = (view, bible_id, chapter, verse)
+        if key in self.scripture_cache:
+            self.scripture_cache_hits += 1
+        else:
+            self.scripture_cache_misses += 1
+            self.scripture_cache[key] = generator()
+        return self.scripture_cache[key]
 
     @staticmethod
     def unicode_csv_reader(utf8_data, dialect=csv.excel, **kwargs):
@@ -191,33 +226,13 @@ class TsvPdfConverter(PdfConverter):
             yield [cell for cell in row]
 
     def get_plain_scripture(self, bible_id, chapter, verse):
+        return self.get_cached_scripture('plain', bible_id, chapter, verse,
+                                         lambda: self.generate_plain_scripture(bible_id, chapter, verse))
+
+    def generate_plain_scripture(self, bible_id, chapter, verse):
         if verse not in self.book_data[bible_id][chapter]:
             return ''
-        data = self.book_data[bible_id][chapter][verse]
-        footnotes_split = re.compile('<div class="footnotes">', flags=re.IGNORECASE | re.MULTILINE)
-        verses_and_footnotes = re.split(footnotes_split, data['html'], maxsplit=1)
-        scripture = verses_and_footnotes[0]
-        footnotes = ''
-        if len(verses_and_footnotes) == 2:
-            footnote = f'<div class="footnotes">{verses_and_footnotes[1]}'
-            if footnotes:
-                footnote = footnote.replace('<hr class="footnotes-hr"/>', '')
-            footnotes += footnote
-        html = ''
-        if scripture:
-            scripture = re.sub(r'\s*<span class="v-num"', '</div><div class="verse"><span class="v-num"', scripture, flags=re.IGNORECASE | re.MULTILINE)
-            scripture = re.sub(r'^</div>', '', scripture)
-            if scripture and '<div class="verse">' in scripture:
-                scripture += '</div>'
-            html = scripture + footnotes
-            html = re.sub(r'\s*\n\s*', ' ', html, flags=re.IGNORECASE | re.MULTILINE)
-            html = re.sub(r'\s*</*p[^>]*>\s*', ' ', html, flags=re.IGNORECASE | re.MULTILINE)
-            html = html.strip()
-            html = re.sub('id="(ref-)*fn-', rf'id="{bible_id}-\1fn-', html,
-                          flags=re.IGNORECASE | re.MULTILINE)
-            html = re.sub('href="#(ref-)*fn-', rf'href="#{bible_id}-\1fn-', html,
-                          flags=re.IGNORECASE | re.MULTILINE)
-        return html
+        return get_plain_scripture_html(self.book_data[bible_id][chapter][verse]['html'], bible_id)
 
     def get_verse_objects(self, bible_id, chapter, verse):
         bible_path = os.path.join(self.resources_dir, self.lang_code, 'bibles', bible_id)
@@ -309,8 +324,7 @@ QUOTE: {quote_string}
                 v = parts[1]
                 new_link = f'rc://{self.lang_code}/{self.name}/help/{self.project_id}/{self.pad(chapter)}/{v.zfill(3)}'
             return f'<a{before_href}href="{new_link}"{after_href}>{linked_text}</a>'
-        regex = re.compile(r'<a([^>]+)href="(\.[^"]+)"([^>]*)>(.*?)</a>')
-        html = regex.sub(replace_link, html)
+        html = TSV_LINK_REGEX.sub(replace_link, html)
         return html
 
     def get_verse_html(self, usfm, resource_id, chapter, verse):
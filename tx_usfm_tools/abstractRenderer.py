@@ -1,9 +1,56 @@
 import logging
 
 from tx_usfm_tools.books import loadBooks, silNames
-from tx_usfm_tools.parseUsfm import parseString
+from tx_usfm_tools.parseUsfm import iterParseString, UsfmToken, TEXTToken
 
 
+# Renderer class => {token class: the render method of the renderer class that the token's renderOn() calls, a
+#   MissingRenderMethod if the renderer has no such method, or None if the token has to be rendered by renderOn()},
+#   built the first time a renderer class renders
+DISPATCH_TABLES = {}
+
+
+class RenderMethodRecorder:
+    """
+    Stands in for a renderer when a token's renderOn() is called, to find out which render method it calls
+    """
+    def __getattr__(self, name):
+        return lambda token: name
+
+
+class MissingRenderMethod:
+    """
+    A render method the renderer class doesn't have, with the error that calling it through renderOn() gives
+    """
+    def __init__(self, rendererClass, name):
+        self.error = f"'{rendererClass.__name__}' object has no attribute '{name}'"
+
+
+def getTokenClasses(tokenClass=UsfmToken):
+    tokenClasses = []
+    for subclass in tokenClass.__subclasses__():
+        tokenClasses += [subclass] + getTokenClasses(subclass)
+    return tokenClasses
+
+
+def getRenderMethod(rendererClass, tokenClass):
+    if not tokenClass.dispatchByTable:
+        return None
+    name = tokenClass.renderOn(tokenClass.__new__(tokenClass), RenderMethodRecorder())
+    if not isinstance(name, str):
+        return None
+    if not hasattr(rendererClass, name):
+        return MissingRenderMethod(rendererClass, name)
+    return getattr(rendererClass, name)
+
+
+def getDispatchTable(rendererClass):
+    table = DISPATCH_TABLES.get(rendererClass)
+    if table is None:
+        table = {tokenClass: getRenderMethod(rendererClass, tokenClass) for tokenClass in getTokenClasses()}
+        DISPATCH_TABLES[rendererClass] = table
+    return table
+
 
 class AbstractRenderer:
 
@@ -11,6 +58,10 @@ class AbstractRenderer:
 
     chapterLabel = 'Chapter'
 
+    # Tokenize with parseUsfm.scanTokens(), which streams tokens to the render methods as they are scanned,
+    #   instead of the pyparsing grammar, which parses the whole book first
+    useScanner = True
+
     def writeLog(self, s):
         # logging.info(s)
         pass
@@ -30,31 +81,53 @@ class AbstractRenderer:
             bookName = self.renderBook # This gives an AttributeError for USFM
             if bookName in self.booksUsfm:
                 self.writeLog('     (' + bookName + ')')
-                tokens = parseString(self.booksUsfm[bookName])
-                for t in tokens:
-                    try:
-                        t.renderOn(self)
-                    except Exception as e:
-                        warning_list.append(f"Unable to render '{t.type}' token due to {e}")
+                tokens = iterParseString(self.booksUsfm[bookName], useScanner=self.useScanner)
+                self.renderTokens(tokens, warning_list)
         except AttributeError:
             # logging.debug("AbstractRenderer.run() now using silNames…")
             for bookName in silNames:
                 if bookName in self.booksUsfm:
                     # logging.debug(f"AbstractRenderer.run() converting {bookName}…")
                     self.writeLog('     (' + bookName + ')')
-                    tokens = parseString(self.booksUsfm[bookName])
-                    for t in tokens:
-                        try:
-                            t.renderOn(self)
-                        except Exception as e:
-                            warning_list.append(f"Unable to render '{t.type}' token due to {e}")
+                    tokens = iterParseString(self.booksUsfm[bookName], useScanner=self.useScanner)
+                    self.renderTokens(tokens, warning_list)
+        self.logUnknowns()
+        return set(warning_list) # Remove duplicates
+    # end of run()
+
+
+    def renderTokens(self, tokens, warning_list):
+        """
+        Calls the render method of each token from the renderer class's dispatch table, instead of going through
+            the token's renderOn(), with text (most of the tokens) checked for first. Tokens the renderer has no
+            method for get the same warning as when renderOn() fails, without raising the AttributeError
+        """
+        table = getDispatchTable(self.__class__)
+        renderText = table.get(TEXTToken)
+        if renderText.__class__ is MissingRenderMethod:
+            renderText = None
+        for t in tokens:
+            try:
+                if t.__class__ is TEXTToken and renderText:
+                    renderText(self, t)
+                    continue
+                renderMethod = table.get(t.__class__)
+                if renderMethod is None:
+                    t.renderOn(self)
+                elif renderMethod.__class__ is MissingRenderMethod:
+                    warning_list.append(f"Unable to render '{t.type}' token due to {renderMethod.error}")
+                else:
+                    renderMethod(self, t)
+            except Exception as e:
+                warning_list.append(f"Unable to render '{t.type}' token due to {e}")
+
+
+    def logUnknowns(self):
         if self.unknowns:
             unknownsSet = set(self.unknowns)
             msg = f"Renderer skipped {len(self.unknowns)} total, {len(unknownsSet)} unique unknown USFM tokens: {', '.join(unknownsSet)}"
             logging.error(msg)
             # warning_list.append(msg)
-        return set(warning_list) # Remove duplicates
-    # end of run()
 
 
     # Added here May 2019 so they applied to all derived renderers
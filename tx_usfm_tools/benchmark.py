@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+#
+#  Copyright (c) 2021 unfoldingWord
+#  http://creativecommons.org/licenses/MIT/
+#  See LICENSE file for details.
+
+"""
+Benchmarks the USFM pipeline (unalign, clean, parse and render) book by book, and compares the totals to a baseline.
+
+With no USFM directory, aligned USFM is synthesized for every book from the verse counts in usfm_verses, so
+the results only depend on the code. Times are divided by the time of a fixed calibration loop before they are
+compared, so a baseline saved on one machine can be used on another.
+
+    python -m tx_usfm_tools.benchmark
+    python -m tx_usfm_tools.benchmark -d ~/working/en_ult -b TIT -b JUD --no-baseline
+    python -m tx_usfm_tools.benchmark --save-baseline
+    python -m tx_usfm_tools.benchmark -b TIT --compare-tokenizers
+    python -m tx_usfm_tools.benchmark -b PSA --compare-dispatch
+    python -m tx_usfm_tools.benchmark -b PSA --compare-html-buffers
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import tracemalloc
+from glob import glob
+from collections import OrderedDict
+from tx_usfm_tools.usfm_verses import verses
+from tx_usfm_tools.parseUsfm import clean, scanTokens, scanString, createToken, usfm, iterParseString
+from tx_usfm_tools.verifyUSFM import get_book_code
+from tx_usfm_tools.singleFilelessHtmlRenderer import SingleFilelessHtmlRenderer, HtmlBuffer
+from general_tools.usfm_utils import unalign_usfm
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+REGRESSION_THRESHOLD = 0.3  # How much slower than the baseline a stage can get before the benchmark fails
+MIN_REGRESSION_TIME = 0.02  # Seconds a stage has to get slower by, so stages that take no time don't fail on noise
+STAGES = ['unalign', 'clean', 'parse', 'render']
+
+SYNTHESIZED_WORDS = ['In', 'the', 'beginning', 'God', 'created', 'heavens', 'and', 'earth', 'was', 'without',
+                     'form', 'void', 'darkness', 'over', 'surface', 'of', 'deep']
+ALIGNED_WORD = '\\zaln-s |x-strong="H{0:04d}" x-lemma="{1}" x-morph="He,Ncmsa" x-occurrence="1" ' \
+               'x-occurrences="1" x-content="{1}"\\*\\w {1}|x-occurrence="1" x-occurrences="1"\\w*\\zaln-e\\*'
+
+
+def get_synthesized_usfm(book_id):
+    """
+    Aligned USFM for a book with its number of chapters and verses, and the same text every time
+    """
+    book = verses[book_id]
+    usfm = [f'\\id {book_id} EN_ULT en_English_ltr unfoldingWord Literal Text\n\\usfm 3.0\n\\ide UTF-8\n'
+            f'\\h {book["en_name"]}\n\\toc1 {book["en_name"]}\n\\toc2 {book["en_name"]}\n\\toc3 {book_id}\n'
+            f'\\mt {book["en_name"]}\n']
+    for chapter in range(1, book['chapters'] + 1):
+        usfm.append(f'\n\\s5\n\\c {chapter}\n\\p\n')
+        for verse in range(1, int(book['verses'][chapter - 1]) + 1):
+            words = [SYNTHESIZED_WORDS[(chapter + verse + idx) % len(SYNTHESIZED_WORDS)]
+                     for idx in range(8 + (chapter * verse) % 12)]
+            aligned_words = [ALIGNED_WORD.format(idx, word) for idx, word in enumerate(words)]
+            for idx in range(3, len(aligned_words), 6):
+                aligned_words[idx] = f'\\add {aligned_words[idx]}\\add*'
+            usfm.append(f'\\v {verse} ' + '\n'.join(aligned_words))
+            if verse % 7 == 0:
+                usfm.append(f'\\f + \\ft Some versions read \\fqa {words[0]}\\fqa*.\\f*')
+            usfm.append(',\n\\q1 "quoted" \\nd text\\nd*.\n\\q2 more\n' if verse % 5 == 0 else '.\n')
+    return ''.join(usfm)
+
+
+def load_corpus(usfm_dir=None, book_ids=None):
+    """
+    :param usfm_dir: directory of USFM files, e.g. a clone of en_ult, or None to synthesize the USFM
+    :param book_ids: the books to benchmark, or None for all
+    :return: {book_id: aligned USFM} in bible order
+    """
+    corpus = OrderedDict()
+    if usfm_dir:
+        for usfm_file in sorted(glob(os.path.join(usfm_dir, '*.usfm'))):
+            book_id = get_book_code(usfm_file)
+            if book_id in verses and (not book_ids or book_id in book_ids):
+                with open(usfm_file, encoding='utf-8') as f:
+                    corpus[book_id] = f.read()
+    else:
+        for book_id in verses:
+            if not book_ids or book_id in book_ids:
+                corpus[book_id] = get_synthesized_usfm(book_id)
+    return corpus
+
+
+def get_calibration_time(repeat=3):
+    """
+    Time of a fixed loop of string and dict work, which results are divided by to compare them across machines
+    """
+    def calibrate():
+        counts = {}
+        for idx in range(200000):
+            word = SYNTHESIZED_WORDS[idx % len(SYNTHESIZED_WORDS)] + str(idx % 100)
+            counts[word] = counts.get(word, 0) + len(word.upper())
+        return counts
+    return min(timed(calibrate)[0] for _ in range(repeat))
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return [time.perf_counter() - start, result]
+
+
+def run_stages(book_id, aligned_usfm):
+    """
+    Runs each stage of the pipeline once
+    :return: [{stage: seconds}, token count]
+    """
+    times = {}
+    times['unalign'], usfm = timed(unalign_usfm, aligned_usfm)
+    times['clean'], cleaned = timed(clean, usfm)
+    times['parse'], tokens = timed(lambda: [createToken(t) for t in scanTokens(cleaned)])
+    # Rendering includes tokenizing again, as render() streams the tokens to the render methods
+    times['render'], _ = timed(SingleFilelessHtmlRenderer({book_id: usfm}).render)
+    return [times, len(tokens)]
+
+
+def benchmark_book(book_id, aligned_usfm, repeat=3, memory=True):
+    """
+    :return: {'chars', 'tokens', <stage>: seconds (the fastest of repeat runs), 'peak_memory': bytes}
+    """
+    result = OrderedDict([('chars', len(aligned_usfm))])
+    runs = []
+    for _ in range(repeat):
+        times, result['tokens'] = run_stages(book_id, aligned_usfm)
+        runs.append(times)
+    for stage in STAGES:
+        result[stage] = round(min(times[stage] for times in runs), 6)
+    if memory:
+        # A separate run, as tracing memory slows everything down
+        tracemalloc.start()
+        try:
+            run_stages(book_id, aligned_usfm)
+            result['peak_memory'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def get_totals(books):
+    totals = OrderedDict()
+    for key in ['chars', 'tokens'] + STAGES:
+        totals[key] = round(sum(book.get(key, 0) for book in books.values()), 6)
+    for stage in ['parse', 'render']:
+        totals[f'{stage}_tokens_per_second'] = round(totals['tokens'] / totals[stage]) if totals[stage] else 0
+    totals['peak_memory'] = max([book.get('peak_memory', 0) for book in books.values()] or [0])
+    return totals
+
+
+def run_benchmark(corpus, repeat=3, memory=True, log=None):
+    """
+    Benchmarks every book of a corpus from load_corpus()
+    :param log: function to report each book's results with as it is done, if any
+    :return: {'calibration': seconds, 'books': {book_id: benchmark_book() result}, 'totals': {...}}
+    """
+    books = OrderedDict()
+    for book_id, aligned_usfm in corpus.items():
+        books[book_id] = benchmark_book(book_id, aligned_usfm, repeat, memory)
+        if log:
+            log(format_result(book_id, books[book_id]))
+    return OrderedDict([('calibration', round(get_calibration_time(), 6)), ('books', books),
+                        ('totals', get_totals(books))])
+
+
+def compare_results(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """
+    Compares the stage times of the books in both results, relative to their calibration times
+    :return: a message for each stage that got more than threshold (and MIN_REGRESSION_TIME) slower than in the
+        baseline
+    """
+    book_ids = [book_id for book_id in results['books'] if book_id in baseline['books']]
+    regressions = []
+    if not book_ids:
+        return regressions
+    for stage in STAGES:
+        current = sum(results['books'][book_id][stage] for book_id in book_ids) / results['calibration']
+        expected = sum(baseline['books'][book_id][stage] for book_id in book_ids) / baseline['calibration']
+        slower_time = (current - expected) * results['calibration']
+        if expected and current / expected > 1 + threshold and slower_time > MIN_REGRESSION_TIME:
+            regressions.append(f'{stage} is {(current / expected - 1) * 100:.0f}% slower than the baseline '
+                               f'(more than {threshold * 100:.0f}%)')
+    return regressions
+
+
+def compare_tokenizers(corpus, repeat=3):
+    """
+    Times tokenizing each book of a corpus from load_corpus() with the pyparsing grammar and with the scanner
+    :return: {book_id: {'grammar': seconds, 'scanner': seconds}}, the fastest of repeat runs
+    """
+    times = OrderedDict()
+    for book_id, aligned_usfm in corpus.items():
+        cleaned = clean(unalign_usfm(aligned_usfm))
+        times[book_id] = OrderedDict([
+            ('grammar', min(timed(usfm.parseString, cleaned, True)[0] for _ in range(repeat))),
+            ('scanner', min(timed(scanString, cleaned)[0] for _ in range(repeat)))
+        ])
+    return times
+
+
+def render_tokens_by_render_on(renderer, tokens, warning_list):
+    """
+    How AbstractRenderer.renderTokens() rendered tokens before its dispatch tables, through each token's renderOn()
+    """
+    for t in tokens:
+        try:
+            t.renderOn(renderer)
+        except Exception as e:
+            warning_list.append(f"Unable to render '{t.type}' token due to {e}")
+
+
+def compare_dispatch(corpus, repeat=3):
+    """
+    Times rendering the tokens of each book of a corpus from load_corpus() by calling each token's renderOn() and
+    with the renderer's dispatch table, the tokens being made beforehand so only the rendering is timed
+    :return: {book_id: {'tokens': count, 'render_on': seconds, 'table': seconds}}, the fastest of repeat runs
+    """
+    times = OrderedDict()
+    for book_id, aligned_usfm in corpus.items():
+        tokens = list(iterParseString(unalign_usfm(aligned_usfm), useScanner=True))
+
+        def render(render_tokens):
+            renderer = SingleFilelessHtmlRenderer({book_id: ''})
+            return timed(render_tokens, renderer, tokens, [])[0]
+        times[book_id] = OrderedDict([
+            ('tokens', len(tokens)),
+            ('render_on', min(render(render_tokens_by_render_on) for _ in range(repeat))),
+            ('table', min(render(SingleFilelessHtmlRenderer.renderTokens) for _ in range(repeat)))
+        ])
+    return times
+
+
+class ConcatenatingHtmlBuffer(HtmlBuffer):
+    """
+    How the renderer used to build its HTML, by concatenating strings
+    """
+    def __init__(self):
+        super().__init__()
+        self.html = ''
+
+    def write(self, s):
+        self.html += s
+
+    def getvalue(self, start=0):
+        return self.html
+
+
+def compare_html_buffers(corpus, repeat=3):
+    """
+    Times rendering each book of a corpus from load_corpus() by concatenating the HTML and with the renderer's
+    HtmlBuffer
+    :return: {book_id: {'concatenated': seconds, 'buffered': seconds}}, the fastest of repeat runs
+    """
+    times = OrderedDict()
+    for book_id, aligned_usfm in corpus.items():
+        books_usfm = {book_id: unalign_usfm(aligned_usfm)}
+        times[book_id] = OrderedDict([
+            ('concatenated', min(timed(SingleFilelessHtmlRenderer(books_usfm, ConcatenatingHtmlBuffer()).render)[0]
+                                 for _ in range(repeat))),
+            ('buffered', min(timed(SingleFilelessHtmlRenderer(books_usfm).render)[0] for _ in range(repeat)))
+        ])
+    return times
+
+
+def format_result(name, result):
+    stages = ' '.join(f'{stage} {result[stage]:.3f}s' for stage in STAGES)
+    tokens_per_second = result['tokens'] / result['parse'] if result['parse'] else 0
+    memory = f', peak {result["peak_memory"] / 1024 / 1024:.1f}MB' if result.get('peak_memory') else ''
+    return f'{name:>5}: {result["tokens"]:>7} tokens, {stages}, parsing {tokens_per_second:,.0f} tokens/s{memory}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-d', '--usfm-dir', dest='usfm_dir', default=None, required=False,
+                        help='Directory of USFM files to benchmark. Default: synthesized USFM of all books')
+    parser.add_argument('-b', '--book', dest='book_ids', default=None, required=False, action='append',
+                        help='Book to benchmark, e.g. TIT. Can specify multiple. Default: all books')
+    parser.add_argument('-r', '--repeat', dest='repeat', default=3, type=int, required=False,
+                        help='Times to run each book, keeping the fastest')
+    parser.add_argument('--baseline', dest='baseline_file', default=BASELINE_FILE, required=False,
+                        help=f'Baseline JSON file. Default: {BASELINE_FILE}')
+    parser.add_argument('--threshold', dest='threshold', default=REGRESSION_THRESHOLD, type=float, required=False,
+                        help='How much slower than the baseline a stage can be, e.g. 0.25 for 25%%')
+    parser.add_argument('--save-baseline', dest='save_baseline', action='store_true',
+                        help='Save the results as the baseline instead of comparing them to it')
+    parser.add_argument('--no-baseline', dest='no_baseline', action='store_true',
+                        help="Don't compare the results to the baseline")
+    parser.add_argument('--no-memory', dest='memory', action='store_false', help="Don't measure peak memory")
+    parser.add_argument('--compare-tokenizers', dest='compare_tokenizers', action='store_true',
+                        help='Only compare tokenizing with the pyparsing grammar to tokenizing with the scanner')
+    parser.add_argument('--compare-dispatch', dest='compare_dispatch', action='store_true',
+                        help="Only compare rendering tokens through their renderOn() to rendering them with the "
+                             "renderer's dispatch table")
+    parser.add_argument('--compare-html-buffers', dest='compare_html_buffers', action='store_true',
+                        help="Only compare rendering by concatenating the HTML to rendering with the renderer's "
+                             "HtmlBuffer")
+    args = parser.parse_args(sys.argv[1:])
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    book_ids = [book_id.upper() for book_id in args.book_ids] if args.book_ids else None
+    corpus = load_corpus(args.usfm_dir, book_ids)
+    if not corpus:
+        logging.error('No books to benchmark!')
+        exit(1)
+    if args.compare_tokenizers:
+        for book_id, times in compare_tokenizers(corpus, args.repeat).items():
+            logging.info(f'{book_id:>5}: pyparsing {times["grammar"]:.3f}s, scanner {times["scanner"]:.3f}s '
+                         f'({times["grammar"] / times["scanner"]:.1f}x)')
+        return
+    if args.compare_dispatch:
+        for book_id, times in compare_dispatch(corpus, args.repeat).items():
+            per_token = (times['render_on'] - times['table']) / times['tokens'] * 1e9
+            logging.info(f'{book_id:>5}: {times["tokens"]} tokens, renderOn {times["render_on"]:.3f}s, '
+                         f'dispatch table {times["table"]:.3f}s ({per_token:.0f}ns less per token)')
+        return
+    if args.compare_html_buffers:
+        for book_id, times in compare_html_buffers(corpus, args.repeat).items():
+            logging.info(f'{book_id:>5}: concatenated {times["concatenated"]:.3f}s, '
+                         f'buffered {times["buffered"]:.3f}s ({times["concatenated"] / times["buffered"]:.1f}x)')
+        return
+    results = run_benchmark(corpus, args.repeat, args.memory, logging.info)
+    totals = results['totals']
+    logging.info(format_result('total', totals))
+    logging.info(f'Rendering {totals["render_tokens_per_second"]:,.0f} tokens/s, '
+                 f'calibration {results["calibration"]:.3f}s')
+
+    if args.save_baseline:
+        with open(args.baseline_file, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+        logging.info(f'Saved the baseline to {args.baseline_file}')
+    elif not args.no_baseline and os.path.exists(args.baseline_file):
+        with open(args.baseline_file, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_results(results, baseline, args.threshold)
+        for regression in regressions:
+            logging.error(regression)
+        if regressions:
+            exit(1)
+        logging.info(f'No stage is more than {args.threshold * 100:.0f}% slower than the baseline')
+
+
+if __name__ == '__main__':
+    main()
@@ -2,11 +2,12 @@
 This version of parseUsfm.py appears to be used by verifyUSFM.py
     i.e., used by the USFM linter.
 """
+import re
 import sys
 import logging
 
 from pyparsing import Word, OneOrMore, nums, Literal, White, Group, \
-        Suppress, NoMatch, Optional, CharsNotIn, MatchFirst
+        Suppress, NoMatch, Optional, CharsNotIn, MatchFirst, ParseException
 
 
 __logger = logging.getLogger('usfm_tools')
@@ -335,15 +336,122 @@ usfm    = OneOrMore(element)
 #         sys.exit()
 #     return [createToken(t) for t in tokens]
 
-def parseString(unicodeString):
+def parseString(unicodeString, useScanner=False):
     """
     version of parseString for use in libraries
     :param unicodeString:
+    :param useScanner: use scanString() instead of the pyparsing grammar (same tokens, much faster)
+    :return:
+    """
+    return list(iterParseString(unicodeString, useScanner))
+
+
+def iterParseString(unicodeString, useScanner=False):
+    """
+    Generator version of parseString(). With useScanner, tokens are yielded as they are scanned,
+        so they can be rendered before the rest of the book is tokenized; the pyparsing grammar
+        has to parse the whole string first.
+    :param unicodeString:
+    :param useScanner: use scanTokens() instead of the pyparsing grammar
     :return:
     """
     cleaned = clean(unicodeString)
-    tokens = usfm.parseString(cleaned, parseAll=True)
-    return [createToken(t) for t in tokens]
+    if useScanner:
+        tokens = scanTokens(cleaned)
+    else:
+        tokens = usfm.parseString(cleaned, parseAll=True)
+    for t in tokens:
+        yield createToken(t)
+
+
+# Markers of the grammar above by how they are matched, for scanString()
+VALUE_MARKERS = {'id', 'ide', 'usfm', 'h', 'toc', 'toc1', 'toc2', 'toc3', 'mt', 'mt1', 'mt2', 'mt3',
+                 'ms', 'ms1', 'ms2', 'mr', 'd', 's', 's1', 's2', 's3', 's4', 's5', 'sr', 'sts', 'r', 'cl',
+                 'fr', 'fk', 'ft', 'fq', 'fqa', 'fqb', 'fv', 'fdc', 'xo', 'xt', 'sp', 'is', 'is1',
+                 'imt', 'imt1', 'imt2', 'imt3', 'rem'}
+PLUS_MARKERS = {'f', 'fe', 'x'}
+NUMBER_MARKERS = {'c', 'v'}
+PLAIN_MARKERS = {'p', 'pc', 'pi', 'pi1', 'pi2', 'mi', 'b', 'ca', 'va', 'q', 'q1', 'q2', 'q3', 'q4',
+                 'qa', 'qac', 'qc', 'qm', 'qm1', 'qm2', 'qm3', 'qr', 'qs', 'qt', 'nb', 'm', 'fp', 'xdc',
+                 'it', 'wj', 'nd', 'bd', 'bdit', 'li', 'li1', 'li2', 'li3', 'li4', 'add', 'tl',
+                 'is2', 'is3', 'ip', 'im', 'imi', 'iot', 'io', 'io1', 'io2', 'ior', 'ie', 'bk', 'sc',
+                 'tr', 'th1', 'th2', 'th3', 'th4', 'th5', 'th6', 'thr1', 'thr2', 'thr3', 'thr4', 'thr5', 'thr6',
+                 'tc1', 'tc2', 'tc3', 'tc4', 'tc5', 'tc6', 'tcr1', 'tcr2', 'tcr3', 'tcr4', 'tcr5', 'tcr6'}
+END_MARKERS = {'ca*', 'va*', 'qs*', 'qt*', 'fr*', 'ft*', 'fq*', 'fqa*', 'f*', 'fe*', 'fv*', 'fdc*',
+               'xdc*', 'xt*', 'x*', 'it*', 'wj*', 'nd*', 'bd*', 'bdit*', 'add*', 'tl*', 'ior*', 'bk*', 'sc*'}
+
+WHITESPACE = ' \t\r\n'
+whitespaceRegex = re.compile(r'[ \t\r\n]*')
+markerNameRegex = re.compile(r'[^ \t\r\n\\*]*')
+unknownRegex    = re.compile(r'[^ \n\t\\]+')
+phraseRegex     = re.compile(r'[^\n\\]+')
+numberRegex     = re.compile(r'[0-9()-]+')
+
+
+def scanString(cleaned):
+    """
+    Hand-written equivalent of usfm.parseString(cleaned, parseAll=True) for cleaned USFM:
+        returns the same token lists (e.g. ['v', '1'], ['text', 'In the beginning'], ['add*'])
+        to be passed to createToken()
+    """
+    return list(scanTokens(cleaned))
+
+
+def scanTokens(cleaned):
+    """
+    Generator version of scanString(), yielding each token list as soon as it is scanned
+    """
+    cleaned = cleaned.expandtabs()  # as pyparsing does
+    scanned = False
+    pos = whitespaceRegex.match(cleaned, 0).end()
+    length = len(cleaned)
+    while pos < length:
+        if cleaned[pos] != '\\':
+            end = phraseRegex.match(cleaned, pos).end()
+            yield ['text', cleaned[pos:end]]
+            scanned = True
+            pos = end
+        elif cleaned.startswith('\\\\', pos):
+            yield ['\\\\']
+            scanned = True
+            pos += 2
+        else:
+            token = None
+            nameEnd = markerNameRegex.match(cleaned, pos + 1).end()
+            name = cleaned[pos + 1:nameEnd]
+            nextChar = cleaned[nameEnd] if nameEnd < length else ''
+            if nextChar == '*':
+                if name + '*' in END_MARKERS:
+                    token = [name + '*']
+                    end = nameEnd + 1
+            elif nextChar and nextChar in WHITESPACE:
+                end = whitespaceRegex.match(cleaned, nameEnd).end()
+                if name in PLAIN_MARKERS:
+                    token = [name]
+                elif name in VALUE_MARKERS:
+                    phrase = phraseRegex.match(cleaned, end)
+                    token = [name, phrase.group()] if phrase else [name]
+                    end = phrase.end() if phrase else end
+                elif name in PLUS_MARKERS:
+                    token = [name, '+'] if cleaned.startswith('+', end) else [name]
+                    end += len(token) - 1
+                elif name in NUMBER_MARKERS:
+                    number = numberRegex.match(cleaned, end)
+                    if number and number.end() < length and cleaned[number.end()] in WHITESPACE:
+                        token = [name, number.group()]
+                        end = whitespaceRegex.match(cleaned, number.end()).end()
+            if not token:
+                unknown = unknownRegex.match(cleaned, pos + 1)
+                if not unknown:
+                    raise ParseException(cleaned, pos, 'Expected USFM marker')
+                token = ['unknown', unknown.group()]
+                end = unknown.end()
+            yield token
+            scanned = True
+            pos = end
+        pos = whitespaceRegex.match(cleaned, pos).end()
+    if not scanned:
+        raise ParseException(cleaned, 0, 'Expected USFM')
 
 
 def clean(unicodeString):
@@ -368,176 +476,23 @@ def clean(unicodeString):
 
 
 def createToken(t):
-    options = {
-        'id':   IDToken,
-        'ide':  IDEToken,
-        'usfm': USFMVersionToken,
-        'h':    HToken,
-
-        'mt':   MTToken,
-        'mt1':  MT1Token,
-        'mt2':  MT2Token,
-        'mt3':  MT3Token,
-
-        'ms':   MSToken,
-        'ms1':  MS1Token,
-        'ms2':  MS2Token,
-
-        'mr':   MRToken,
-        'p':    PToken,
-        'pc':   PCToken,
-
-        'pi':   PIToken,
-        'pi1':  PI1Token,
-        'pi2':  PI2Token,
-
-        'b':    BToken,
-
-        's':    SToken,
-        's1':   S1Token,
-        's2':   S2Token,
-        's3':   S3Token,
-        's4':   S4Token,
-
-        's5':   S5Token,
-
-        'sr':   SRToken,
-        'sts':  STSToken,
-        'mi':   MIToken,
-        'r':    RToken,
-        'c':    CToken,
-        'ca':   CAStartToken, 'ca*':  CAEndToken,
-        'cl':   CLToken,
-        'v':    VToken,
-        'va':   VAStartToken, 'va*':  VAEndToken,
-
-        'q':    QToken,
-        'q1':   Q1Token,
-        'q2':   Q2Token,
-        'q3':   Q3Token,
-        'q4':   Q4Token,
-
-        'qa':   QAToken,
-        'qac':  QACToken,
-        'qc':   QCToken,
-        'qm':   QMToken,
-        'qm1':  QM1Token,
-        'qm2':  QM2Token,
-        'qm3':  QM3Token,
-        'qr':   QRToken,
-        'qs':   QSStartToken,
-        'qs*':  QSEndToken,
-        'qt':   QTStartToken,
-        'qt*':  QTEndToken,
-        'nb':   NBToken,
-        'f':    FStartToken,
-        'fe':   FEStartToken,  # Footnote intended as an end note
-        'fr':   FRToken, 'fr*':  FREndToken,
-        'fk':   FKToken,
-        'ft':   FTToken, 'ft*':  FTEndToken,
-        'fq':   FQToken, 'fq*':  FQEndToken,
-        'fqa':  FQAToken, 'fqa*': FQAEndToken,
-        'fqb':  FQAEndToken,
-        'f*':   FEndToken,
-        'fe*':  FEEndToken,
-        'fv':   FVStartToken, 'fv*':  FVEndToken,
-        'fdc':  FDCStartToken, 'fdc*': FDCEndToken,
-        'fp':   FPToken,
-        'x':    XStartToken,
-        'xdc':  XDCStartToken, 'xdc*': XDCEndToken,
-        'xo':   XOToken,
-        'xt':   XTToken, 'xt*': XTEndToken,
-        'x*':   XEndToken,
-        'it':   ITStartToken, 'it*':  ITEndToken,
-        'bd':   BDStartToken, 'bd*':  BDEndToken,
-        'bdit': BDITStartToken, 'bdit*': BDITEndToken,
-
-        'li':   LIToken,
-        'li1':  LI1Token,
-        'li2':  LI2Token,
-        'li3':  LI3Token,
-        'li4':  LI4Token,
-
-        'd':    DToken,
-        'sp':   SPToken,
-        # 'i*':   IEndToken,
-        'add':  ADDStartToken, 'add*': ADDEndToken,
-        'nd':   NDStartToken, 'nd*':  NDEndToken,
-        'sc':   SCStartToken, 'sc*':  SCEndToken,
-        'wj':   WJStartToken, 'wj*':  WJEndToken,
-        'm':    MToken,
-        'tl':   TLStartToken, 'tl*':  TLEndToken,
-        '\\\\': EscapedToken,
-        'rem':  REMToken,
-
-        'tr':   TRToken,
-        'th1':  TH1Token,
-        'th2':  TH2Token,
-        'th3':  TH3Token,
-        'th4':  TH4Token,
-        'th5':  TH5Token,
-        'th6':  TH6Token,
-        'thr1': THR1Token,
-        'thr2': THR2Token,
-        'thr3': THR3Token,
-        'thr4': THR4Token,
-        'thr5': THR5Token,
-        'thr6': THR6Token,
-        'tc1':  TC1Token,
-        'tc2':  TC2Token,
-        'tc3':  TC3Token,
-        'tc4':  TC4Token,
-        'tc5':  TC5Token,
-        'tc6':  TC6Token,
-        'tcr1': TCR1Token,
-        'tcr2': TCR2Token,
-        'tcr3': TCR3Token,
-        'tcr4': TCR4Token,
-        'tcr5': TCR5Token,
-        'tcr6': TCR6Token,
-
-        'toc1': TOC1Token,
-        'toc2': TOC2Token,
-        'toc3': TOC3Token,
-
-        'is':   ISToken,
-        'is1':  IS1Token,
-        'is2':  IS2Token,
-        'is3':  IS3Token,
-
-        'imt':  IMTToken,
-        'imt1': IMT1Token,
-        'imt2': IMT2Token,
-        'imt3': IMT3Token,
-
-        'ie':   IEToken,
-        'ip':   IPToken,
-        'ipi':  IPIToken,
-        'im':   IMToken,
-        'imi':  IMIToken,
-        'iot':  IOTToken,
-        'io':   IOToken,
-        'io1':  IO1Token,
-        'io2':  IO2Token,
-        'ior':  IORStartToken, 'ior*': IOREndToken,
-        'bk':   BKStartToken, 'bk*':  BKEndToken,
-        'text': TEXTToken,
-        'unknown': UnknownToken
-    }
-    for k, v in options.items():
-        if t[0] == k:
-            if len(t) == 1:
-                token = v()
-            else:
-                token = v(t[1])
-            token.type = k
-            return token
-    raise Exception(t[0])
+    if t[0] not in TOKEN_CLASSES:
+        raise Exception(t[0])
+    if len(t) == 1:
+        token = TOKEN_CLASSES[t[0]]()
+    else:
+        token = TOKEN_CLASSES[t[0]](t[1])
+    token.type = t[0]
+    return token
 
 
 
 # noinspection PyMethodMayBeStatic
 class UsfmToken:
+    # Whether renderOn() only calls a render method of the printer, so renderers can call it for the token class
+    #   straight from their dispatch tables
+    dispatchByTable = True
+
     def __init__(self, value=''):
         self.value = value
         self.type = None
@@ -710,6 +665,7 @@ class UnknownToken(UsfmToken):
 
 
 class EscapedToken(UsfmToken):
+    dispatchByTable = False  # renderOn() does more than call a render method, see AbstractRenderer.renderTokens()
     def renderOn(self, printer):
         self.value = '\\'
         return printer.renderText(self)
@@ -1323,3 +1279,162 @@ class BKStartToken(UsfmToken):
 class BKEndToken(UsfmToken):
     def renderOn(self, printer):  return printer.render_bk_e(self)
     def is_bk_e(self):            return True
+
+
+# Token class for each marker type created by the grammar, used by createToken()
+TOKEN_CLASSES = {
+    'id':   IDToken,
+    'ide':  IDEToken,
+    'usfm': USFMVersionToken,
+    'h':    HToken,
+
+    'mt':   MTToken,
+    'mt1':  MT1Token,
+    'mt2':  MT2Token,
+    'mt3':  MT3Token,
+
+    'ms':   MSToken,
+    'ms1':  MS1Token,
+    'ms2':  MS2Token,
+
+    'mr':   MRToken,
+    'p':    PToken,
+    'pc':   PCToken,
+
+    'pi':   PIToken,
+    'pi1':  PI1Token,
+    'pi2':  PI2Token,
+
+    'b':    BToken,
+
+    's':    SToken,
+    's1':   S1Token,
+    's2':   S2Token,
+    's3':   S3Token,
+    's4':   S4Token,
+
+    's5':   S5Token,
+
+    'sr':   SRToken,
+    'sts':  STSToken,
+    'mi':   MIToken,
+    'r':    RToken,
+    'c':    CToken,
+    'ca':   CAStartToken, 'ca*':  CAEndToken,
+    'cl':   CLToken,
+    'v':    VToken,
+    'va':   VAStartToken, 'va*':  VAEndToken,
+
+    'q':    QToken,
+    'q1':   Q1Token,
+    'q2':   Q2Token,
+    'q3':   Q3Token,
+    'q4':   Q4Token,
+
+    'qa':   QAToken,
+    'qac':  QACToken,
+    'qc':   QCToken,
+    'qm':   QMToken,
+    'qm1':  QM1Token,
+    'qm2':  QM2Token,
+    'qm3':  QM3Token,
+    'qr':   QRToken,
+    'qs':   QSStartToken,
+    'qs*':  QSEndToken,
+    'qt':   QTStartToken,
+    'qt*':  QTEndToken,
+    'nb':   NBToken,
+    'f':    FStartToken,
+    'fe':   FEStartToken,  # Footnote intended as an end note
+    'fr':   FRToken, 'fr*':  FREndToken,
+    'fk':   FKToken,
+    'ft':   FTToken, 'ft*':  FTEndToken,
+    'fq':   FQToken, 'fq*':  FQEndToken,
+    'fqa':  FQAToken, 'fqa*': FQAEndToken,
+    'fqb':  FQAEndToken,
+    'f*':   FEndToken,
+    'fe*':  FEEndToken,
+    'fv':   FVStartToken, 'fv*':  FVEndToken,
+    'fdc':  FDCStartToken, 'fdc*': FDCEndToken,
+    'fp':   FPToken,
+    'x':    XStartToken,
+    'xdc':  XDCStartToken, 'xdc*': XDCEndToken,
+    'xo':   XOToken,
+    'xt':   XTToken, 'xt*': XTEndToken,
+    'x*':   XEndToken,
+    'it':   ITStartToken, 'it*':  ITEndToken,
+    'bd':   BDStartToken, 'bd*':  BDEndToken,
+    'bdit': BDITStartToken, 'bdit*': BDITEndToken,
+
+    'li':   LIToken,
+    'li1':  LI1Token,
+    'li2':  LI2Token,
+    'li3':  LI3Token,
+    'li4':  LI4Token,
+
+    'd':    DToken,
+    'sp':   SPToken,
+    # 'i*':   IEndToken,
+    'add':  ADDStartToken, 'add*': ADDEndToken,
+    'nd':   NDStartToken, 'nd*':  NDEndToken,
+    'sc':   SCStartToken, 'sc*':  SCEndToken,
+    'wj':   WJStartToken, 'wj*':  WJEndToken,
+    'm':    MToken,
+    'tl':   TLStartToken, 'tl*':  TLEndToken,
+    '\\\\': EscapedToken,
+    'rem':  REMToken,
+
+    'tr':   TRToken,
+    'th1':  TH1Token,
+    'th2':  TH2Token,
+    'th3':  TH3Token,
+    'th4':  TH4Token,
+    'th5':  TH5Token,
+    'th6':  TH6Token,
+    'thr1': THR1Token,
+    'thr2': THR2Token,
+    'thr3': THR3Token,
+    'thr4': THR4Token,
+    'thr5': THR5Token,
+    'thr6': THR6Token,
+    'tc1':  TC1Token,
+    'tc2':  TC2Token,
+    'tc3':  TC3Token,
+    'tc4':  TC4Token,
+    'tc5':  TC5Token,
+    'tc6':  TC6Token,
+    'tcr1': TCR1Token,
+    'tcr2': TCR2Token,
+    'tcr3': TCR3Token,
+    'tcr4': TCR4Token,
+    'tcr5': TCR5Token,
+    'tcr6': TCR6Token,
+
+    'toc1': TOC1Token,
+    'toc2': TOC2Token,
+    'toc3': TOC3Token,
+
+    'is':   ISToken,
+    'is1':  IS1Token,
+    'is2':  IS2Token,
+    'is3':  IS3Token,
+
+    'imt':  IMTToken,
+    'imt1': IMT1Token,
+    'imt2': IMT2Token,
+    'imt3': IMT3Token,
+
+    'ie':   IEToken,
+    'ip':   IPToken,
+    'ipi':  IPIToken,
+    'im':   IMToken,
+    'imi':  IMIToken,
+    'iot':  IOTToken,
+    'io':   IOToken,
+    'io1':  IO1Token,
+    'io2':  IO2Token,
+    'ior':  IORStartToken, 'ior*': IOREndToken,
+    'bk':   BKStartToken, 'bk*':  BKEndToken,
+    'text': TEXTToken,
+    'unknown': UnknownToken
+}
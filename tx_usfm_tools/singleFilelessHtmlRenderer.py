@@ -1,20 +1,145 @@
+import copy
 import logging
 import re
+from collections import OrderedDict
 
-from tx_usfm_tools.abstractRenderer import AbstractRenderer
+from tx_usfm_tools.abstractRenderer import AbstractRenderer, MissingRenderMethod, getDispatchTable
 from tx_usfm_tools.books import bookKeys, bookNames, silNames, readerNames, bookKeyForIdValue
-from tx_usfm_tools.parseUsfm import UsfmToken
+from tx_usfm_tools.parseUsfm import UsfmToken, iterParseString
 
 #
 #   Simplest renderer that doesn't use files (just gets USFM string and returns HTML string). Ignores everything except ascii text.
 #
 
+VOID_TAGS = ['br', 'img', 'hr', 'meta']
+KEEP_EMPTY_TAGS = ['br', 'img']
+HTML_TAG_REGEX = re.compile(r'<(/?)([A-Za-z][A-Za-z0-9]*)\b[^>]*?(/?)>')
+TAG_ATTRIBUTE_REGEX = re.compile(r' ([A-Za-z_:][-A-Za-z0-9_:.]*)="([^"]*)"')
+USFM_CHAPTER_VERSE_REGEX = re.compile(r'\\([cv]) +([^\s\\]+)')
+HTML_END = '\n    </body>\n</html>\n'
+# Attributes that aren't part of the state a chunk is rendered from (see getChapterChunks())
+CHUNK_STATE_EXCLUDES = ['booksUsfm', 'f', 'unknowns', 'headerBookName']
+
+
+def sort_tag_attributes(tag, name):
+    """
+    Writes a start tag with its attributes sorted by name, the way BeautifulSoup writes them. Tags with attributes
+    not written as name="value" are left as they are
+    """
+    attributes = TAG_ATTRIBUTE_REGEX.findall(tag)
+    if len(attributes) < 2:
+        return tag
+    start = tag[:len(name) + 1]
+    end = '/>' if tag.endswith('/>') else '>'
+    if tag != start + ''.join([f' {attribute}="{value}"' for attribute, value in attributes]) + end:
+        return tag
+    return start + ''.join([f' {attribute}="{value}"' for attribute, value in sorted(attributes)]) + end
+
+
+def clean_verse_html(html):
+    """
+    Balances the tags of a verse's HTML fragment (unmatched end tags are dropped, unclosed tags are closed)
+    and removes any element that has no text in it, other than <br> and <img>, in one pass over the tags.
+    Attributes are sorted by name, as they were when verses were taken from the book's HTML with BeautifulSoup
+    """
+    stack = [['', [], False]]  # [tag name, output parts, has text]
+    pos = 0
+    for m in HTML_TAG_REGEX.finditer(html):
+        text = html[pos:m.start()]
+        pos = m.end()
+        if text:
+            stack[-1][1].append(text)
+            if text.replace('&nbsp;', '').strip():
+                stack[-1][2] = True
+        is_end, name, self_closing = m.group(1), m.group(2).lower(), m.group(3)
+        if is_end:
+            if name in VOID_TAGS or name not in [element[0] for element in stack[1:]]:
+                continue  # stray end tag
+            while True:
+                element = stack.pop()
+                parent = stack[-1]
+                if element[2]:
+                    parent[1] += element[1] + [f'</{element[0]}>']
+                    parent[2] = True
+                if element[0] == name:
+                    break
+        elif self_closing or name in VOID_TAGS:
+            if name in KEEP_EMPTY_TAGS:
+                stack[-1][1].append(sort_tag_attributes(m.group(), name))
+        else:
+            stack.append([name, [sort_tag_attributes(m.group(), name)], False])
+    text = html[pos:]
+    if text:
+        stack[-1][1].append(text)
+        if text.replace('&nbsp;', '').strip():
+            stack[-1][2] = True
+    while len(stack) > 1:
+        element = stack.pop()
+        if element[2]:
+            stack[-1][1] += element[1] + [f'</{element[0]}>']
+            stack[-1][2] = True
+    return ''.join(stack[0][1])
+
+
+def split_usfm_verses(usfm):
+    """
+    Returns an OrderedDict of chapter => verse => the USFM of the verse, from its \\v marker up to the next
+    \\v or \\c marker, with chapter and verse numbers without leading zeros (a verse span is stored under
+    each of its verses)
+    """
+    verses = OrderedDict()
+    chapter = None
+    verse_nums = None
+    verse_start = 0
+    for m in USFM_CHAPTER_VERSE_REGEX.finditer(usfm):
+        if verse_nums:
+            for verse in verse_nums:
+                verses[chapter][verse] = usfm[verse_start:m.start()]
+            verse_nums = None
+        if m.group(1) == 'c':
+            chapter = m.group(2).lstrip('0')
+            if chapter not in verses:
+                verses[chapter] = OrderedDict()
+        elif chapter is not None:
+            verse_nums = [verse.lstrip('0') for verse in re.findall(r'\d+', m.group(2))]
+            verse_start = m.start()
+    if verse_nums:
+        for verse in verse_nums:
+            verses[chapter][verse] = usfm[verse_start:]
+    return verses
+
+
+class HtmlBuffer:
+    """
+    Collects the HTML written to it like a file does, without copying what was already written for every write
+    """
+    def __init__(self):
+        self.parts = []
+
+    def write(self, s):
+        self.parts.append(s)
+
+    def tell(self):
+        return len(self.parts)
+
+    def getvalue(self, start=0):
+        return ''.join(self.parts[start:])
+
+
+class NullHtmlBuffer(HtmlBuffer):
+    def write(self, s):
+        pass
+
 
 class SingleFilelessHtmlRenderer(AbstractRenderer):
-    def __init__(self, books_usfm):
+    def __init__(self, books_usfm, output_file=None):
+        """
+        :param books_usfm: dict of book ID => USFM
+        :param output_file: file to stream the HTML of render() to, instead of returning it
+        """
         # logging.debug(f"SingleHTMLRenderer.__init__( {inputDir}, {outputFilename} ) …")
         self.booksUsfm = books_usfm
-        self.html = ''
+        self.f = output_file if output_file else HtmlBuffer()  # output stream
         # Position
         self.cb = ''    # Current Book
         self.cc = '001'    # Current Chapter
@@ -40,14 +165,123 @@ class SingleFilelessHtmlRenderer(AbstractRenderer):
         self.crossReference_origin = ''
         self.crossReference_text = ''
 
+        # Verse index mode (see render_verses())
+        self.indexVerses = False
+        self.verses = OrderedDict()
+        self.verseStart = None
+        self.verseNums = []
+
     def render(self):
         # logging.debug("SingleHTMLRenderer.render() …")
         #print(f"About to render USFM ({len(self.booksUsfm)} books): {str(self.booksUsfm)[:300]} …")
         warning_list = self.run()
+        self.closeDocument()
+        return [self.getHtml(), warning_list]
+
+    def getHtml(self):
+        """
+        Returns the HTML written so far, or None if it was streamed to an output file
+        """
+        if isinstance(self.f, HtmlBuffer):
+            return self.f.getvalue()
+
+    def closeDocument(self):
         self.writeFootnotes()
         self.writeCrossReferences()
-        self.html += '\n    </body>\n</html>\n'
-        return [self.html, warning_list]
+        self.closeVerse()
+        self.f.write(HTML_END)
+
+    def getChapterChunks(self):
+        """
+        Splits the books into chunks of tokens at every chapter after the first one, along with the state the
+        renderer is in at the start of each chunk, so renderChunk() can render them separately (e.g. in other
+        processes) into HTML that joins up into what render() returns.
+        :return: [list of [state, tokens] (the state of the first chunk is None), book name of the first header]
+        """
+        tracker = ChapterStateRenderer(self.booksUsfm)
+        tracker.unknowns = []
+        trackerTable = getDispatchTable(ChapterStateRenderer)
+        chunks = [[None, []]]
+        hasChapter = False
+        try:
+            bookNames = [self.renderBook]
+        except AttributeError:
+            bookNames = silNames
+        for bookName in bookNames:
+            if bookName not in self.booksUsfm:
+                continue
+            for token in iterParseString(self.booksUsfm[bookName], useScanner=self.useScanner):
+                # Without a book name renderC() still has to write the header, so it can't start a chunk
+                if token.isC() and hasChapter and tracker.bookName:
+                    tracker.closeChapter()
+                    chunks.append([tracker.getChunkState(), []])
+                hasChapter = hasChapter or token.isC()
+                chunks[-1][1].append(token)
+                try:
+                    renderMethod = trackerTable.get(token.__class__)
+                    if renderMethod is None:
+                        token.renderOn(tracker)
+                    elif renderMethod.__class__ is not MissingRenderMethod:
+                        renderMethod(tracker, token)
+                except Exception:
+                    pass
+        return [chunks, tracker.headerBookName]
+
+    def getChunkState(self):
+        return copy.deepcopy({k: v for k, v in vars(self).items() if k not in CHUNK_STATE_EXCLUDES})
+
+    def renderChunk(self, tokens, state=None, last=True):
+        """
+        Renders a chunk from getChapterChunks(), starting from its state
+        :return: [html, warnings, unknown tokens]
+        """
+        if state:
+            vars(self).update(state)
+        self.unknowns = []
+        warning_list = []
+        self.renderTokens(tokens, warning_list)
+        if last:
+            self.closeDocument()
+        else:
+            self.closeChapter()
+        return [self.getHtml(), set(warning_list), self.unknowns]
+
+    def render_verses(self):
+        """
+        Renders the books while indexing the HTML by verse, so callers don't have to split the rendered book.
+        :return: [OrderedDict of chapter => verse => {'html': ..., 'usfm': ...}, warnings]
+            where the HTML of a verse runs from its verse number to the next verse or chapter (so it includes
+            any chapter footnotes for the last verse), with its tags balanced and empty tags removed
+        """
+        self.indexVerses = True
+        self.verses = OrderedDict()
+        self.f = HtmlBuffer()  # Verses are taken from the buffer, so they are never streamed to a file
+        html, warning_list = self.render()
+        for usfm in self.booksUsfm.values():
+            for chapter, chapter_verses in split_usfm_verses(usfm).items():
+                for verse, verse_usfm in chapter_verses.items():
+                    if chapter in self.verses and verse in self.verses[chapter]:
+                        self.verses[chapter][verse]['usfm'] = verse_usfm
+        return [self.verses, warning_list]
+
+    def openVerse(self, verse_nums):
+        if self.indexVerses:
+            self.closeVerse()
+            self.verseStart = self.f.tell()
+            self.verseNums = verse_nums
+
+    def closeVerse(self):
+        if self.indexVerses and self.verseStart is not None:
+            verse_html = clean_verse_html(self.f.getvalue(self.verseStart))
+            chapter = self.cc.lstrip('0')
+            if chapter not in self.verses:
+                self.verses[chapter] = OrderedDict()
+            for verse in self.verseNums:
+                self.verses[chapter][verse] = {
+                    'usfm': '',
+                    'html': verse_html
+                }
+            self.verseStart = None
 
     def writeHeader(self):
         h = """
@@ -101,7 +335,7 @@ class SingleFilelessHtmlRenderer(AbstractRenderer):
 <body>
 <h1>""" + self.bookName + """</h1>
 """
-        self.html += h
+        self.f.write(h)
 
     def startLI(self, level=1):
         # if 'NUM' in self.bookName and '00' in self.cc: logging.debug(f"@{self.cc}:{self.cv} startLI({level})…")
@@ -110,13 +344,13 @@ class SingleFilelessHtmlRenderer(AbstractRenderer):
         assert self.listItemLevel == 0
         # self.listItemLevel = 0 # Should be superfluous I think
         while self.listItemLevel < level:
-            self.html += '<ul>'
+            self.f.write('<ul>')
             self.listItemLevel += 1
 
     def stopLI(self):
         # if 'NUM' in self.bookName and '00' in self.cc and self.listItemLevel: logging.debug(f"@{self.cc}:{self.cv} stopLI() from level {self.listItemLevel}…")
         while self.listItemLevel > 0:
-            self.html += '</ul>'
+            self.f.write('</ul>')
             self.listItemLevel -= 1
         assert self.listItemLevel == 0
 
@@ -124,7 +358,7 @@ class SingleFilelessHtmlRenderer(AbstractRenderer):
         return s.replace('~', '&nbsp;')
 
     def write(self, unicodeString):
-        self.html += unicodeString.replace('~', '&nbsp;')
+        self.f.write(unicodeString.replace('~', '&nbsp;'))
 
     def writeIndent(self, level):
         assert level > 0
@@ -139,14 +373,15 @@ class SingleFilelessHtmlRenderer(AbstractRenderer):
         # if 'NUM' in self.bookName and '00' in self.cc and self.indentFlag: logging.debug(f"@{self.cc}:{self.cv} closeParagraph() from {self.indentFlag}…")
         if self.inParagraph:
             self.inParagraph = False
-            self.html += '</p>\n'
+            self.f.write('</p>\n')
         if self.indentFlag:
             self.indentFlag = False
-            self.html += '</p>\n'
+            self.f.write('</p>\n')
 
     def renderID(self, token):
         self.writeFootnotes()
         self.writeCrossReferences()
+        self.closeVerse()
         self.cb = bookKeyForIdValue(token.value)
         self.chapterLabel = 'Chapter'
         self.closeParagraph()
@@ -269,14 +504,19 @@ class SingleFilelessHtmlRenderer(AbstractRenderer):
             self.bookName = bookNames[int(self.cb)-1]
             logging.warning(f"Used '{self.bookName}' as book name (due to missing \\h and \\toc2 fields)")
             self.writeHeader()
+        self.closeChapter()
+        self.cc = token.value.zfill(3)
+        self.write('\n\n<h2 id="{0}-ch-{1}" class="c-num">{2} {3}</h2>'
+                   .format(self.cb, self.cc, self.chapterLabel, token.value))
+
+    def closeChapter(self):
+        self.closeFootnote()
         self.stopLI()
         self.closeParagraph()
         self.writeFootnotes()
         self.writeCrossReferences()
         self.footnote_num = 1
-        self.cc = token.value.zfill(3)
-        self.write('\n\n<h2 id="{0}-ch-{1}" class="c-num">{2} {3}</h2>'
-                   .format(self.cb, self.cc, self.chapterLabel, token.value))
+        self.closeVerse()
 
     def renderCA_S(self, token):
         assert not token.value
@@ -293,7 +533,9 @@ class SingleFilelessHtmlRenderer(AbstractRenderer):
         for verse in re.findall(r'\d+', token.value):
             verses.append(verse.zfill(3))
         self.cv = '-'.join(verses)
-        self.write(' <span id="{0}-ch-{1}-v-{2}" class="v-num"><sup><b>{3}</b></sup></span>'.
+        self.write(' ')
+        self.openVerse([verse.lstrip('0') for verse in verses])
+        self.write('<span id="{0}-ch-{1}-v-{2}" class="v-num"><sup><b>{3}</b></sup></span>'.
                    format(self.cb, self.cc, self.cv, token.value))
 
     def renderVA_S(self, token):
@@ -709,3 +951,19 @@ class SingleFilelessHtmlRenderer(AbstractRenderer):
         else:
             self.write(f' {token.value} ') # write function does escaping of non-break space
 # end of class SingleHTMLRenderer
+
+
+class ChapterStateRenderer(SingleFilelessHtmlRenderer):
+    """
+    Follows the renderer state through the books without writing any HTML, for getChapterChunks()
+    """
+    def __init__(self, books_usfm):
+        super().__init__(books_usfm, NullHtmlBuffer())
+        self.headerBookName = None
+
+    def write(self, unicodeString):
+        pass
+
+    def writeHeader(self):
+        if self.headerBookName is None:
+            self.headerBookName = self.bookName
@@ -0,0 +1,40 @@
+import copy
+from unittest import TestCase
+from .benchmark import load_corpus, run_benchmark, compare_results, STAGES, MIN_REGRESSION_TIME
+from .verifyUSFM import verify_contents_quiet
+from general_tools.usfm_utils import unalign_usfm
+
+
+class TestBenchmark(TestCase):
+
+    def test_synthesized_corpus(self):
+        corpus = load_corpus(book_ids=['JUD', 'TIT'])
+        self.assertEqual(list(corpus.keys()), ['TIT', 'JUD'])
+        for book_id, aligned_usfm in corpus.items():
+            self.assertIn('\\zaln-s', aligned_usfm)
+            # Has all the chapters and verses of the book
+            self.assertEqual(verify_contents_quiet(unalign_usfm(aligned_usfm), f'{book_id}.usfm', book_id, 'en'),
+                             ([], book_id))
+
+    def test_run_benchmark(self):
+        results = run_benchmark(load_corpus(book_ids=['TIT']), repeat=1)
+        book = results['books']['TIT']
+        self.assertGreater(book['tokens'], 0)
+        self.assertGreater(book['peak_memory'], 0)
+        self.assertEqual(results['totals']['tokens'], book['tokens'])
+        for stage in STAGES:
+            self.assertIn(stage, book)
+
+        self.assertEqual(compare_results(results, results), [])
+
+    def test_compare_results(self):
+        baseline = {'calibration': 0.5, 'books': {'TIT': {'unalign': 0.1, 'clean': 0.1, 'parse': 0.2, 'render': 0.4}}}
+        results = copy.deepcopy(baseline)
+        results['calibration'] = 1.0  # A machine half as fast
+        results['books']['TIT'].update({'parse': 0.4, 'render': 1.6})
+        self.assertEqual(compare_results(results, baseline),
+                         ['render is 100% slower than the baseline (more than 30%)'])
+        self.assertEqual(compare_results(results, baseline, threshold=1.5), [])
+        # Too little slower to not be noise
+        results['books']['TIT']['render'] = 0.801 + MIN_REGRESSION_TIME / 2
+        self.assertEqual(compare_results(results, baseline, threshold=0), [])
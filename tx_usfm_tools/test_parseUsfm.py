@@ -0,0 +1,90 @@
+import os
+import random
+from glob import glob
+from unittest import TestCase, skipUnless
+from pyparsing import ParseException
+from .parseUsfm import parseString, iterParseString, VALUE_MARKERS, PLUS_MARKERS, NUMBER_MARKERS, PLAIN_MARKERS, \
+    END_MARKERS
+
+# Set to a directory of USFM files (e.g. a clone of en_ult) to also compare all of its books
+USFM_BOOKS_DIR = os.environ.get('USFM_BOOKS_DIR')
+
+SAMPLE_USFM = r'''\id TIT EN_ULT en_English_ltr unfoldingWord Literal Text
+\usfm 3.0
+\ide UTF-8
+\h Titus
+\toc1 The Letter of Paul to Titus
+\mt Titus
+
+\s5
+\c 1
+\p
+\v 1 Paul, a servant of God and an apostle of Jesus Christ,\f + \ft Some versions read \fqa Christ Jesus\fqa*.\f*
+\v 2 \add in\add* hope of \nd eternal\nd* life\x - \xo 1:2 \xt Rom 16:25\x*
+\q1 Selah\qs Selah\qs*
+\v 3-4 at the proper time.\\ x \\
+\c (5)
+\zaln-s |x-occurrence="1"\*\w Paul|x-occurrence="1"\w*\zaln-e\*
+\f+ \ft bad
+\v 5a \ipi \toc9 \p\v 6 \c 7
+'''
+
+
+def get_token_values(tokens):
+    return [(token.__class__.__name__, token.type, token.value) for token in tokens]
+
+
+def get_fuzz_usfm(rand, count):
+    pieces = [f'\\{marker}' for marker in VALUE_MARKERS | PLUS_MARKERS | NUMBER_MARKERS | PLAIN_MARKERS] + \
+             [f'\\{marker}' for marker in END_MARKERS] + \
+             ['\\', '\\\\', '\\*', '\\w', '\\zaln-s', '\\x-', '\\p*', 'text', ' more text ', '1', '2-3', '(4)',
+              '+', '-', '*', '|', '\u00a0', ' ', '  ', '\t', '\n', '\r\n', '\n\n', 'a\\b']
+    return ''.join(rand.choice(pieces) for _ in range(count))
+
+
+class TestParseUsfm(TestCase):
+
+    def assertSameTokens(self, usfm_str):
+        try:
+            expected = get_token_values(parseString(usfm_str))
+        except ParseException:
+            self.assertRaises(ParseException, parseString, usfm_str, useScanner=True)
+            return
+        except Exception as e:
+            # createToken() raises for markers in the grammar it has no token for, e.g. \toc
+            with self.assertRaises(Exception) as context:
+                parseString(usfm_str, useScanner=True)
+            self.assertEqual(str(context.exception), str(e))
+            return
+        self.assertEqual(get_token_values(parseString(usfm_str, useScanner=True)), expected, repr(usfm_str))
+
+    def test_scanner_matches_grammar(self):
+        self.assertSameTokens(SAMPLE_USFM)
+        for usfm_str in ['\\v 1', '\\c 1\n', '\\p', 'x\\', '\\f + a', '\\f +a', '\\x\t-', '\\s\n\\p\n',
+                         '\\mt1\tTitle\r\n\\v 3 \u00a0text', '\\fqa*x \\fqa*', '\\toc x', '', '  \n']:
+            self.assertSameTokens(usfm_str)
+
+    def test_scanner_matches_grammar_fuzzed(self):
+        rand = random.Random(42)
+        for _ in range(300):
+            self.assertSameTokens(get_fuzz_usfm(rand, rand.randint(1, 40)))
+
+    def test_iter_parse_string_streams_tokens(self):
+        tokens = iterParseString('\\v 1 In the beginning\n\\toc x', useScanner=True)
+        token = next(tokens)
+        self.assertEqual((token.type, token.value), ('v', '1'))
+        self.assertEqual(next(tokens).value, 'In the beginning')
+        # \toc has no token class, which only surfaces when the scanner gets to it
+        self.assertRaises(Exception, next, tokens)
+
+    @skipUnless(USFM_BOOKS_DIR, 'USFM_BOOKS_DIR not set')
+    def test_scanner_matches_grammar_for_books(self):
+        for usfm_file in sorted(glob(os.path.join(USFM_BOOKS_DIR, '*.usfm'))):
+            with open(usfm_file, encoding='utf-8') as f:
+                usfm_str = f.read()
+            with self.subTest(usfm_file=os.path.basename(usfm_file)):
+                self.assertSameTokens(usfm_str)
+
+    def test_scanner_matches_grammar_for_long_book(self):
+        # How much faster the scanner is: python -m tx_usfm_tools.benchmark --compare-tokenizers
+        self.assertSameTokens(SAMPLE_USFM.replace('\\toc9 ', '') * 50)
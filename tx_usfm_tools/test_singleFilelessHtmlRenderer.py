@@ -0,0 +1,111 @@
+import io
+from unittest import TestCase
+from .singleFilelessHtmlRenderer import SingleFilelessHtmlRenderer, clean_verse_html, split_usfm_verses
+from .parseUsfm import iterParseString
+from .benchmark import render_tokens_by_render_on, ConcatenatingHtmlBuffer
+
+TIT_USFM = r'''\id TIT
+\h Titus
+\c 1
+\p
+\v 1 Paul, a servant\f + \ft a note\f* of God.
+\v 2 In hope of life,
+\s Heading
+\q1
+\v 3-4 at the proper time.
+\c 2
+\p
+\v 1 But you, say what is fitting.
+'''
+
+CHUNK_USFM = TIT_USFM + r'''\cl Psalm
+\c 3
+\li1 For the
+\v 1 \x - \xo 3:1 \xt Rom 1:1\x* The\f + \ft a note\f* word\f + \ft another note
+\c 4
+\v 1 \nd Lord\nd* \f + \ft continued note\f*
+'''
+
+DISPATCH_USFM = TIT_USFM + r'''\c 3
+\p
+\v 1 An \add added\add* word, a \\ backslash, an \zz unknown marker and \qs Selah\qs*.
+'''
+
+PSA_CHAPTER_USFM = '\\c {0}\n\\d For the choir director.\n\\q1\n' + ''.join([
+    f'\\v {verse} Blessed is the man who does not walk in the advice of the wicked,\\f + \\ft Or \\fqa counsel\\fqa*.\\f*\n'
+    '\\q2 or stand in the pathway with sinners,\n' for verse in range(1, 11)])
+PSA_USFM = '\\id PSA\n\\h Psalms\n' + ''.join([PSA_CHAPTER_USFM.format(chapter) for chapter in range(1, 151)])
+
+
+class Test(TestCase):
+    def test_render_verses(self):
+        verses, warnings = SingleFilelessHtmlRenderer({'TIT': TIT_USFM}).render_verses()
+        self.assertEqual(['1', '2'], list(verses.keys()))
+        self.assertEqual(['1', '2', '3', '4'], list(verses['1'].keys()))
+        self.assertEqual('\\v 2 In hope of life,\n\\s Heading\n\\q1\n', verses['1']['2']['usfm'])
+        self.assertTrue(verses['1']['2']['html'].startswith('<span class="v-num" id="056-ch-001-v-002">'))
+        self.assertIn('<h4 class="s s1">Heading</h4>', verses['1']['2']['html'])
+        self.assertNotIn('<p class="indent', verses['1']['2']['html'])
+        self.assertEqual(verses['1']['3'], verses['1']['4'])
+        self.assertIn('<div class="footnotes">', verses['1']['4']['html'])
+        self.assertNotIn('<h2', verses['1']['4']['html'])
+        self.assertTrue(verses['2']['1']['html'].endswith('fitting. '))
+
+    def test_clean_verse_html(self):
+        self.assertEqual('<b>x</b>', clean_verse_html('<b>x</b></p><p class="a">  </p><span></span>'))
+        self.assertEqual('<p>a <i>b<br/></i></p>', clean_verse_html('<p>a <i>b<br/>'))
+        self.assertEqual('a', clean_verse_html('<p><img src="x.jpg"/>&nbsp;</p>a'))
+        self.assertEqual('<div class="footnote" id="fn-1"><img alt="a" src="x.jpg"/> <a href="#ref-fn-1">1</a></div>',
+                         clean_verse_html('<div id="fn-1" class="footnote"><img src="x.jpg" alt="a"/> '
+                                          '<a href="#ref-fn-1">1</a></div>'))
+
+    def test_split_usfm_verses(self):
+        verses = split_usfm_verses(TIT_USFM)
+        self.assertEqual('\\v 3-4 at the proper time.\n', verses['1']['3'])
+        self.assertEqual('\\v 1 But you, say what is fitting.\n', verses['2']['1'])
+
+    def test_render_chapter_chunks(self):
+        html, warnings = SingleFilelessHtmlRenderer({'TIT': CHUNK_USFM}).render()
+        chunks, book_name = SingleFilelessHtmlRenderer({'TIT': CHUNK_USFM}).getChapterChunks()
+        self.assertEqual('Titus', book_name)
+        self.assertEqual(4, len(chunks))
+        self.assertIsNone(chunks[0][0])
+        self.assertEqual('Psalm', chunks[3][0]['chapterLabel'])
+        chunks_html = ''
+        chunks_warnings = set()
+        for chunk_idx, (state, tokens) in enumerate(chunks):
+            chunk_html, chunk_warnings, unknowns = SingleFilelessHtmlRenderer({}).renderChunk(
+                tokens, state, chunk_idx == len(chunks) - 1)
+            chunks_html += chunk_html
+            chunks_warnings |= chunk_warnings
+        self.assertEqual(html, chunks_html)
+        self.assertEqual(warnings, chunks_warnings)
+        self.assertIn('<div id="fn-056-004-001-1" class="footnote">', chunks_html)
+
+    def test_render_to_file(self):
+        html, warnings = SingleFilelessHtmlRenderer({'TIT': TIT_USFM}).render()
+        output_file = io.StringIO()
+        self.assertIsNone(SingleFilelessHtmlRenderer({'TIT': TIT_USFM}, output_file).render()[0])
+        self.assertEqual(html, output_file.getvalue())
+
+    def test_buffered_matches_concatenated(self):
+        html, warnings = SingleFilelessHtmlRenderer({'PSA': PSA_USFM}).render()
+        concatenating = SingleFilelessHtmlRenderer({'PSA': PSA_USFM}, ConcatenatingHtmlBuffer())
+        self.assertEqual(warnings, concatenating.render()[1])
+        self.assertEqual(html, concatenating.f.getvalue())
+
+    def test_dispatch_table_matches_render_on(self):
+        tokens = list(iterParseString(DISPATCH_USFM, useScanner=True))
+        by_render_on = SingleFilelessHtmlRenderer({'TIT': DISPATCH_USFM})
+        by_render_on.unknowns = []
+        render_on_warnings = []
+        render_tokens_by_render_on(by_render_on, tokens, render_on_warnings)
+        by_table = SingleFilelessHtmlRenderer({'TIT': DISPATCH_USFM})
+        by_table.unknowns = []
+        table_warnings = []
+        by_table.renderTokens(tokens, table_warnings)
+        self.assertEqual(by_render_on.getHtml(), by_table.getHtml())
+        self.assertEqual(render_on_warnings, table_warnings)
+        self.assertIn("Unable to render 'add' token due to 'SingleFilelessHtmlRenderer' object has no attribute "
+                      "'renderADD_S'", table_warnings)
+        self.assertEqual(by_render_on.unknowns, by_table.unknowns)
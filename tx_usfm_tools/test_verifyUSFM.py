@@ -0,0 +1,96 @@
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+from .parseUsfm import parseString
+from .verifyUSFM import verify_contents_quiet, verify_book, verify_books, get_book_code, getTakeHandler, \
+    getTokenClassInfo, isFootnote, isTextCarryingToken
+
+TIT_USFM = r'''\id TIT EN_ULT en_English_ltr unfoldingWord Literal Text
+\usfm 3.0
+\ide UTF-8
+\h Titus
+\toc1 The Letter of Paul to Titus
+\toc2 Titus
+\toc3 Tit
+\mt Titus
+
+\c 1
+\p
+\v 1 Paul, a servant of God
+\v 2 in hope of eternal life
+\v 4 To Titus
+\c 3
+\p
+\v 1 Remind them
+'''
+
+JUD_USFM = r'''\id JUD
+\h JUDE
+\c 1
+\v 1 Jude
+\v 1 Jude again
+'''
+
+PSA_VERSE_USFM = '\\v {0} Text \\add of\\add* verse {0}\\f + \\ft note\\f*\n\\q2 more text\n'
+PSA_USFM = '\\id PSA\n\\h Psalms\n' + ''.join(
+    f'\\c {chapter}\n\\d A psalm\n\\q1\n' + ''.join(PSA_VERSE_USFM.format(verse) for verse in range(1, 11))
+    for chapter in range(1, 151))
+
+
+class TestVerifyUSFM(TestCase):
+
+    def test_verify_contents_quiet(self):
+        errors, book_id = verify_contents_quiet(TIT_USFM, '57-TIT.usfm', 'TIT', 'en')
+        self.assertEqual(book_id, 'TIT')
+        self.assertIn('TIT 1:2 - Missing verse between this and: TIT 1:4', errors)
+        self.assertIn('TIT 1:4 - Missing chapter between this and: TIT 3', errors)
+        self.assertIn('TIT 2 - Missing chapter', errors)
+
+        # Nothing is left over from the previous verification
+        self.assertEqual(verify_contents_quiet(TIT_USFM, '57-TIT.usfm', 'TIT', 'en'), (errors, book_id))
+        jud_errors, jud_id = verify_contents_quiet(JUD_USFM, '66-JUD.usfm', 'JUD', 'en')
+        self.assertEqual(jud_id, 'JUD')
+        self.assertIn("JUD - \\h 'JUDE' shouldn't be UPPERCASE", jud_errors)
+        self.assertIn('JUD 1:1 - Duplicated verse number', jud_errors)
+        self.assertIn('JUD 1:1 - Missing paragraph marker (\\p), margin (\\m) or quote (\\q) before verse text',
+                      jud_errors)
+        self.assertFalse([error for error in jud_errors if 'TIT' in error])
+
+    def test_verify_in_threads(self):
+        expected = [verify_contents_quiet(usfm, 'x.usfm', None, 'fr') for usfm in [TIT_USFM, JUD_USFM]]
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(lambda usfm: verify_contents_quiet(usfm, 'x.usfm', None, 'fr'),
+                                        [TIT_USFM, JUD_USFM] * 10))
+        self.assertEqual(results, expected * 10)
+
+    def test_verify_books(self):
+        temp_dir = tempfile.mkdtemp(prefix='verify_usfm_')
+        try:
+            paths = []
+            for file_name, usfm in [['57-TIT.usfm', TIT_USFM], ['66-JUD.usfm', JUD_USFM], ['67-REV.usfm', TIT_USFM]]:
+                paths.append(os.path.join(temp_dir, file_name))
+                with open(paths[-1], 'w', encoding='utf-8') as f:
+                    f.write(usfm)
+            self.assertEqual(get_book_code(paths[0]), 'TIT')
+
+            results = verify_books(paths, workers=2)
+            self.assertEqual(results, verify_books(paths, workers=1))
+            self.assertEqual([result['id'] for result in results], ['TIT', 'JUD', 'TIT'])
+            self.assertIn({'path': paths[0], 'reference': 'TIT 2', 'message': 'Missing chapter'},
+                          results[0]['findings'])
+            self.assertIn({'path': paths[2], 'reference': 'TIT',
+                           'message': "Found in \\id tag does not match code 'REV' found in filename"},
+                          results[2]['findings'])
+            self.assertEqual(verify_book(paths[1]), results[1])
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def test_token_class_info_matches_predicates(self):
+        for token in parseString(PSA_USFM, useScanner=True):
+            footnote, text_or_text_carrying, text_carrying, handler = getTokenClassInfo(token)
+            self.assertEqual((isFootnote(token), token.isTEXT() or isTextCarryingToken(token),
+                              isTextCarryingToken(token)), (footnote, text_or_text_carrying, text_carrying))
+            # Handlers can be lambdas made for each call
+            self.assertEqual(getTakeHandler(token) is None, handler is None)